@@ -9,14 +9,19 @@ import os
 import sys
 import csv
 import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
+from response_cache import get_response_cache
+from structured_output import (
+    DETECTION_SCHEMA, PACKED_DETECTION_SCHEMA, DetectionResult, StructuredOutputError, request_structured
+)
 from io import BytesIO
-import time
 import logging
-import re
 
 # Configure logging
 logging.basicConfig(
@@ -32,6 +37,42 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+DETECTION_FIELDS = [
+    'image_filename', 'item_type', 'description', 'location_on_attire',
+    'confidence_score', 'removal_priority', 'coordinates'
+]
+INTEGRITY_FIELDS = [
+    'image_filename', 'missing_sleeves', 'missing_trousers',
+    'garment_complete', 'issues_found'
+]
+
+def read_csv_rows(csv_path):
+    """Rows of a results CSV, or an empty list if it does not exist yet."""
+    if not csv_path.exists():
+        return []
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        return list(csv.DictReader(csvfile))
+
+def drop_csv_rows(csv_path, fieldnames, image_filenames):
+    """Rewrite a results CSV without the rows of image_filenames (atomic replace)."""
+    rows = [row for row in read_csv_rows(csv_path) if row['image_filename'] not in image_filenames]
+    tmp_path = csv_path.with_name(csv_path.name + '.tmp')
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, csv_path)
+
+def open_csv_appender(csv_path, fieldnames):
+    """Open a results CSV for appending, writing the header only when the file is new."""
+    is_new = not csv_path.exists() or csv_path.stat().st_size == 0
+    csvfile = open(csv_path, 'a', newline='', encoding='utf-8')
+    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    if is_new:
+        writer.writeheader()
+        csvfile.flush()
+    return csvfile, writer
+
 class AccessoryDetector:
     def __init__(self):
         """Initialize the detector with API configuration."""
@@ -44,6 +85,8 @@ class AccessoryDetector:
         
         # Use Gemini 2.5 Pro for enhanced detection
         self.detection_model = genai.GenerativeModel('models/gemini-2.5-pro')
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-pro')
+        self.response_cache = get_response_cache()
         
         logger.info("Accessory Detector initialized with Gemini 2.5 Pro")
         
@@ -116,12 +159,7 @@ Return a structured JSON response with the following format:
     "garment_complete": true,
     "issues_found": []
   },
-  "summary": {
-    "total_items": 3,
-    "high_priority": 2,
-    "medium_priority": 1,
-    "clean_areas": ["back", "right_sleeve"]
-  }
+  "clean_areas": ["back", "right_sleeve"]
 }
 
 IMPORTANT:
@@ -133,6 +171,20 @@ IMPORTANT:
 - Check clothing integrity for missing sleeves or trousers
 - If no unwanted elements found, return empty detected_items array
 - Always include clothing_integrity section in response"""
+        
+        # Packed mode: several images per request, answered as one JSON array
+        self.packed_detection_prompt = self.detection_prompt + """
+
+MULTIPLE IMAGES:
+This request contains several product images. Each image is preceded by a marker line "IMAGE <index>".
+Analyze every image independently and apply all of the instructions above to each one.
+Return a JSON array with exactly one object per image, in this format:
+[
+  {"image_index": 0, "detected_items": [...], "clothing_integrity": {...}, "clean_areas": [...]},
+  {"image_index": 1, "detected_items": [...], "clothing_integrity": {...}, "clean_areas": [...]}
+]
+- image_index must be the index from the image's marker
+- Coordinates refer to that image's own pixels"""
 
     def load_image_data(self, image_path):
         """Load and convert image to bytes."""
@@ -163,85 +215,122 @@ IMPORTANT:
             return None
         
         try:
-            # Send to detection model
-            response = self.detection_model.generate_content([
+            # Send to detection model (served from the response cache on re-runs)
+            detection_inputs = [
                 self.detection_prompt,
                 {"mime_type": "image/jpeg", "data": img_data}
-            ])
-            
-            if response and response.text:
-                # Parse the response
-                result_text = response.text.strip()
-                
-                # Extract JSON from response
-                json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-                if json_match:
-                    try:
-                        result_json = json.loads(json_match.group())
-                        return result_json
-                    except json.JSONDecodeError:
-                        logger.warning(f"Invalid JSON in response for {image_path.name}")
-                        # Fallback to text parsing
-                        return self.parse_text_response(result_text, image_path.name)
-                else:
-                    # Fallback to text parsing
-                    return self.parse_text_response(result_text, image_path.name)
-            
-            return None
+            ]
+            return request_structured(
+                self.detection_model.model_name, detection_inputs,
+                lambda config: self.rate_limiter.call(
+                    self.detection_model.generate_content, detection_inputs, generation_config=config
+                ),
+                DetectionResult.from_json, DETECTION_SCHEMA, response_cache=self.response_cache
+            )
             
         except Exception as e:
             logger.error(f"Error detecting accessories in {image_path.name}: {e}")
             return None
 
-    def parse_text_response(self, response_text, image_name):
-        """Parse text response when JSON is not available."""
-        # Simple fallback parsing
-        detected_items = []
-        
-        lines = response_text.split('\n')
-        current_item = {}
-        
-        for line in lines:
-            line = line.strip().lower()
-            if 'label' in line or 'tag' in line or 'metal' in line or 'zipper' in line:
-                if current_item:
-                    detected_items.append(current_item)
-                current_item = {
-                    'item_type': 'unknown',
-                    'description': line,
-                    'location': 'unknown',
-                    'confidence': 0.7,
-                    'removal_priority': 'medium'
-                }
-            elif 'chest' in line or 'collar' in line or 'neck' in line:
-                if current_item:
-                    current_item['location'] = line
-            elif 'high' in line:
-                if current_item:
-                    current_item['confidence'] = 0.9
-                    current_item['removal_priority'] = 'high'
-        
-        if current_item:
-            detected_items.append(current_item)
-        
-        return {
-            'detected_items': detected_items,
-            'clothing_integrity': {
-                'missing_sleeves': False,
-                'missing_trousers': False,
-                'garment_complete': True,
-                'issues_found': []
-            },
-            'summary': {
-                'total_items': len(detected_items),
-                'high_priority': sum(1 for item in detected_items if item.get('removal_priority') == 'high'),
-                'medium_priority': sum(1 for item in detected_items if item.get('removal_priority') == 'medium'),
-                'clean_areas': []
-            }
+    def detect_accessories_packed(self, image_paths):
+        """Detect unwanted elements in several images with one request.
+        
+        Images are sent behind "IMAGE <index>" markers and the model answers with a
+        JSON array keyed by image_index. Any image missing from that answer (or the
+        whole batch, if it cannot be parsed) falls back to detect_accessories.
+        Returns a list of (image_path, result) in input order.
+        """
+        results = {}
+        detection_inputs = [self.packed_detection_prompt]
+        packed = []
+        
+        for image_path in image_paths:
+            img_data, width, height = self.load_image_data(image_path)
+            if not img_data:
+                results[image_path] = None
+                continue
+            detection_inputs.append(f"IMAGE {len(packed)} ({width}x{height})")
+            detection_inputs.append({"mime_type": "image/jpeg", "data": img_data})
+            packed.append(image_path)
+        
+        if packed:
+            logger.info(f"Processing {len(packed)} images in one request: {', '.join(p.name for p in packed)}")
+            try:
+                entries = request_structured(
+                    self.detection_model.model_name, detection_inputs,
+                    lambda config: self.rate_limiter.call(
+                        self.detection_model.generate_content, detection_inputs, generation_config=config
+                    ),
+                    self.parse_packed_entries, PACKED_DETECTION_SCHEMA, response_cache=self.response_cache
+                )
+            except Exception as e:
+                logger.warning(f"Packed detection failed for {len(packed)} images: {e}")
+                entries = {}
+            
+            for index, result in entries.items():
+                if 0 <= index < len(packed):
+                    results[packed[index]] = result
+            
+            missing = [image_path for image_path in packed if image_path not in results]
+            if missing:
+                logger.warning(f"Packed response missing {len(missing)}/{len(packed)} images, retrying them one by one")
+                for image_path in missing:
+                    results[image_path] = self.detect_accessories(image_path)
+        
+        return [(image_path, results[image_path]) for image_path in image_paths]
+
+    def parse_packed_entries(self, data):
+        """Validate a packed reply into {image_index: DetectionResult}.
+        
+        Entries that do not validate are left out (their images fall back to single
+        requests); only a reply that is not an array at all is rejected.
+        """
+        if not isinstance(data, list):
+            raise StructuredOutputError(f"expected an array, got {type(data).__name__}")
+        
+        entries = {}
+        for entry in data:
+            try:
+                index = entry['image_index']
+                if isinstance(index, int) and index not in entries:
+                    entries[index] = DetectionResult.from_json(entry)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping invalid packed entry: {e}")
+        return entries
+
+    def result_rows(self, image_name, result):
+        """Convert one DetectionResult into its accessory rows and integrity row."""
+        detection_rows = [{
+            'image_filename': image_name,
+            'item_type': item.item_type,
+            'description': item.description,
+            'location_on_attire': item.location,
+            'confidence_score': item.confidence,
+            'removal_priority': item.removal_priority,
+            'coordinates': json.dumps(item.coordinates)
+        } for item in result.detected_items]
+        
+        integrity = result.clothing_integrity
+        integrity_row = {
+            'image_filename': image_name,
+            'missing_sleeves': str(integrity.missing_sleeves),
+            'missing_trousers': str(integrity.missing_trousers),
+            'garment_complete': str(integrity.garment_complete),
+            'issues_found': str(integrity.issues_found)
         }
+        
+        return detection_rows, integrity_row
 
-    def process_all_images(self, sample_mode=False, max_images=None):
-        """Process all images in the processed directory."""
+    def process_all_images(self, sample_mode=False, max_images=None, workers=1, restart=False, pack_size=1):
+        """Process all images in the processed directory.
+        
+        Rows are appended and flushed to the CSVs as each image finishes, so an
+        interrupted run keeps its results. Every finished image has an integrity
+        row (written after its detection rows), so images in the integrity CSV are
+        skipped on the next run and detection rows without one are dropped and
+        redone (restart=True starts from empty files).
+        With pack_size > 1, images are sent pack_size per request.
+        """
         logger.info("Starting accessory detection for all processed images...")
         
         # Get list of images to process
@@ -256,79 +345,76 @@ IMPORTANT:
             images_to_process = images_to_process[:max_images]
             logger.info(f"Sample mode: processing {len(images_to_process)} images")
         
-        # Prepare CSV outputs
+        # CSV outputs, appended to as results arrive
         csv_file = self.output_dir / 'accessory_detection_results.csv'
         integrity_file = self.output_dir / 'clothing_integrity_report.csv'
-        csv_data = []
-        integrity_data = []
         
-        processed_count = 0
-        for i, image_path in enumerate(images_to_process, 1):
-            logger.info(f"Processing image {i}/{len(images_to_process)}: {image_path.name}")
-            
-            # Detect accessories
-            result = self.detect_accessories(image_path)
-            
-            if result and 'detected_items' in result:
-                # Add items to CSV data
-                for item in result['detected_items']:
-                    csv_data.append({
-                        'image_filename': image_path.name,
-                        'item_type': item.get('item_type', 'unknown'),
-                        'description': item.get('description', ''),
-                        'location_on_attire': item.get('location', 'unknown'),
-                        'confidence_score': item.get('confidence', 0.5),
-                        'removal_priority': item.get('removal_priority', 'medium'),
-                        'coordinates': json.dumps(item.get('coordinates', {}))
-                    })
-                
-                # Add clothing integrity data
-                if 'clothing_integrity' in result:
-                    integrity = result['clothing_integrity']
-                    integrity_data.append({
-                        'image_filename': image_path.name,
-                        'missing_sleeves': str(integrity.get('missing_sleeves', False)),
-                        'missing_trousers': str(integrity.get('missing_trousers', False)),
-                        'garment_complete': str(integrity.get('garment_complete', True)),
-                        'issues_found': str(integrity.get('issues_found', ''))
-                    })
-                
-                processed_count += 1
-                logger.info(f"Found {len(result['detected_items'])} items in {image_path.name}")
+        if restart:
+            for path in (csv_file, integrity_file):
+                path.unlink(missing_ok=True)
+        
+        # Resume: an image is finished once its integrity row is written
+        done = {row['image_filename'] for row in read_csv_rows(integrity_file)}
+        orphaned = {row['image_filename'] for row in read_csv_rows(csv_file)} - done
+        if orphaned:
+            logger.info(f"Redoing {len(orphaned)} images interrupted before their integrity row was written")
+            drop_csv_rows(csv_file, DETECTION_FIELDS, orphaned)
+        pending = [image_path for image_path in images_to_process if image_path.name not in done]
+        if len(pending) < len(images_to_process):
+            logger.info(f"Resuming: {len(images_to_process) - len(pending)} images already in results, {len(pending)} to process")
+        
+        csv_handle, csv_writer = open_csv_appender(csv_file, DETECTION_FIELDS)
+        integrity_handle, integrity_writer = open_csv_appender(integrity_file, INTEGRITY_FIELDS)
+        
+        def record(i, image_path, result):
+            if result is not None:
+                detection_rows, integrity_row = self.result_rows(image_path.name, result)
+                csv_writer.writerows(detection_rows)
+                csv_handle.flush()
+                integrity_writer.writerow(integrity_row)
+                integrity_handle.flush()
+                logger.info(f"Found {len(detection_rows)} items in {image_path.name} ({i}/{len(pending)})")
             else:
-                logger.info(f"No items detected in {image_path.name}")
-            
-            # Rate limiting
-            if i < len(images_to_process):
-                time.sleep(0.5)
-        
-        # Write CSV files
-        if csv_data:
-            with open(csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = [
-                    'image_filename', 'item_type', 'description', 'location_on_attire',
-                    'confidence_score', 'removal_priority', 'coordinates'
-                ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(csv_data)
-            
-            logger.info(f"Accessory detection results saved to {csv_file}")
-        
-        # Write clothing integrity report
-        if integrity_data:
-            with open(integrity_file, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = [
-                    'image_filename', 'missing_sleeves', 'missing_trousers', 
-                    'garment_complete', 'issues_found'
-                ]
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(integrity_data)
-            
-            logger.info(f"Clothing integrity report saved to {integrity_file}")
+                logger.info(f"No items detected in {image_path.name} ({i}/{len(pending)})")
+        
+        # Each unit of work is one request: a single image, or a pack of them
+        if pack_size > 1:
+            packs = [pending[i:i + pack_size] for i in range(0, len(pending), pack_size)]
+            detect = self.detect_accessories_packed
+            logger.info(f"Packed mode: {pack_size} images per request ({len(packs)} requests)")
+        else:
+            packs = [[image_path] for image_path in pending]
+            detect = lambda pack: [(pack[0], self.detect_accessories(pack[0]))]
+        
+        completed = 0
+        try:
+            if workers > 1:
+                logger.info(f"Concurrent mode: {workers} requests in flight")
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(detect, pack) for pack in packs]
+                    for future in as_completed(futures):
+                        for image_path, result in future.result():
+                            completed += 1
+                            record(completed, image_path, result)
+            else:
+                for pack in packs:
+                    logger.info(f"Processing image {completed + 1}/{len(pending)}: {', '.join(p.name for p in pack)}")
+                    for image_path, result in detect(pack):
+                        completed += 1
+                        record(completed, image_path, result)
+        finally:
+            csv_handle.close()
+            integrity_handle.close()
+        
+        self.response_cache.log_stats()
+        logger.info(f"Accessory detection results saved to {csv_file}")
+        logger.info(f"Clothing integrity report saved to {integrity_file}")
         
-        # Generate summary report
+        # Summarize everything in the files, including rows from earlier runs
+        image_names = {image_path.name for image_path in images_to_process}
+        csv_data = [row for row in read_csv_rows(csv_file) if row['image_filename'] in image_names]
+        integrity_data = [row for row in read_csv_rows(integrity_file) if row['image_filename'] in image_names]
+        processed_count = len({row['image_filename'] for row in csv_data + integrity_data})
         self.generate_summary_report(csv_data, integrity_data, processed_count, len(images_to_process))
         
         return len(csv_data), processed_count
@@ -407,6 +493,24 @@ IMPORTANT:
 
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description='Detect labels, accessories and integrity issues in processed images')
+    parser.add_argument('--workers', '-w',
+                       type=int,
+                       default=1,
+                       help='Number of images detected concurrently (default: 1)')
+    parser.add_argument('--pack-size', '-p',
+                       type=int,
+                       default=1,
+                       help='Images sent per detection request; missing answers fall back to single requests (default: 1)')
+    parser.add_argument('--max-images', '-n',
+                       type=int,
+                       help='Only process the first N images')
+    parser.add_argument('--restart',
+                       action='store_true',
+                       help='Discard existing results instead of resuming from them')
+    
+    args = parser.parse_args()
+    
     try:
         # Initialize detector
         detector = AccessoryDetector()
@@ -414,8 +518,10 @@ def main():
         # Process all processed images
         logger.info("Starting accessory detection for all processed images...")
         
-        # Process in sample mode first to test
-        total_items, processed_images = detector.process_all_images(sample_mode=False)
+        total_items, processed_images = detector.process_all_images(
+            sample_mode=bool(args.max_images), max_images=args.max_images,
+            workers=args.workers, restart=args.restart, pack_size=args.pack_size
+        )
         
         logger.info(f"Detection complete: {total_items} items found in {processed_images} images")
         logger.info(f"Results saved to detection_results/ directory")
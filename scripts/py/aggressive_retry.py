@@ -8,7 +8,6 @@ import google.generativeai as genai
 import base64
 from io import BytesIO
 from PIL import Image
-import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -57,10 +56,11 @@ def aggressive_retry():
             logger.info(f"Strategy {i}: {prompt[:100]}...")
             
             try:
-                response = remover.model.generate_content([
-                    prompt,
-                    {"mime_type": "image/jpeg", "data": img_data}
-                ])
+                with remover.rate_limiter.slot():
+                    response = remover.model.generate_content([
+                        prompt,
+                        {"mime_type": "image/jpeg", "data": img_data}
+                    ])
                 
                 if response and response.candidates and response.candidates[0].content.parts:
                     for part in response.candidates[0].content.parts:
@@ -84,10 +84,6 @@ def aggressive_retry():
                 
             except Exception as e:
                 logger.error(f"Strategy {i} - Error: {e}")
-            
-            # Brief pause between attempts
-            if i < len(prompts):
-                time.sleep(1)
         
         logger.error("❌ All strategies failed")
         
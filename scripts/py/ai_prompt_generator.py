@@ -7,12 +7,12 @@ Uses Gemini Pro to generate optimized correction prompts based on detection data
 import os
 import csv
 import json
-import time
 import logging
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
 
 # Configure logging
 logging.basicConfig(
@@ -38,6 +38,7 @@ class AIPromptGenerator:
         # Configure Gemini API
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel('models/gemini-2.5-pro')  # Using Gemini Pro for text generation
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-pro')
         
         self.combined_data_file = Path('detection_results/combined_detection_data.csv')
         
@@ -138,10 +139,11 @@ The prompt should be detailed, specific, and actionable."""
         try:
             logger.info(f"Generating AI prompt for {row['image_filename']}")
             
-            response = self.model.generate_content([
-                system_prompt,
-                user_prompt
-            ])
+            with self.rate_limiter.slot():
+                response = self.model.generate_content([
+                    system_prompt,
+                    user_prompt
+                ])
             
             if response and response.text:
                 generated_prompt = response.text.strip()
@@ -269,10 +271,6 @@ The prompt should be detailed, specific, and actionable."""
                 logger.error(f"Failed to generate prompt for {row['image_filename']}: {e}")
                 row['generated_prompt'] = self.generate_fallback_prompt(row)
                 failed += 1
-            
-            # Rate limiting
-            if i < len(images_needing_processing):
-                time.sleep(0.5)
         
         # Update the combined data file
         self.update_combined_data(data)
@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Branding Engine
+One logo-stamping engine driven by declarative profiles. Each profile describes a
+branded variant (logo file, source and output directories, size ratio and limits,
+padding, single or dual layout). The engine decodes every source image once and
+writes all requested variants from that single decode, compositing each logo in
+place and restoring the touched region between variants.
+
+Each output directory keeps a manifest (.branding_manifest.json) recording, per
+output file, the hash of the source image and of the profile (logo files plus every
+parameter that affects the pixels). Re-runs skip outputs whose recorded hashes still
+match, so only new or changed sources - or every source of a changed profile - are
+stamped again. Pass --force to re-stamp everything.
+
+Usage:
+    python branding_engine.py enhanced unified dual --workers 4
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import argparse
+from functools import partial
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from logo_processing import load_transparent_logo, stamp_images, OverlayCache
+
+logger = logging.getLogger(__name__)
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg', '.JPG', '.JPEG')
+PNG_EXTENSIONS = ('.png', '.PNG')
+
+MANIFEST_NAME = '.branding_manifest.json'
+MANIFEST_VERSION = 1
+# Profile fields that only say where files live - they do not change the stamped pixels
+_LOCATION_FIELDS = ('name', 'source_dir', 'output_dir', 'image_extensions')
+
+
+@dataclass(frozen=True)
+class BrandingProfile:
+    """Declarative description of one branded output variant."""
+    name: str
+    logo_path: str
+    source_dir: str
+    output_dir: str
+    image_extensions: Tuple[str, ...] = JPEG_EXTENSIONS
+    logo_width_ratio: float = 0.35  # Fraction of image width
+    min_logo_width: int = 200
+    max_logo_width: int = 700
+    padding_bottom: int = 15
+    padding_right: int = 15
+    # Logo conversion (see logo_processing.convert_logo_to_transparent)
+    white_threshold: int = 240
+    black_threshold: int = 50
+    white_is_content: bool = False
+    # Dual layout: secondary logo stacked above the primary one
+    secondary_logo_path: Optional[str] = None
+    secondary_size_ratio: float = 0.6
+    logo_spacing: int = 10
+    jpeg_quality: int = 95
+
+
+PROFILES: Dict[str, BrandingProfile] = {profile.name: profile for profile in [
+    # Chesspiece name logo (white on black artwork), large placement
+    BrandingProfile(
+        name='enhanced', logo_path='logos/chesspiece-name.jpg',
+        source_dir='product-assets/processed', output_dir='product-assets/with_logos_enhanced',
+        logo_width_ratio=0.40, min_logo_width=250, max_logo_width=800, padding_bottom=10, padding_right=15,
+        white_threshold=200, white_is_content=True
+    ),
+    # First-generation placement of the same logo
+    BrandingProfile(
+        name='original', logo_path='logos/chesspiece-name.jpg',
+        source_dir='product-assets/processed', output_dir='product-assets/with_logos',
+        logo_width_ratio=0.25, min_logo_width=150, max_logo_width=600, padding_bottom=20, padding_right=20,
+        white_threshold=200, white_is_content=True
+    ),
+    BrandingProfile(
+        name='unified', logo_path='logos/unified-logo.jpg',
+        source_dir='product-assets/processed', output_dir='product-assets/with_unified_logos'
+    ),
+    BrandingProfile(
+        name='dual', logo_path='logos/name-black.jpg', secondary_logo_path='logos/chesspiece.jpg',
+        source_dir='product-assets/processed', output_dir='product-assets/with_dual_logos'
+    ),
+    BrandingProfile(
+        name='styled', logo_path='logos/unified-logo.jpg',
+        source_dir='output/styled_images', output_dir='output/styled_with_logos',
+        image_extensions=PNG_EXTENSIONS, logo_width_ratio=0.30, min_logo_width=180, max_logo_width=600
+    ),
+    BrandingProfile(
+        name='new_designs', logo_path='logos/unified-logo.jpg',
+        source_dir='new_designs/processed', output_dir='new_designs/with_logos'
+    ),
+    BrandingProfile(
+        name='whatsapp_edward', logo_path='logos/unified-logo.jpg',
+        source_dir='whatsapp-from-edward/processed', output_dir='whatsapp-from-edward/with_unified_logos'
+    ),
+    BrandingProfile(
+        name='whatsapp_edward_chosen', logo_path='logos/unified-logo.jpg',
+        source_dir='whatsapp-from-edward/chosen', output_dir='whatsapp-from-edward/with_unified_logos',
+        image_extensions=JPEG_EXTENSIONS + PNG_EXTENSIONS
+    ),
+]}
+
+
+def find_source_images(source_dir, image_extensions: Iterable[str]) -> List[Path]:
+    """List the images in source_dir with one of the given extensions."""
+    image_extensions = set(image_extensions)
+    return [
+        file_path for file_path in Path(source_dir).iterdir()
+        if file_path.is_file() and file_path.suffix in image_extensions
+    ]
+
+
+def _file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BrandingManifest:
+    """Records what every output was stamped from, one JSON file per output directory.
+
+    An entry is up to date when the output exists and both the source hash and the
+    profile hash match. Source hashes are reused while a file's size and mtime are
+    unchanged, so a re-run over an unchanged directory only stats the files.
+    """
+
+    def __init__(self, profiles: Iterable[BrandingProfile]):
+        self._entries: Dict[Path, Dict[str, dict]] = {}
+        self._dirty = set()
+        self._profile_hashes: Dict[str, str] = {}
+        self._source_hashes: Dict[Path, Tuple[int, int, str]] = {}
+
+        for profile in profiles:
+            output_dir = Path(profile.output_dir)
+            if output_dir not in self._entries:
+                self._entries[output_dir] = self._load(output_dir / MANIFEST_NAME)
+            self._profile_hashes[profile.name] = self.profile_hash(profile)
+
+        # Seed the stat cache from previous runs
+        for entries in self._entries.values():
+            for entry in entries.values():
+                source = Path(entry['source'])
+                self._source_hashes.setdefault(source, (entry['size'], entry['mtime_ns'], entry['source_sha256']))
+
+    @staticmethod
+    def _load(manifest_path: Path) -> Dict[str, dict]:
+        try:
+            with open(manifest_path) as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                return data.get('outputs', {})
+            logger.info(f"Ignoring manifest with old version: {manifest_path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return {}
+
+    @staticmethod
+    def profile_hash(profile: BrandingProfile) -> str:
+        """Hash of the logo file(s) and every profile parameter that affects the output."""
+        params = {k: v for k, v in asdict(profile).items() if k not in _LOCATION_FIELDS}
+        params['logo_sha256'] = _file_sha256(profile.logo_path)
+        if profile.secondary_logo_path:
+            params['secondary_logo_sha256'] = _file_sha256(profile.secondary_logo_path)
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def source_hash(self, image_path: Path) -> Tuple[int, int, str]:
+        """(size, mtime_ns, sha256) of a source, hashing only when the stat changed."""
+        stat = image_path.stat()
+        cached = self._source_hashes.get(image_path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached
+        cached = (stat.st_size, stat.st_mtime_ns, _file_sha256(image_path))
+        self._source_hashes[image_path] = cached
+        return cached
+
+    def is_current(self, profile: BrandingProfile, image_path: Path) -> bool:
+        output_path = Path(profile.output_dir) / image_path.name
+        entry = self._entries[Path(profile.output_dir)].get(image_path.name)
+        return (
+            entry is not None
+            and entry['profile_sha256'] == self._profile_hashes[profile.name]
+            and entry['source_sha256'] == self.source_hash(image_path)[2]
+            and output_path.exists()
+        )
+
+    def record(self, profile: BrandingProfile, image_path: Path):
+        size, mtime_ns, source_sha256 = self.source_hash(image_path)
+        output_dir = Path(profile.output_dir)
+        self._entries[output_dir][image_path.name] = {
+            'source': str(image_path),
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'source_sha256': source_sha256,
+            'profile': profile.name,
+            'profile_sha256': self._profile_hashes[profile.name],
+        }
+        self._dirty.add(output_dir)
+
+    def save(self):
+        """Write the changed manifests (atomically, so an interrupted run keeps the old one)."""
+        for output_dir in self._dirty:
+            manifest_path = output_dir / MANIFEST_NAME
+            tmp_path = manifest_path.with_name(manifest_path.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION, 'outputs': self._entries[output_dir]}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, manifest_path)
+        self._dirty.clear()
+
+
+class BrandingEngine:
+    """Stamps every profile's logo onto each source image from a single decode."""
+
+    def __init__(self, profiles: Iterable[BrandingProfile]):
+        self.profiles = list(profiles)
+        self.overlay_cache = OverlayCache()
+        self._logos: Dict[Tuple, Image.Image] = {}
+
+        for profile in self.profiles:
+            self._logo(profile, profile.logo_path)
+            if profile.secondary_logo_path:
+                self._logo(profile, profile.secondary_logo_path)
+            Path(profile.output_dir).mkdir(parents=True, exist_ok=True)
+
+        logger.info(f"BrandingEngine initialized with profiles: {', '.join(p.name for p in self.profiles)}")
+
+    def _logo_key(self, profile: BrandingProfile, logo_path: str) -> Tuple:
+        return (logo_path, profile.white_threshold, profile.black_threshold, profile.white_is_content)
+
+    def _logo(self, profile: BrandingProfile, logo_path: str) -> Image.Image:
+        """Load (once) the transparent version of a logo with the profile's thresholds."""
+        key = self._logo_key(profile, logo_path)
+        if key not in self._logos:
+            if not Path(logo_path).exists():
+                raise ValueError(f"Logo not found: {logo_path}")
+            self._logos[key] = load_transparent_logo(
+                logo_path, profile.white_threshold, profile.black_threshold, profile.white_is_content
+            )
+            logger.info(f"Logo processed: {logo_path} {self._logos[key].size} -> black on transparent background")
+        return self._logos[key]
+
+    def calculate_logo_size(self, profile: BrandingProfile, image_size) -> Tuple[int, int]:
+        """Primary logo size: width ratio of the image, clamped to the profile's limits."""
+        logo = self._logo(profile, profile.logo_path)
+        logo_width = int(image_size[0] * profile.logo_width_ratio)
+        logo_width = max(profile.min_logo_width, min(logo_width, profile.max_logo_width))
+        logo_height = int(logo_width * logo.height / logo.width)
+        return (logo_width, logo_height)
+
+    def overlay_for(self, profile: BrandingProfile, image_size) -> Tuple[Image.Image, Tuple[int, int]]:
+        """Return the ready-to-paste overlay and its bottom-right position for an image size."""
+        img_width, img_height = image_size
+        logo_size = self.calculate_logo_size(profile, image_size)
+        logo_width, logo_height = logo_size
+        logo_x = img_width - logo_width - profile.padding_right
+        logo_y = img_height - logo_height - profile.padding_bottom
+
+        primary_key = self._logo_key(profile, profile.logo_path)
+        if not profile.secondary_logo_path:
+            overlay = self.overlay_cache.resized(primary_key, self._logos[primary_key], logo_size)
+            return overlay, (logo_x, logo_y)
+
+        # Dual layout - secondary logo centred above the primary one, composited once per size
+        secondary_key = self._logo_key(profile, profile.secondary_logo_path)
+        secondary_logo = self._logos[secondary_key]
+        secondary_width = int(logo_width * profile.secondary_size_ratio)
+        secondary_size = (secondary_width, int(secondary_width * secondary_logo.height / secondary_logo.width))
+
+        overlay = self.overlay_cache.get(
+            (primary_key, secondary_key), (logo_size, secondary_size), ('dual', profile.logo_spacing),
+            lambda: self._build_dual_tile(profile, logo_size, secondary_size)
+        )
+        return overlay, (logo_x, logo_y - secondary_size[1] - profile.logo_spacing)
+
+    def _build_dual_tile(self, profile: BrandingProfile, logo_size, secondary_size) -> Image.Image:
+        primary_logo = self._logo(profile, profile.logo_path)
+        secondary_logo = self._logo(profile, profile.secondary_logo_path)
+
+        tile_width = max(logo_size[0], secondary_size[0])
+        tile_height = logo_size[1] + secondary_size[1] + profile.logo_spacing
+        tile = Image.new('RGBA', (tile_width, tile_height), (0, 0, 0, 0))
+
+        resized_primary = primary_logo.resize(logo_size, Image.Resampling.LANCZOS)
+        resized_secondary = secondary_logo.resize(secondary_size, Image.Resampling.LANCZOS)
+
+        primary_y = tile_height - logo_size[1]  # Primary logo at bottom
+        secondary_y = primary_y - secondary_size[1] - profile.logo_spacing
+        tile.paste(resized_primary, ((tile_width - logo_size[0]) // 2, primary_y), resized_primary)
+        tile.paste(resized_secondary, ((tile_width - secondary_size[0]) // 2, secondary_y), resized_secondary)
+        return tile
+
+    def brand_image(self, image_path: Path, profile_names: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """Decode one source image and write every profile's variant (or only profile_names);
+        return success per profile."""
+        profiles = self.profiles
+        if profile_names is not None:
+            profile_names = set(profile_names)
+            profiles = [profile for profile in self.profiles if profile.name in profile_names]
+
+        try:
+            with Image.open(image_path) as img:
+                if img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.load()
+        except Exception as e:
+            logger.error(f"Error loading {image_path.name}: {e}")
+            return {profile.name: False for profile in profiles}
+
+        results = {}
+        for profile in profiles:
+            original_region = None
+            try:
+                overlay, position = self.overlay_for(profile, img.size)
+                box = (position[0], position[1], position[0] + overlay.width, position[1] + overlay.height)
+
+                # Composite in place, then put the region back for the next variant
+                original_region = img.crop(box)
+                img.paste(overlay, position, overlay)
+
+                output_path = Path(profile.output_dir) / image_path.name
+                img.save(output_path, 'JPEG', quality=profile.jpeg_quality)
+                results[profile.name] = True
+            except Exception as e:
+                logger.error(f"Error adding {profile.name} logo to {image_path.name}: {e}")
+                results[profile.name] = False
+            finally:
+                if original_region is not None:
+                    img.paste(original_region, position)
+
+        return results
+
+    def _brand_job(self, job: Tuple[Path, Tuple[str, ...]]) -> Dict[str, bool]:
+        return self.brand_image(*job)
+
+    def run(self, image_paths: List[Path], workers: int = 1, force: bool = False) -> Dict[str, Tuple[int, int]]:
+        """Brand all images whose outputs are missing or stale (all of them with force);
+        return (successful, failed) per profile. Up-to-date outputs count as successful."""
+        counts = {profile.name: [0, 0] for profile in self.profiles}
+        manifest = BrandingManifest(self.profiles)
+
+        # Work out which variants of which images actually need stamping
+        jobs = []
+        for image_path in image_paths:
+            stale = []
+            for profile in self.profiles:
+                if not force and manifest.is_current(profile, image_path):
+                    counts[profile.name][0] += 1
+                else:
+                    stale.append(profile.name)
+            if stale:
+                jobs.append((image_path, tuple(stale)))
+
+        logger.info(f"{len(image_paths) - len(jobs)} of {len(image_paths)} images already up to date, {len(jobs)} to stamp")
+
+        factory = partial(BrandingEngine, self.profiles)
+        profiles_by_name = {profile.name: profile for profile in self.profiles}
+        try:
+            for i, ((image_path, _), results) in enumerate(
+                    stamp_images(self, jobs, workers, method_name='_brand_job', factory=factory), 1):
+                for name, success in results.items():
+                    counts[name][0 if success else 1] += 1
+                    if success:
+                        manifest.record(profiles_by_name[name], image_path)
+                logger.info(f"Processed image {i}/{len(jobs)}: {image_path.name}")
+
+                # Progress update (and checkpoint) every 10 images
+                if i % 10 == 0:
+                    manifest.save()
+                    logger.info("Progress: " + ", ".join(f"{name} {ok}/{len(image_paths)}" for name, (ok, _) in counts.items()))
+        finally:
+            manifest.save()
+
+        return {name: (ok, failed) for name, (ok, failed) in counts.items()}
+
+
+class ProfileLogoAdder:
+    """Single-profile adder exposing the per-script API (process_single_image,
+    batch_process_images, test_with_sample). Subclasses set profile_name."""
+
+    profile_name: Optional[str] = None
+
+    def __init__(self, profile: Optional[BrandingProfile] = None):
+        self.profile = profile or PROFILES[self.profile_name]
+        self.processed_dir = Path(self.profile.source_dir)
+        self.with_logos_dir = Path(self.profile.output_dir)
+        self.engine = BrandingEngine([self.profile])
+
+        logger.info(f"{type(self).__name__} initialized successfully")
+
+    def find_images(self) -> List[Path]:
+        return find_source_images(self.processed_dir, self.profile.image_extensions)
+
+    def process_single_image(self, image_path: Path) -> bool:
+        """Process a single image and save result."""
+        logger.info(f"Processing {image_path.name}...")
+        success = self.engine.brand_image(image_path)[self.profile.name]
+        if success:
+            logger.info(f"Successfully processed: {image_path.name}")
+        return success
+
+    def batch_process_images(self, max_images=None, workers=1, force=False):
+        """Process all images in the source directory, skipping outputs that are already up to date."""
+        logger.info(f"Starting batch {self.profile.name} logo addition...")
+
+        images_to_process = self.find_images()
+
+        # Limit processing if specified
+        if max_images:
+            images_to_process = images_to_process[:max_images]
+            logger.info(f"Sample mode: processing {len(images_to_process)} images")
+        else:
+            logger.info(f"Found {len(images_to_process)} images to process")
+
+        successful, failed = self.engine.run(images_to_process, workers, force=force)[self.profile.name]
+
+        logger.info(f"Batch {self.profile.name} logo addition complete: {successful}/{len(images_to_process)} successful")
+        return successful, failed
+
+    def test_with_sample(self, sample_size=3, force=False):
+        """Test the logo addition with a small sample of images.
+
+        The sample is recorded in the manifest, so a following batch run does not stamp it again.
+        """
+        logger.info(f"Testing with sample of {sample_size} images...")
+
+        # Take first few images for testing
+        test_images = self.find_images()[:sample_size]
+
+        successful, failed = self.engine.run(test_images, force=force)[self.profile.name]
+
+        logger.info(f"Test complete: {successful}/{len(test_images)} successful")
+        return successful, failed
+
+
+def main():
+    """Brand one or more profiles, decoding each source image once per source directory."""
+    parser = argparse.ArgumentParser(description='Write several branded variants of the same images in one pass')
+    parser.add_argument('profiles',
+                       nargs='+',
+                       choices=sorted(PROFILES),
+                       help='Profiles (variants) to produce')
+    parser.add_argument('--source', '-s',
+                       help='Override the source directory of every selected profile')
+    parser.add_argument('--workers', '-w',
+                       type=int,
+                       default=1,
+                       help='Number of worker processes (default: 1)')
+    parser.add_argument('--max-images', '-n',
+                       type=int,
+                       help='Only process the first N images of each source directory')
+    parser.add_argument('--force', '-f',
+                       action='store_true',
+                       help='Re-stamp every image even if its output is up to date')
+
+    args = parser.parse_args()
+
+    # Profiles sharing a source directory are produced from the same decode
+    groups: Dict[str, List[BrandingProfile]] = {}
+    for name in dict.fromkeys(args.profiles):
+        profile = PROFILES[name]
+        groups.setdefault(args.source or profile.source_dir, []).append(profile)
+
+    try:
+        for source_dir, profiles in groups.items():
+            extensions = {ext for profile in profiles for ext in profile.image_extensions}
+            images = find_source_images(source_dir, extensions)
+            if args.max_images:
+                images = images[:args.max_images]
+            logger.info(f"Branding {len(images)} images from {source_dir}: {', '.join(p.name for p in profiles)}")
+
+            counts = BrandingEngine(profiles).run(images, workers=args.workers, force=args.force)
+            for name, (successful, failed) in counts.items():
+                logger.info(f"{name}: {successful} successful, {failed} failed -> {PROFILES[name].output_dir}")
+
+    except Exception as e:
+        logger.error(f"Fatal error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('branding.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    main()
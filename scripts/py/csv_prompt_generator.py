@@ -6,13 +6,14 @@ Analyzes detection data from two CSV files and creates a single CSV with image f
 
 import os
 import csv
-import json
-import time
 import logging
 from pathlib import Path
 from typing import Dict, List, Any, Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
+from response_cache import get_response_cache
+from detection_store import DetectionStore, STORE_NAME
 
 # Configure logging
 logging.basicConfig(
@@ -38,16 +39,19 @@ class CSVPromptGenerator:
         # Configure Gemini API
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel('models/gemini-2.5-pro')
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-pro')
+        self.response_cache = get_response_cache()
         
         # File paths
         self.accessory_file = Path('detection_results/accessory_detection_results.csv')
         self.integrity_file = Path('detection_results/clothing_integrity_report.csv')
         self.output_file = Path('detection_results/image_prompts.csv')
+        self.detection_store = DetectionStore(self.accessory_file.parent / STORE_NAME)
         
         logger.info("CSV Prompt Generator initialized with Gemini 2.5 Pro")
 
     def load_accessory_data(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Load accessory detection data."""
+        """Load accessory detection data (via the detection store)."""
         data = {}
         
         if not self.accessory_file.exists():
@@ -55,29 +59,18 @@ class CSVPromptGenerator:
             return data
         
         try:
-            with open(self.accessory_file, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                for row in reader:
-                    filename = row['image_filename']
-                    if filename not in data:
-                        data[filename] = []
-                    
-                    # Parse coordinates
-                    try:
-                        coordinates = json.loads(row['coordinates'].replace('""', '"'))
-                    except:
-                        coordinates = {'x': 0, 'y': 0, 'width': 0, 'height': 0}
-                    
-                    data[filename].append({
-                        'type': 'accessory',
-                        'item_type': row['item_type'],
-                        'description': row['description'],
-                        'location': row['location_on_attire'],
-                        'confidence': float(row['confidence_score']),
-                        'priority': row['removal_priority'],
-                        'coordinates': coordinates
-                    })
+            self.detection_store.sync_csv(self.accessory_file, 'detections')
+            
+            for filename in self.detection_store.images_with_detections():
+                data[filename] = [{
+                    'type': 'accessory',
+                    'item_type': row['item_type'],
+                    'description': row['description'],
+                    'location': row['location_on_attire'],
+                    'confidence': row['confidence_score'],
+                    'priority': row['removal_priority'],
+                    'coordinates': row['coordinates']
+                } for row in self.detection_store.detections_for_image(filename)]
             
             logger.info(f"Loaded accessory data for {len(data)} images")
             
@@ -87,7 +80,7 @@ class CSVPromptGenerator:
         return data
 
     def load_integrity_data(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Load clothing integrity data."""
+        """Load clothing integrity data (via the detection store)."""
         data = {}
         
         if not self.integrity_file.exists():
@@ -95,27 +88,17 @@ class CSVPromptGenerator:
             return data
         
         try:
-            with open(self.integrity_file, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                for row in reader:
-                    filename = row['image_filename']
-                    if filename not in data:
-                        data[filename] = []
-                    
-                    # Parse issues found
-                    try:
-                        issues_found = json.loads(row['issues_found'].replace('""', '"'))
-                    except:
-                        issues_found = [row['issues_found']] if row['issues_found'] else []
-                    
-                    data[filename].append({
-                        'type': 'integrity',
-                        'missing_sleeves': row['missing_sleeves'].upper() == 'TRUE',
-                        'missing_trousers': row['missing_trousers'].upper() == 'TRUE',
-                        'garment_complete': row['garment_complete'].upper() == 'TRUE',
-                        'issues_found': issues_found
-                    })
+            self.detection_store.sync_csv(self.integrity_file, 'integrity')
+            
+            for filename in self.detection_store.images_with_integrity():
+                row = self.detection_store.integrity_for_image(filename)
+                data[filename] = [{
+                    'type': 'integrity',
+                    'missing_sleeves': row['missing_sleeves'],
+                    'missing_trousers': row['missing_trousers'],
+                    'garment_complete': row['garment_complete'],
+                    'issues_found': row['issues_found']
+                }]
             
             logger.info(f"Loaded integrity data for {len(data)} images")
             
@@ -203,10 +186,11 @@ Do not include background changes, lighting, or other presentation details - jus
         try:
             logger.info(f"Generating prompt for {image_filename}")
             
-            response = self.model.generate_content([
-                system_prompt,
-                user_prompt
-            ])
+            prompt_inputs = [system_prompt, user_prompt]
+            response = self.response_cache.generate_content(
+                self.model.model_name, prompt_inputs,
+                lambda: self.rate_limiter.call(self.model.generate_content, prompt_inputs)
+            )
             
             if response and response.text:
                 generated_prompt = response.text.strip()
@@ -276,10 +260,6 @@ Do not include background changes, lighting, or other presentation details - jus
                 # Use fallback prompt
                 prompts[image_filename] = self.generate_fallback_prompt(detection_data)
                 failed += 1
-            
-            # Rate limiting
-            if i < len(combined_data):
-                time.sleep(0.5)
         
         results = {
             'total_processed': len(combined_data),
@@ -289,6 +269,7 @@ Do not include background changes, lighting, or other presentation details - jus
             'prompts': prompts
         }
         
+        self.response_cache.log_stats()
         logger.info(f"Batch prompt generation complete: {successful}/{len(combined_data)} successful")
         return results
 
@@ -1,17 +1,20 @@
 #!/usr/bin/env python3
 """
 Detection Data Loader and Integration System
-Loads CSV detection data and integrates it with the image generation pipeline
-for targeted removal of unwanted elements.
+Loads detection data and integrates it with the image generation pipeline
+for targeted removal of unwanted elements. The detection CSVs are synced into an
+indexed SQLite store (detection_store.py) and queried per image on demand.
 """
 
-import os
-import csv
+import sys
 import json
+import heapq
 import logging
+import threading
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+from detection_store import DetectionStore, STORE_NAME
 
 # Configure logging
 logging.basicConfig(
@@ -20,128 +23,254 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
+class CodeTable:
+    """Interns repeated strings (item types, locations, priorities) as small integer codes."""
+    
+    def __init__(self, initial=()):
+        self._codes: Dict[str, int] = {}
+        self._values: List[str] = []
+        self._lock = threading.Lock()
+        for value in initial:
+            self.code(value)
+    
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(value)
+                if code is None:
+                    code = len(self._values)
+                    self._values.append(sys.intern(value))
+                    self._codes[value] = code
+        return code
+    
+    def value(self, code: int) -> str:
+        return self._values[code]
+
+ITEM_TYPES = CodeTable()
+LOCATIONS = CodeTable()
+PRIORITIES = CodeTable(('high', 'medium', 'low'))
+
+COORDINATE_KEYS = ('x', 'y', 'width', 'height')
+
+def _coordinate(value) -> int:
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return 0
+
+def pack_coordinates(coordinates) -> Tuple[Optional[int], ...]:
+    """Coordinates (dict or JSON string) to an (x, y, width, height) tuple; absent keys are None."""
+    if isinstance(coordinates, str):
+        try:
+            coordinates = json.loads(coordinates.replace('""', '"'))
+        except json.JSONDecodeError:
+            coordinates = {'x': 0, 'y': 0, 'width': 0, 'height': 0}
+    coordinates = coordinates or {}
+    return tuple(_coordinate(coordinates[key]) if key in coordinates else None for key in COORDINATE_KEYS)
+
+def _as_bool(value) -> bool:
+    return value.upper() == 'TRUE' if isinstance(value, str) else bool(value)
+
 class DetectionItem:
-    """Represents a single detected unwanted item."""
-    image_filename: str
-    item_type: str
-    description: str
-    location_on_attire: str
-    confidence_score: float
-    removal_priority: str
-    coordinates: Dict[str, int]
-    
-    def __post_init__(self):
-        # Convert coordinates to integers if they're strings
-        if isinstance(self.coordinates, str):
-            try:
-                self.coordinates = json.loads(self.coordinates.replace('""', '"'))
-            except json.JSONDecodeError:
-                self.coordinates = {'x': 0, 'y': 0, 'width': 0, 'height': 0}
-        
-        # Convert coordinates to integers
-        for key in self.coordinates:
-            if isinstance(self.coordinates[key], str):
-                try:
-                    self.coordinates[key] = int(self.coordinates[key])
-                except (ValueError, TypeError):
-                    self.coordinates[key] = 0
+    """Represents a single detected unwanted item.
+    
+    Slotted; item type, location and priority are held as CodeTable codes and the
+    coordinates as a tuple. Attributes read and assign exactly like the plain fields.
+    """
+    __slots__ = ('image_filename', 'description', 'confidence_score',
+                 '_item_type', '_location', '_priority', '_coordinates')
+    
+    def __init__(self, image_filename: str, item_type: str, description: str, location_on_attire: str,
+                 confidence_score: float, removal_priority: str, coordinates):
+        self.image_filename = image_filename
+        self.item_type = item_type
+        self.description = description
+        self.location_on_attire = location_on_attire
+        self.confidence_score = confidence_score
+        self.removal_priority = removal_priority
+        self.coordinates = coordinates
+    
+    @property
+    def item_type(self) -> str:
+        return ITEM_TYPES.value(self._item_type)
+    
+    @item_type.setter
+    def item_type(self, value: str):
+        self._item_type = ITEM_TYPES.code(value)
+    
+    @property
+    def location_on_attire(self) -> str:
+        return LOCATIONS.value(self._location)
+    
+    @location_on_attire.setter
+    def location_on_attire(self, value: str):
+        self._location = LOCATIONS.code(value)
+    
+    @property
+    def removal_priority(self) -> str:
+        return PRIORITIES.value(self._priority)
+    
+    @removal_priority.setter
+    def removal_priority(self, value: str):
+        self._priority = PRIORITIES.code(value)
+    
+    @property
+    def coordinates(self) -> Dict[str, int]:
+        return {key: value for key, value in zip(COORDINATE_KEYS, self._coordinates) if value is not None}
+    
+    @coordinates.setter
+    def coordinates(self, value):
+        self._coordinates = pack_coordinates(value)
+    
+    def _fields(self) -> Tuple:
+        return (self.image_filename, self.item_type, self.description, self.location_on_attire,
+                self.confidence_score, self.removal_priority, self.coordinates)
+    
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+    
+    def __repr__(self):
+        names = ('image_filename', 'item_type', 'description', 'location_on_attire',
+                 'confidence_score', 'removal_priority', 'coordinates')
+        return f"DetectionItem({', '.join(f'{name}={value!r}' for name, value in zip(names, self._fields()))})"
 
-@dataclass
 class IntegrityIssue:
-    """Represents a clothing integrity issue."""
-    image_filename: str
-    missing_sleeves: bool
-    missing_trousers: bool
-    garment_complete: bool
-    issues_found: List[str]
-    
-    def __post_init__(self):
+    """Represents a clothing integrity issue (slotted; issues stored as an interned tuple)."""
+    __slots__ = ('image_filename', 'missing_sleeves', 'missing_trousers', 'garment_complete', '_issues_found')
+    
+    def __init__(self, image_filename: str, missing_sleeves: bool, missing_trousers: bool,
+                 garment_complete: bool, issues_found: List[str]):
+        self.image_filename = image_filename
         # Convert string representations to proper types
-        if isinstance(self.missing_sleeves, str):
-            self.missing_sleeves = self.missing_sleeves.upper() == 'TRUE'
-        if isinstance(self.missing_trousers, str):
-            self.missing_trousers = self.missing_trousers.upper() == 'TRUE'
-        if isinstance(self.garment_complete, str):
-            self.garment_complete = self.garment_complete.upper() == 'TRUE'
-        if isinstance(self.issues_found, str):
+        self.missing_sleeves = _as_bool(missing_sleeves)
+        self.missing_trousers = _as_bool(missing_trousers)
+        self.garment_complete = _as_bool(garment_complete)
+        self.issues_found = issues_found
+    
+    @property
+    def issues_found(self) -> List[str]:
+        return list(self._issues_found)
+    
+    @issues_found.setter
+    def issues_found(self, value):
+        if isinstance(value, str):
             try:
-                self.issues_found = json.loads(self.issues_found.replace('""', '"'))
+                value = json.loads(value.replace('""', '"'))
             except json.JSONDecodeError:
-                self.issues_found = []
+                value = []
+        self._issues_found = tuple(sys.intern(str(issue)) for issue in value or ())
+    
+    def _fields(self) -> Tuple:
+        return (self.image_filename, self.missing_sleeves, self.missing_trousers,
+                self.garment_complete, self._issues_found)
+    
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+    
+    def __repr__(self):
+        return (f"IntegrityIssue(image_filename={self.image_filename!r}, missing_sleeves={self.missing_sleeves!r}, "
+                f"missing_trousers={self.missing_trousers!r}, garment_complete={self.garment_complete!r}, "
+                f"issues_found={self.issues_found!r})")
+
+def priority_score(high_priority_count: int, medium_priority_count: int, low_priority_count: int,
+                   has_integrity_issues: bool) -> int:
+    """Correction priority of an image from its detection counts and integrity state."""
+    priority_score = (high_priority_count * 3) + (medium_priority_count * 2) + low_priority_count
+    if has_integrity_issues:
+        priority_score += 5  # Integrity issues are high priority
+    return priority_score
+
+class PriorityIndex:
+    """Max-heap of image priority scores with lazy invalidation.
+    
+    update/remove are O(log n) and O(1): superseded heap entries stay in place and
+    are dropped when they surface. top(k) pops k live entries and pushes them back,
+    O(k log n). Ties come out in filename order.
+    """
+    
+    def __init__(self, scores: Optional[Dict[str, int]] = None):
+        self._scores: Dict[str, int] = dict(scores or {})
+        self._heap = [(-score, image) for image, score in self._scores.items()]
+        heapq.heapify(self._heap)
+    
+    def __len__(self):
+        return len(self._scores)
+    
+    def __contains__(self, image_filename):
+        return image_filename in self._scores
+    
+    def update(self, image_filename: str, score: int) -> None:
+        if self._scores.get(image_filename) == score:
+            return
+        self._scores[image_filename] = score
+        heapq.heappush(self._heap, (-score, image_filename))
+        self._compact_if_needed()
+    
+    def remove(self, image_filename: str) -> None:
+        self._scores.pop(image_filename, None)
+        self._compact_if_needed()
+    
+    def top(self, k: int) -> List[str]:
+        live = []
+        while self._heap and len(live) < k:
+            entry = heapq.heappop(self._heap)
+            negative_score, image_filename = entry
+            # Skip superseded and duplicate entries for good
+            if self._scores.get(image_filename) == -negative_score and (not live or live[-1] != entry):
+                live.append(entry)
+        for entry in live:
+            heapq.heappush(self._heap, entry)
+        return [image_filename for _, image_filename in live]
+    
+    def _compact_if_needed(self) -> None:
+        if len(self._heap) > 2 * len(self._scores) + 64:
+            self._heap = [(-score, image) for image, score in self._scores.items()]
+            heapq.heapify(self._heap)
 
 class DetectionDataLoader:
-    """Loads and manages detection data from CSV files."""
+    """Loads detection data into the detection store and queries it per image."""
     
-    def __init__(self, detection_results_dir: str = "detection_results"):
+    def __init__(self, detection_results_dir: str = "detection_results", store_path: Optional[str] = None):
         self.detection_results_dir = Path(detection_results_dir)
         self.accessory_detection_file = self.detection_results_dir / "accessory_detection_results.csv"
         self.integrity_report_file = self.detection_results_dir / "clothing_integrity_report.csv"
         
-        # Data storage
-        self.detection_items: List[DetectionItem] = []
-        self.integrity_issues: List[IntegrityIssue] = []
-        self.image_to_detections: Dict[str, List[DetectionItem]] = {}
-        self.image_to_integrity: Dict[str, IntegrityIssue] = {}
+        # Indexed store, synced from the CSVs
+        self.store = DetectionStore(store_path or self.detection_results_dir / STORE_NAME)
+        
+        # Built on first use, then kept up to date as detections arrive and images are corrected
+        self._priority_index: Optional[PriorityIndex] = None
+        self._index_rewrites = 0
+        self._corrected = set()
         
         logger.info("Detection Data Loader initialized")
     
     def load_accessory_detections(self) -> None:
-        """Load accessory detection results from CSV."""
+        """Import new accessory detection rows from CSV."""
         if not self.accessory_detection_file.exists():
             logger.warning(f"Accessory detection file not found: {self.accessory_detection_file}")
-            return
         
         try:
-            with open(self.accessory_detection_file, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                for row in reader:
-                    detection_item = DetectionItem(
-                        image_filename=row['image_filename'],
-                        item_type=row['item_type'],
-                        description=row['description'],
-                        location_on_attire=row['location_on_attire'],
-                        confidence_score=float(row['confidence_score']),
-                        removal_priority=row['removal_priority'],
-                        coordinates=row['coordinates']
-                    )
-                    
-                    self.detection_items.append(detection_item)
-                    
-                    # Add to image mapping
-                    if detection_item.image_filename not in self.image_to_detections:
-                        self.image_to_detections[detection_item.image_filename] = []
-                    self.image_to_detections[detection_item.image_filename].append(detection_item)
-            
-            logger.info(f"Loaded {len(self.detection_items)} accessory detections from {len(self.image_to_detections)} images")
+            self.refresh_priorities(self.store.sync_csv(self.accessory_detection_file, 'detections'))
+            counts = self.store.counts()
+            logger.info(f"Loaded {counts['detections']} accessory detections from {counts['images_with_detections']} images")
             
         except Exception as e:
             logger.error(f"Error loading accessory detections: {e}")
     
     def load_integrity_issues(self) -> None:
-        """Load clothing integrity issues from CSV."""
+        """Import new clothing integrity rows from CSV."""
         if not self.integrity_report_file.exists():
             logger.warning(f"Integrity report file not found: {self.integrity_report_file}")
-            return
         
         try:
-            with open(self.integrity_report_file, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                for row in reader:
-                    integrity_issue = IntegrityIssue(
-                        image_filename=row['image_filename'],
-                        missing_sleeves=row['missing_sleeves'],
-                        missing_trousers=row['missing_trousers'],
-                        garment_complete=row['garment_complete'],
-                        issues_found=row['issues_found']
-                    )
-                    
-                    self.integrity_issues.append(integrity_issue)
-                    self.image_to_integrity[integrity_issue.image_filename] = integrity_issue
-            
-            logger.info(f"Loaded {len(self.integrity_issues)} integrity issues")
+            self.refresh_priorities(self.store.sync_csv(self.integrity_report_file, 'integrity'))
+            logger.info(f"Loaded {self.store.counts()['integrity']} integrity issues")
             
         except Exception as e:
             logger.error(f"Error loading integrity issues: {e}")
@@ -151,82 +280,85 @@ class DetectionDataLoader:
         logger.info("Loading all detection data...")
         self.load_accessory_detections()
         self.load_integrity_issues()
-        logger.info(f"Data loading complete. {len(self.image_to_detections)} images with detections, {len(self.image_to_integrity)} images with integrity issues")
+        counts = self.store.counts()
+        logger.info(f"Data loading complete. {counts['images_with_detections']} images with detections, {counts['integrity']} images with integrity issues")
     
     def get_detections_for_image(self, image_filename: str) -> List[DetectionItem]:
         """Get all detection items for a specific image."""
-        return self.image_to_detections.get(image_filename, [])
+        return [DetectionItem(**row) for row in self.store.detections_for_image(image_filename)]
     
     def get_integrity_for_image(self, image_filename: str) -> Optional[IntegrityIssue]:
         """Get integrity issues for a specific image."""
-        return self.image_to_integrity.get(image_filename)
+        row = self.store.integrity_for_image(image_filename)
+        return IntegrityIssue(**row) if row else None
     
     def get_images_with_detections(self) -> List[str]:
         """Get list of all images that have detection items."""
-        return list(self.image_to_detections.keys())
+        return self.store.images_with_detections()
     
     def get_images_with_integrity_issues(self) -> List[str]:
         """Get list of all images that have integrity issues."""
-        return list(self.image_to_integrity.keys())
+        return self.store.images_with_integrity()
     
     def get_images_needing_processing(self) -> List[str]:
         """Get list of all images that need processing (detections or integrity issues)."""
-        detection_images = set(self.get_images_with_detections())
-        integrity_images = set(self.get_images_with_integrity_issues())
-        return sorted(list(detection_images.union(integrity_images)))
+        return self.store.images_needing_processing()
+    
+    def priority_index(self) -> PriorityIndex:
+        """The priority index, (re)built from the store when missing or after a re-import."""
+        if self._index_rewrites != self.store.rewrites:
+            # A fresh detection run - corrected images are judged again
+            self._index_rewrites = self.store.rewrites
+            self._corrected.clear()
+            self._priority_index = None
+        if self._priority_index is None:
+            self._priority_index = PriorityIndex({
+                counts[0]: priority_score(*counts[1:]) for counts in self.store.priority_counts()
+                if counts[0] not in self._corrected
+            })
+        return self._priority_index
+    
+    def refresh_priorities(self, image_filenames: Iterable[str]) -> None:
+        """Rescore images whose detections or integrity rows changed (corrected images re-enter)."""
+        image_filenames = list(image_filenames)
+        self._corrected.difference_update(image_filenames)
+        if self._priority_index is None or self._index_rewrites != self.store.rewrites:
+            return  # Rebuilt from scratch on next use
+        if len(image_filenames) > 500:
+            self._priority_index = None
+            return
+        for counts in self.store.priority_counts(image_filenames):
+            self._priority_index.update(counts[0], priority_score(*counts[1:]))
+    
+    def mark_corrected(self, image_filename: str) -> None:
+        """Drop a corrected image from the priority index until new detections arrive for it."""
+        priority_index = self.priority_index()
+        self._corrected.add(image_filename)
+        priority_index.remove(image_filename)
     
     def get_priority_images(self, limit: int = 10) -> List[str]:
         """Get images sorted by priority (high priority items first)."""
-        images_with_priority = []
-        
-        for image_filename in self.get_images_needing_processing():
-            detections = self.get_detections_for_image(image_filename)
-            
-            # Calculate priority score
-            high_priority_count = sum(1 for d in detections if d.removal_priority == 'high')
-            medium_priority_count = sum(1 for d in detections if d.removal_priority == 'medium')
-            low_priority_count = sum(1 for d in detections if d.removal_priority == 'low')
-            
-            # Check for integrity issues
-            integrity = self.get_integrity_for_image(image_filename)
-            has_integrity_issues = integrity and not integrity.garment_complete
-            
-            priority_score = (high_priority_count * 3) + (medium_priority_count * 2) + low_priority_count
-            if has_integrity_issues:
-                priority_score += 5  # Integrity issues are high priority
-            
-            images_with_priority.append((image_filename, priority_score))
-        
-        # Sort by priority score (descending) and return top N
-        images_with_priority.sort(key=lambda x: x[1], reverse=True)
-        return [img[0] for img in images_with_priority[:limit]]
+        return self.priority_index().top(limit)
     
     def generate_detection_summary(self) -> Dict[str, Any]:
         """Generate a summary of loaded detection data."""
-        item_types = {}
-        locations = {}
+        counts = self.store.counts()
         priorities = {'high': 0, 'medium': 0, 'low': 0}
-        
-        for detection in self.detection_items:
-            item_types[detection.item_type] = item_types.get(detection.item_type, 0) + 1
-            locations[detection.location_on_attire] = locations.get(detection.location_on_attire, 0) + 1
-            priorities[detection.removal_priority] = priorities.get(detection.removal_priority, 0) + 1
-        
-        integrity_stats = {
-            'missing_sleeves': sum(1 for issue in self.integrity_issues if issue.missing_sleeves),
-            'missing_trousers': sum(1 for issue in self.integrity_issues if issue.missing_trousers),
-            'incomplete_garments': sum(1 for issue in self.integrity_issues if not issue.garment_complete)
-        }
+        priorities.update(self.store.count_by('removal_priority'))
         
         return {
-            'total_images_with_detections': len(self.image_to_detections),
-            'total_images_with_integrity_issues': len(self.image_to_integrity),
-            'total_detection_items': len(self.detection_items),
-            'total_integrity_issues': len(self.integrity_issues),
-            'item_types': item_types,
-            'locations': locations,
+            'total_images_with_detections': counts['images_with_detections'],
+            'total_images_with_integrity_issues': counts['integrity'],
+            'total_detection_items': counts['detections'],
+            'total_integrity_issues': counts['integrity'],
+            'item_types': self.store.count_by('item_type'),
+            'locations': self.store.count_by('location_on_attire'),
             'priorities': priorities,
-            'integrity_stats': integrity_stats
+            'integrity_stats': {
+                'missing_sleeves': counts['missing_sleeves'],
+                'missing_trousers': counts['missing_trousers'],
+                'incomplete_garments': counts['incomplete_garments']
+            }
         }
 
 # Example usage and testing
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Detection Store
+Indexed SQLite store for accessory detections and clothing integrity results, with
+typed columns indexed by image filename, removal priority and item type. The CSVs
+written by accessory_detector.py are imported incrementally: they are append-only,
+so a sync only parses the rows added since the previous one (a rewritten file is
+re-imported from scratch). Readers query the store instead of re-parsing the CSVs.
+"""
+
+import io
+import ast
+import csv
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DETECTIONS_CSV = 'accessory_detection_results.csv'
+INTEGRITY_CSV = 'clothing_integrity_report.csv'
+STORE_NAME = 'detections.sqlite'
+
+COORDINATE_KEYS = ('x', 'y', 'width', 'height')
+# Bytes of the imported prefix fingerprinted to notice a rewritten (not appended) CSV
+_FINGERPRINT_BYTES = 64 * 1024
+
+
+def parse_coordinates(value: str) -> Dict[str, int]:
+    """Coordinates column (JSON object) to a dict of ints; unparseable values become zeros."""
+    try:
+        coordinates = json.loads(value.replace('""', '"')) if value else {}
+        return {key: int(coordinates[key]) for key in COORDINATE_KEYS if key in coordinates}
+    except (ValueError, TypeError, AttributeError):
+        return {key: 0 for key in COORDINATE_KEYS}
+
+
+def parse_issue_list(value: str) -> List[str]:
+    """issues_found column (JSON or Python list literal) to a list of strings."""
+    if not value:
+        return []
+    for parse in (lambda v: json.loads(v.replace('""', '"')), ast.literal_eval):
+        try:
+            issues = parse(value)
+        except (ValueError, SyntaxError):
+            continue
+        return [str(issue) for issue in issues] if isinstance(issues, (list, tuple)) else [str(issues)]
+    return [value]
+
+
+def parse_bool(value: str) -> bool:
+    return value.strip().upper() == 'TRUE'
+
+
+class DetectionStore:
+    """Detections and integrity results in SQLite, synced from the detection CSVs."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS detections (
+                image_filename TEXT NOT NULL,
+                item_type TEXT NOT NULL,
+                description TEXT NOT NULL,
+                location_on_attire TEXT NOT NULL,
+                confidence_score REAL NOT NULL,
+                removal_priority TEXT NOT NULL,
+                x INTEGER,
+                y INTEGER,
+                width INTEGER,
+                height INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_detections_image ON detections (image_filename);
+            CREATE INDEX IF NOT EXISTS idx_detections_priority ON detections (removal_priority, image_filename);
+            CREATE INDEX IF NOT EXISTS idx_detections_type ON detections (item_type);
+
+            CREATE TABLE IF NOT EXISTS integrity (
+                image_filename TEXT PRIMARY KEY,
+                missing_sleeves INTEGER NOT NULL,
+                missing_trousers INTEGER NOT NULL,
+                garment_complete INTEGER NOT NULL,
+                issues_found TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_integrity_complete ON integrity (garment_complete);
+
+            CREATE TABLE IF NOT EXISTS imports (
+                source TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+        # Bumped whenever a table is cleared, so cached views know to rebuild
+        self.rewrites = 0
+
+    # Import
+
+    def sync(self, results_dir) -> Dict[str, Set[str]]:
+        """Import rows appended to the detection CSVs since the last sync; return touched images per table."""
+        results_dir = Path(results_dir)
+        return {
+            'detections': self.sync_csv(results_dir / DETECTIONS_CSV, 'detections'),
+            'integrity': self.sync_csv(results_dir / INTEGRITY_CSV, 'integrity'),
+        }
+
+    def sync_csv(self, csv_path: Path, table: str) -> Set[str]:
+        """Import new rows of one CSV into table; return the image filenames they belong to."""
+        insert = {'detections': self._insert_detections, 'integrity': self._insert_integrity}[table]
+
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT offset, fingerprint FROM imports WHERE source = ?', (table,)).fetchone()
+
+            if not csv_path.exists():
+                if row:
+                    logger.warning(f"{csv_path} is gone - clearing {table}")
+                    self._conn.execute(f'DELETE FROM {table}')
+                    self._conn.execute('DELETE FROM imports WHERE source = ?', (table,))
+                    self.rewrites += 1
+                return set()
+
+            with open(csv_path, 'rb') as f:
+                offset = 0
+                if row:
+                    prefix = f.read(min(row[0], _FINGERPRINT_BYTES))
+                    if hashlib.sha256(prefix).hexdigest() == row[1] and f.seek(0, io.SEEK_END) >= row[0]:
+                        offset = row[0]
+                    else:
+                        logger.info(f"{csv_path.name} was rewritten - re-importing {table}")
+                        self._conn.execute(f'DELETE FROM {table}')
+                        self.rewrites += 1
+
+                f.seek(0)
+                header = f.readline()
+                f.seek(max(offset, len(header)))
+                data = f.read()
+
+                # Only complete lines; a partially written last row is picked up next time
+                end = data.rfind(b'\n') + 1
+                fieldnames = next(csv.reader([header.decode('utf-8')]))
+                rows = csv.DictReader(io.StringIO(data[:end].decode('utf-8'), newline=''), fieldnames=fieldnames)
+                touched = insert(rows)
+
+                new_offset = max(offset, len(header)) + end
+                f.seek(0)
+                fingerprint = hashlib.sha256(f.read(min(new_offset, _FINGERPRINT_BYTES))).hexdigest()
+
+            self._conn.execute(
+                'INSERT OR REPLACE INTO imports (source, offset, fingerprint) VALUES (?, ?, ?)',
+                (table, new_offset, fingerprint)
+            )
+
+        if touched:
+            logger.info(f"Imported new {table} rows for {len(touched)} images from {csv_path.name}")
+        return touched
+
+    def _insert_detections(self, rows: Iterable[Dict[str, str]]) -> Set[str]:
+        records = []
+        for row in rows:
+            coordinates = parse_coordinates(row['coordinates'])
+            records.append((
+                row['image_filename'], row['item_type'], row['description'], row['location_on_attire'],
+                float(row['confidence_score'] or 0), row['removal_priority'],
+                *(coordinates.get(key) for key in COORDINATE_KEYS)
+            ))
+        self._conn.executemany('INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', records)
+        return {record[0] for record in records}
+
+    def _insert_integrity(self, rows: Iterable[Dict[str, str]]) -> Set[str]:
+        records = [(
+            row['image_filename'], parse_bool(row['missing_sleeves']), parse_bool(row['missing_trousers']),
+            parse_bool(row['garment_complete']), json.dumps(parse_issue_list(row['issues_found']))
+        ) for row in rows]
+        # Latest row for an image wins, as with the CSV readers
+        self._conn.executemany('INSERT OR REPLACE INTO integrity VALUES (?, ?, ?, ?, ?)', records)
+        return {record[0] for record in records}
+
+    # Queries
+
+    def _query(self, sql: str, params=()) -> List[Tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def detections_for_image(self, image_filename: str) -> List[Dict[str, Any]]:
+        rows = self._query(
+            'SELECT image_filename, item_type, description, location_on_attire, confidence_score, '
+            'removal_priority, x, y, width, height FROM detections WHERE image_filename = ? ORDER BY rowid',
+            (image_filename,)
+        )
+        return [{
+            'image_filename': row[0],
+            'item_type': row[1],
+            'description': row[2],
+            'location_on_attire': row[3],
+            'confidence_score': row[4],
+            'removal_priority': row[5],
+            'coordinates': {key: value for key, value in zip(COORDINATE_KEYS, row[6:]) if value is not None},
+        } for row in rows]
+
+    def integrity_for_image(self, image_filename: str) -> Optional[Dict[str, Any]]:
+        rows = self._query(
+            'SELECT image_filename, missing_sleeves, missing_trousers, garment_complete, issues_found '
+            'FROM integrity WHERE image_filename = ?',
+            (image_filename,)
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        return {
+            'image_filename': row[0],
+            'missing_sleeves': bool(row[1]),
+            'missing_trousers': bool(row[2]),
+            'garment_complete': bool(row[3]),
+            'issues_found': json.loads(row[4]),
+        }
+
+    def images_with_detections(self) -> List[str]:
+        return [row[0] for row in self._query('SELECT DISTINCT image_filename FROM detections ORDER BY image_filename')]
+
+    def images_with_integrity(self) -> List[str]:
+        return [row[0] for row in self._query('SELECT image_filename FROM integrity ORDER BY image_filename')]
+
+    def images_needing_processing(self) -> List[str]:
+        return [row[0] for row in self._query(
+            'SELECT image_filename FROM detections UNION SELECT image_filename FROM integrity ORDER BY image_filename'
+        )]
+
+    def images_by_item_type(self, item_type: str) -> List[str]:
+        return [row[0] for row in self._query(
+            'SELECT DISTINCT image_filename FROM detections WHERE item_type = ? ORDER BY image_filename', (item_type,)
+        )]
+
+    def priority_counts(self, image_filenames: Optional[Iterable[str]] = None) -> List[Tuple[str, int, int, int, bool]]:
+        """(image, high, medium, low, incomplete garment) for every image needing processing,
+        or only for image_filenames."""
+        where, params = '', ()
+        if image_filenames is not None:
+            params = tuple(image_filenames)
+            if not params:
+                return []
+            where = f"WHERE images.image_filename IN ({', '.join('?' * len(params))})"
+        return [(row[0], row[1], row[2], row[3], bool(row[4])) for row in self._query(f"""
+            SELECT images.image_filename,
+                   COALESCE(counts.high, 0), COALESCE(counts.medium, 0), COALESCE(counts.low, 0),
+                   COALESCE(integrity.garment_complete = 0, 0)
+            FROM (SELECT image_filename FROM detections UNION SELECT image_filename FROM integrity) AS images
+            LEFT JOIN (
+                SELECT image_filename,
+                       SUM(removal_priority = 'high') AS high,
+                       SUM(removal_priority = 'medium') AS medium,
+                       SUM(removal_priority = 'low') AS low
+                FROM detections GROUP BY image_filename
+            ) AS counts ON counts.image_filename = images.image_filename
+            LEFT JOIN integrity ON integrity.image_filename = images.image_filename
+            {where}
+            ORDER BY images.image_filename
+        """, params)]
+
+    def count_by(self, column: str) -> Dict[str, int]:
+        """Detection counts grouped by item_type, location_on_attire or removal_priority."""
+        if column not in ('item_type', 'location_on_attire', 'removal_priority'):
+            raise ValueError(f"Cannot group detections by {column}")
+        return dict(self._query(f'SELECT {column}, COUNT(*) FROM detections GROUP BY {column}'))
+
+    def counts(self) -> Dict[str, int]:
+        (detections, detection_images), = self._query('SELECT COUNT(*), COUNT(DISTINCT image_filename) FROM detections')
+        (integrity, missing_sleeves, missing_trousers, incomplete), = self._query(
+            'SELECT COUNT(*), COALESCE(SUM(missing_sleeves), 0), COALESCE(SUM(missing_trousers), 0), '
+            'COALESCE(SUM(garment_complete = 0), 0) FROM integrity'
+        )
+        return {
+            'detections': detections,
+            'images_with_detections': detection_images,
+            'integrity': integrity,
+            'missing_sleeves': missing_sleeves,
+            'missing_trousers': missing_trousers,
+            'incomplete_garments': incomplete,
+        }
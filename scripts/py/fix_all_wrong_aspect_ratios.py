@@ -7,6 +7,7 @@ Then add unified logos to the corrected images
 import sys
 from pathlib import Path
 from PIL import Image
+from logo_processing import load_transparent_logo, OverlayCache
 import logging
 
 logging.basicConfig(
@@ -29,29 +30,11 @@ class AspectRatioFixer:
         # Load logo
         self.logo_path = Path('logos/unified-logo.jpg')
         self.process_logo()
+        self.overlay_cache = OverlayCache()
         
     def process_logo(self):
         """Load and process the unified logo."""
-        logo = Image.open(self.logo_path)
-        if logo.mode != 'RGBA':
-            logo = logo.convert('RGBA')
-        
-        # Convert to black on transparent
-        transparent_logo = Image.new('RGBA', logo.size)
-        for x in range(logo.width):
-            for y in range(logo.height):
-                r, g, b, a = logo.getpixel((x, y))
-                
-                if r > 240 and g > 240 and b > 240:
-                    transparent_logo.putpixel((x, y), (0, 0, 0, 0))
-                elif r < 50 and g < 50 and b < 50:
-                    transparent_logo.putpixel((x, y), (0, 0, 0, 255))
-                else:
-                    darkness = 1 - ((r + g + b) / 3) / 255
-                    alpha = int(darkness * 255)
-                    transparent_logo.putpixel((x, y), (0, 0, 0, alpha))
-        
-        self.logo = transparent_logo
+        self.logo = load_transparent_logo(self.logo_path)
         logger.info("Logo processed")
     
     def add_logo(self, img):
@@ -61,17 +44,16 @@ class AspectRatioFixer:
         logo_width = max(200, min(logo_width, 700))
         logo_height = int(logo_width * self.logo.height / self.logo.width)
         
-        resized_logo = self.logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
+        resized_logo = self.overlay_cache.resized(self.logo_path, self.logo, (logo_width, logo_height))
         
         # Position at bottom right
         logo_x = img.width - resized_logo.width - 15
         logo_y = img.height - resized_logo.height - 15
         
-        # Composite
-        img_rgba = img.convert('RGBA')
-        img_rgba.paste(resized_logo, (logo_x, logo_y), resized_logo)
+        # Composite in place - only the logo region is touched
+        img.paste(resized_logo, (logo_x, logo_y), resized_logo)
         
-        return img_rgba.convert('RGB')
+        return img
     
     def check_and_fix_image(self, image_path):
         """Check if image needs fixing and fix it."""
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Generate/Verify Pipeline
+Two-stage worker pipeline for the mannequin processors: a pool of generators feeds
+candidates into a queue consumed by a separate pool of verifiers, so verification of
+one image overlaps with generation of the next. Failed verifications are sent back to
+the generation stage together with their feedback until max_attempts is reached.
+Also provides speculative first-pass-wins generation of several candidates per image.
+"""
+
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Retries are scheduled ahead of fresh images so in-flight images finish first
+RETRY_PRIORITY = 0
+NEW_IMAGE_PRIORITY = 1
+
+CANCELLED_RESULT = "Cancelled - another candidate passed"
+INTERRUPTED_RESULT = "Interrupted before completion"
+
+
+def generate_first_passing(generate_fn: Callable[[int], Optional[bytes]],
+                           verify_fn: Callable[[bytes], Tuple[bool, str]],
+                           candidates: int) -> Tuple[Optional[bytes], str]:
+    """Generate several candidates at once and keep the first one that passes verification.
+
+    generate_fn receives the candidate index (0..candidates-1). Each candidate is
+    verified as soon as it arrives. Once one passes, candidates that
+    have not started are cancelled and results still in flight are dropped without
+    being verified.
+
+    Returns:
+        (winning candidate bytes, verification result), or (None, last failure reason)
+        when every candidate failed
+    """
+    winner_found = threading.Event()
+
+    def run_candidate(index):
+        if winner_found.is_set():
+            return None, CANCELLED_RESULT
+        candidate = generate_fn(index)
+        if candidate is None:
+            return None, "No image generated"
+        if winner_found.is_set():
+            return None, CANCELLED_RESULT
+        passed, verification_result = verify_fn(candidate)
+        return (candidate if passed else None), verification_result
+
+    executor = ThreadPoolExecutor(max_workers=candidates)
+    try:
+        futures = [executor.submit(run_candidate, index) for index in range(candidates)]
+        last_failure = "No image generated"
+
+        for future in as_completed(futures):
+            try:
+                candidate, verification_result = future.result()
+            except Exception as e:
+                candidate, verification_result = None, f"Generation error: {e}"
+
+            if candidate is not None:
+                winner_found.set()
+                return candidate, verification_result
+            if verification_result != CANCELLED_RESULT:
+                last_failure = verification_result
+
+        return None, last_failure
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@dataclass
+class ImageJob:
+    """Per-image state carried between the generation and verification stages."""
+    image_path: Path
+    attempt: int = 0
+    last_result: str = ""
+    state: Dict[str, Any] = field(default_factory=dict)
+
+
+class GenerateVerifyPipeline:
+    """Runs generate -> verify -> (retry with feedback | save) over a batch of images.
+
+    Args:
+        generate_fn: generate_fn(job) -> candidate image bytes or None
+        verify_fn: verify_fn(job, candidate) -> (passed, verification_result)
+        save_fn: save_fn(job, candidate) -> output path of the accepted candidate
+        max_attempts: Generation attempts per image before giving up
+        generate_workers: Number of concurrent generation workers
+        verify_workers: Number of concurrent verification workers
+        should_stop: Optional callable; once it returns True, queued jobs are reported
+            as (image_path, None, INTERRUPTED_RESULT) instead of being generated
+    """
+
+    def __init__(self, generate_fn: Callable[[ImageJob], Optional[bytes]],
+                 verify_fn: Callable[[ImageJob, bytes], Tuple[bool, str]],
+                 save_fn: Callable[[ImageJob, bytes], Path],
+                 max_attempts: int = 7, generate_workers: int = 1, verify_workers: int = 1,
+                 should_stop: Optional[Callable[[], bool]] = None):
+        self.generate_fn = generate_fn
+        self.verify_fn = verify_fn
+        self.save_fn = save_fn
+        self.max_attempts = max_attempts
+        self.generate_workers = max(1, generate_workers)
+        self.verify_workers = max(1, verify_workers)
+        self.should_stop = should_stop
+
+        self._generate_queue: "queue.PriorityQueue" = queue.PriorityQueue()
+        # Bounded so generators cannot run far ahead of verification
+        self._verify_queue: "queue.Queue" = queue.Queue(maxsize=self.verify_workers * 2)
+        self._results: "queue.Queue" = queue.Queue()
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+
+    def _schedule(self, job: ImageJob, priority: int) -> None:
+        with self._sequence_lock:
+            self._sequence += 1
+            sequence = self._sequence
+        self._generate_queue.put((priority, sequence, job))
+
+    def _retry_or_fail(self, job: ImageJob, failure_message: str) -> None:
+        if job.attempt < self.max_attempts:
+            logger.info(f"Will retry {job.image_path.name} with specific feedback...")
+            self._schedule(job, RETRY_PRIORITY)
+        else:
+            logger.error(f"Max attempts reached for {job.image_path.name}")
+            self._results.put((job.image_path, False, failure_message))
+
+    def _generation_worker(self) -> None:
+        while True:
+            _, _, job = self._generate_queue.get()
+            if job is None:
+                return
+
+            if self.should_stop and self.should_stop():
+                self._results.put((job.image_path, None, INTERRUPTED_RESULT))
+                continue
+
+            job.attempt += 1
+            logger.info(f"Processing {job.image_path.name} - Attempt {job.attempt}")
+
+            try:
+                candidate = self.generate_fn(job)
+            except Exception as e:
+                logger.error(f"Error processing {job.image_path.name} - attempt {job.attempt}: {e}")
+                self._retry_or_fail(job, f"Error after {self.max_attempts} attempts: {e}")
+                continue
+
+            if candidate is None:
+                logger.warning(f"No image generated for {job.image_path.name} - attempt {job.attempt}")
+                self._retry_or_fail(job, "No image generated after max attempts")
+                continue
+
+            self._verify_queue.put((job, candidate))
+
+    def _verification_worker(self) -> None:
+        while True:
+            job, candidate = self._verify_queue.get()
+            if job is None:
+                return
+
+            logger.info(f"Verifying generated image for {job.image_path.name}")
+            try:
+                passed, verification_result = self.verify_fn(job, candidate)
+            except Exception as e:
+                passed, verification_result = False, f"Verification error: {e}"
+            job.last_result = verification_result
+
+            if not passed:
+                logger.warning(f"Verification failed for {job.image_path.name}: {verification_result}")
+                self._retry_or_fail(
+                    job, f"Failed verification after {self.max_attempts} attempts: {verification_result}"
+                )
+                continue
+
+            try:
+                output_path = self.save_fn(job, candidate)
+            except Exception as e:
+                logger.error(f"Error saving {job.image_path.name}: {e}")
+                self._results.put((job.image_path, False, f"Error saving verified image: {e}"))
+                continue
+
+            logger.info(f"Successfully processed and verified {job.image_path.name}")
+            self._results.put((job.image_path, True, output_path))
+
+    def run(self, image_paths: List[Path],
+            on_result: Optional[Callable[[Path, bool, Any], None]] = None) -> List[Tuple[Path, bool, Any]]:
+        """Process all images and return (image_path, success, result) in completion order.
+
+        success is None for images skipped because should_stop() became true.
+        """
+        for image_path in image_paths:
+            self._schedule(ImageJob(image_path=image_path), NEW_IMAGE_PRIORITY)
+
+        workers = [
+            threading.Thread(target=self._generation_worker, daemon=True)
+            for _ in range(self.generate_workers)
+        ] + [
+            threading.Thread(target=self._verification_worker, daemon=True)
+            for _ in range(self.verify_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        logger.info(
+            f"Pipeline started: {self.generate_workers} generators, {self.verify_workers} verifiers, "
+            f"{len(image_paths)} images"
+        )
+
+        results = []
+        for _ in range(len(image_paths)):
+            image_path, success, result = self._results.get()
+            results.append((image_path, success, result))
+            if on_result:
+                on_result(image_path, success, result)
+
+        # Every image is finished - stop the workers
+        for _ in range(self.generate_workers):
+            self._schedule_stop()
+        for _ in range(self.verify_workers):
+            self._verify_queue.put((None, None))
+        for worker in workers:
+            worker.join()
+
+        return results
+
+    def _schedule_stop(self) -> None:
+        with self._sequence_lock:
+            self._sequence += 1
+            sequence = self._sequence
+        # Sentinels sort after every pending job
+        self._generate_queue.put((NEW_IMAGE_PRIORITY + 1, sequence, None))
@@ -6,7 +6,6 @@ Uses the generated prompts to instruct the image model to implement fixes on act
 
 import os
 import csv
-import time
 import logging
 import argparse
 from pathlib import Path
@@ -14,6 +13,7 @@ from typing import Dict, List, Any, Optional
 from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
 import base64
 from io import BytesIO
 
@@ -45,6 +45,7 @@ class ImageCorrectionImplementer:
         # Configure Gemini API
         genai.configure(api_key=self.api_key)
         self.image_model = genai.GenerativeModel('models/gemini-2.5-flash-image-preview')
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-flash-image-preview')
         
         # Directory paths
         self.processed_dir = Path('product-assets/processed')
@@ -164,10 +165,11 @@ class ImageCorrectionImplementer:
             try:
                 logger.info(f"Attempt {attempt + 1}/{max_retries} for {image_filename}")
                 
-                response = self.image_model.generate_content([
-                    prompt,
-                    {"mime_type": "image/jpeg", "data": img_data}
-                ])
+                with self.rate_limiter.slot():
+                    response = self.image_model.generate_content([
+                        prompt,
+                        {"mime_type": "image/jpeg", "data": img_data}
+                    ])
                 
                 if response and response.candidates and response.candidates[0].content.parts:
                     for part in response.candidates[0].content.parts:
@@ -197,9 +199,6 @@ class ImageCorrectionImplementer:
                     break
                 else:
                     logger.warning(f"General error, continuing to next attempt...")
-            
-            if attempt < max_retries - 1:
-                time.sleep(0.5)
         
         logger.error(f"Failed to correct {image_filename} after {max_retries} attempts")
         return False
@@ -247,10 +246,6 @@ class ImageCorrectionImplementer:
                     'status': 'failed',
                     'prompt': prompt
                 })
-            
-            # Rate limiting
-            if i < len(existing_images):
-                time.sleep(0.5)
         
         results = {
             'total_processed': len(existing_images),
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Local Image Pre-Check
+Fast NumPy checks run on a decoded candidate before it is sent to the verification
+model: white border/background, dark (black) mannequin silhouette, rose gold head and
+frame dimensions. Candidates that are plainly wrong fail here with a synthesized
+reason, saving a verification round trip.
+"""
+
+import os
+import logging
+from io import BytesIO
+from dataclasses import dataclass, fields
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PrecheckThresholds:
+    """Tunable limits; each field can be overridden with env var PRECHECK_<FIELD_NAME>."""
+    # Frame dimensions (expected_aspect_ratio = width / height, 0 disables the check)
+    expected_aspect_ratio: float = 2 / 3
+    aspect_ratio_tolerance: float = 0.03
+    min_width: int = 512
+    min_height: int = 512
+
+    # White background, measured on a band around the frame edge
+    border_band_fraction: float = 0.03
+    white_level: int = 225
+    min_border_white_fraction: float = 0.85
+
+    # Black mannequin: share of dark pixels in the silhouette below the head
+    dark_level: int = 70
+    min_dark_fraction: float = 0.05
+
+    # Rose gold head: share of rose-gold pixels in the top of the silhouette
+    head_height_fraction: float = 0.12
+    rose_gold_max_hue: float = 45.0
+    rose_gold_min_hue_wrap: float = 335.0
+    rose_gold_min_saturation: float = 0.12
+    rose_gold_max_saturation: float = 0.80
+    rose_gold_min_value: float = 0.35
+    min_rose_gold_fraction: float = 0.10
+
+    # Downscale before measuring; the checks are coarse
+    analysis_max_side: int = 512
+
+    @classmethod
+    def from_env(cls, **overrides) -> 'PrecheckThresholds':
+        values = {}
+        for f in fields(cls):
+            env_value = os.getenv(f"PRECHECK_{f.name.upper()}")
+            if env_value is not None:
+                values[f.name] = f.type(env_value)
+        values.update(overrides)
+        return cls(**values)
+
+
+def _rgb_to_hsv(pixels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Vectorized RGB (0-255) -> hue in degrees, saturation and value in 0-1."""
+    rgb = pixels.astype(np.float32) / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    max_c = rgb.max(axis=-1)
+    min_c = rgb.min(axis=-1)
+    delta = max_c - min_c
+    safe_delta = np.where(delta == 0, 1.0, delta)
+
+    hue = np.where(
+        max_c == r, ((g - b) / safe_delta) % 6,
+        np.where(max_c == g, (b - r) / safe_delta + 2, (r - g) / safe_delta + 4)
+    ) * 60.0
+    hue = np.where(delta == 0, 0.0, hue)
+    saturation = np.where(max_c == 0, 0.0, delta / np.where(max_c == 0, 1.0, max_c))
+    return hue, saturation, max_c
+
+
+class ImagePrecheck:
+    """Runs the local checks against a set of thresholds."""
+
+    def __init__(self, thresholds: Optional[PrecheckThresholds] = None, enabled: Optional[bool] = None, **overrides):
+        self.thresholds = thresholds or PrecheckThresholds.from_env(**overrides)
+        if enabled is None:
+            enabled = os.getenv('IMAGE_PRECHECK', 'on').lower() not in ('0', 'off', 'false', 'no')
+        self.enabled = enabled
+
+    def check(self, image_data: bytes) -> Tuple[bool, str]:
+        """Return (passed, reason); reason is a FAIL: message in the verifier's format."""
+        if not self.enabled:
+            return True, "Pre-check disabled"
+
+        t = self.thresholds
+        try:
+            with Image.open(BytesIO(image_data)) as img:
+                width, height = img.size
+                img = img.convert('RGB')
+                img.thumbnail((t.analysis_max_side, t.analysis_max_side))
+                pixels = np.asarray(img)
+        except Exception as e:
+            return self._fail(f"candidate could not be decoded ({e})")
+
+        # Frame dimensions
+        if width < t.min_width or height < t.min_height:
+            return self._fail(f"image too small ({width}x{height})")
+        if t.expected_aspect_ratio:
+            aspect_ratio = width / height
+            if abs(aspect_ratio - t.expected_aspect_ratio) > t.aspect_ratio_tolerance:
+                return self._fail(
+                    f"wrong aspect ratio {width}x{height} ({aspect_ratio:.3f}, expected {t.expected_aspect_ratio:.3f})"
+                )
+
+        # White background around the frame edge
+        rows, cols = pixels.shape[:2]
+        band = max(1, int(min(rows, cols) * t.border_band_fraction))
+        border = np.concatenate([
+            pixels[:band].reshape(-1, 3), pixels[-band:].reshape(-1, 3),
+            pixels[:, :band].reshape(-1, 3), pixels[:, -band:].reshape(-1, 3)
+        ])
+        border_white_fraction = float((border.min(axis=-1) >= t.white_level).mean())
+        if border_white_fraction < t.min_border_white_fraction:
+            return self._fail(
+                f"background is not pure white ({border_white_fraction:.0%} of border pixels white)"
+            )
+
+        # Silhouette = everything that is not background white
+        silhouette = pixels.min(axis=-1) < t.white_level
+        silhouette_rows = np.flatnonzero(silhouette.any(axis=1))
+        if silhouette_rows.size == 0:
+            return self._fail("no mannequin visible, image is blank white")
+
+        top, bottom = silhouette_rows[0], silhouette_rows[-1] + 1
+        head_bottom = top + max(1, int((bottom - top) * t.head_height_fraction))
+
+        # Rose gold head
+        head_mask = silhouette[top:head_bottom]
+        head_pixels = pixels[top:head_bottom][head_mask]
+        if head_pixels.size:
+            hue, saturation, value = _rgb_to_hsv(head_pixels)
+            rose_gold = (
+                ((hue <= t.rose_gold_max_hue) | (hue >= t.rose_gold_min_hue_wrap))
+                & (saturation >= t.rose_gold_min_saturation)
+                & (saturation <= t.rose_gold_max_saturation)
+                & (value >= t.rose_gold_min_value)
+            )
+            rose_gold_fraction = float(rose_gold.mean())
+        else:
+            rose_gold_fraction = 0.0
+        if rose_gold_fraction < t.min_rose_gold_fraction:
+            return self._fail(f"mannequin head is not rose gold ({rose_gold_fraction:.0%} rose gold pixels)")
+
+        # Black mannequin body
+        body_pixels = pixels[head_bottom:bottom][silhouette[head_bottom:bottom]]
+        dark_fraction = float((body_pixels.max(axis=-1) < t.dark_level).mean()) if body_pixels.size else 0.0
+        if dark_fraction < t.min_dark_fraction:
+            return self._fail(f"mannequin body is not black ({dark_fraction:.0%} dark pixels in silhouette)")
+
+        return True, "Pre-check passed"
+
+    def _fail(self, reason: str) -> Tuple[bool, str]:
+        message = f"FAIL: LOCAL PRE-CHECK - {reason.upper()}"
+        logger.info(f"Pre-check rejected candidate: {reason}")
+        return False, message
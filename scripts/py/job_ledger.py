@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Batch Job Ledger
+SQLite-backed record of per-image batch state (pending, in progress, succeeded, failed),
+attempt count, last verification result and output path, so an interrupted batch can
+resume without redoing finished images. Also provides graceful SIGINT handling for
+batch loops.
+"""
+
+import signal
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class JobLedger:
+    """Per-image job state for one batch processor, stored in SQLite."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                image_name TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_verification TEXT,
+                output_path TEXT,
+                last_error TEXT,
+                retries INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        if 'retries' not in columns:
+            self._conn.execute('ALTER TABLE jobs ADD COLUMN retries INTEGER NOT NULL DEFAULT 0')
+        self._conn.commit()
+
+    def _execute(self, sql: str, params=()) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def get_states(self) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute('SELECT image_name, state FROM jobs').fetchall()
+        return dict(rows)
+
+    def filter_unfinished(self, image_paths: List[Path], retry_failed: bool = False) -> List[Path]:
+        """Drop images that already finished; in-progress images from a crashed run are kept."""
+        states = self.get_states()
+        finished = {SUCCEEDED, FAILED} if not retry_failed else {SUCCEEDED}
+
+        remaining = []
+        skipped = 0
+        resumed = 0
+        retried = 0
+        for image_path in image_paths:
+            state = states.get(image_path.name)
+            if state in finished:
+                skipped += 1
+                continue
+            if state == IN_PROGRESS:
+                resumed += 1
+            if state == FAILED:
+                # Reopened by retry_failed: bump retries so cached generations are not replayed
+                retried += 1
+                self._execute(
+                    'UPDATE jobs SET state = ?, retries = retries + 1, updated_at = ? WHERE image_name = ?',
+                    (PENDING, datetime.now().isoformat(), image_path.name)
+                )
+            if state is None:
+                self._execute(
+                    'INSERT OR IGNORE INTO jobs (image_name, state, updated_at) VALUES (?, ?, ?)',
+                    (image_path.name, PENDING, datetime.now().isoformat())
+                )
+            remaining.append(image_path)
+
+        if skipped or resumed or retried:
+            logger.info(f"Job ledger: skipping {skipped} finished images, resuming {resumed} in-progress images, "
+                        f"retrying {retried} failed images")
+        return remaining
+
+    def cache_variant(self, image_name: str, variant):
+        """Response cache variant for one request of an image.
+
+        Unchanged until the image is reopened by retry_failed; after that it is prefixed
+        with the retry count, so a retry makes new model calls instead of replaying the
+        cached (failed) attempts.
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT retries FROM jobs WHERE image_name = ?', (image_name,)).fetchone()
+        retries = row[0] if row else 0
+        return f"retry{retries}-{variant}" if retries else variant
+
+    def start_attempt(self, image_name: str, attempt: int) -> None:
+        """Mark an image in progress; attempts holds the current run's attempt number."""
+        self._execute(
+            """INSERT INTO jobs (image_name, state, attempts, updated_at) VALUES (?, ?, ?, ?)
+               ON CONFLICT(image_name) DO UPDATE SET
+                   state = excluded.state, attempts = excluded.attempts, updated_at = excluded.updated_at""",
+            (image_name, IN_PROGRESS, attempt, datetime.now().isoformat())
+        )
+
+    def record_verification(self, image_name: str, verification_result: str) -> None:
+        self._execute(
+            'UPDATE jobs SET last_verification = ?, updated_at = ? WHERE image_name = ?',
+            (verification_result, datetime.now().isoformat(), image_name)
+        )
+
+    def mark_finished(self, image_name: str, success: bool, result) -> None:
+        """Record the final outcome: result is the output path on success, else the failure message."""
+        if success:
+            self._execute(
+                'UPDATE jobs SET state = ?, output_path = ?, last_error = NULL, updated_at = ? WHERE image_name = ?',
+                (SUCCEEDED, str(result), datetime.now().isoformat(), image_name)
+            )
+        else:
+            self._execute(
+                'UPDATE jobs SET state = ?, last_error = ?, updated_at = ? WHERE image_name = ?',
+                (FAILED, str(result), datetime.now().isoformat(), image_name)
+            )
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+        return dict(rows)
+
+
+class GracefulInterrupt:
+    """Context manager turning the first Ctrl-C into a stop request.
+
+    Batch loops poll `requested` and stop picking up new images, leaving the ledger
+    consistent. A second Ctrl-C raises KeyboardInterrupt as usual.
+    """
+
+    def __init__(self):
+        self.requested = False
+        self._previous_handler = None
+
+    def _handle(self, signum, frame):
+        if self.requested:
+            raise KeyboardInterrupt
+        self.requested = True
+        logger.warning("Interrupt received - finishing in-flight work, press Ctrl-C again to abort")
+
+    def __enter__(self):
+        if threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGINT, self._handle)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGINT, self._previous_handler)
+        return False
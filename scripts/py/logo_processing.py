@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Logo Processing
+Shared conversion of logo artwork to black content on a transparent background, used
+by every logo adder. The conversion is done on whole arrays and the converted RGBA is
+cached on disk keyed by the logo file hash and thresholds, so repeat runs load it
+straight from the cache. Also provides a memoized cache of resized overlays and the
+process-pool runner the adders use for --workers.
+"""
+
+import os
+import hashlib
+import logging
+from functools import partial
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Bump when the conversion changes so stale cache entries are ignored
+CONVERSION_VERSION = 1
+
+
+def convert_logo_to_transparent(logo: Image.Image, white_threshold: int = 240, black_threshold: int = 50,
+                                white_is_content: bool = False) -> Image.Image:
+    """Convert a logo to black content on a transparent background.
+
+    Pixels brighter than white_threshold on every channel and pixels darker than
+    black_threshold on every channel become fully transparent or fully opaque black;
+    anything in between (anti-aliasing) becomes black with alpha equal to its darkness.
+
+    Args:
+        logo: Source logo image (any mode)
+        white_threshold: Channel value above which a pixel counts as white
+        black_threshold: Channel value below which a pixel counts as black
+        white_is_content: False for dark artwork on white (white -> transparent, black -> opaque);
+            True for light artwork on black (white -> opaque, black -> transparent)
+    """
+    rgb = np.asarray(logo.convert('RGBA'))[..., :3].astype(np.int32)
+
+    is_white = (rgb > white_threshold).all(axis=-1)
+    is_black = (rgb < black_threshold).all(axis=-1)
+
+    # Same expression as the original per-pixel loop: int((1 - mean / 255) * 255)
+    darkness = 1 - (rgb.sum(axis=-1) / 3) / 255
+    alpha = (darkness * 255).astype(np.uint8)
+
+    alpha[is_white] = 255 if white_is_content else 0
+    alpha[is_black & ~is_white] = 0 if white_is_content else 255
+
+    transparent = np.zeros(rgb.shape[:2] + (4,), dtype=np.uint8)
+    transparent[..., 3] = alpha
+    return Image.fromarray(transparent, 'RGBA')
+
+
+def load_transparent_logo(logo_path, white_threshold: int = 240, black_threshold: int = 50,
+                          white_is_content: bool = False, cache_dir: Optional[str] = None) -> Image.Image:
+    """Load a logo converted with convert_logo_to_transparent, using the on-disk cache.
+
+    The cache lives in cache_dir (default LOGO_CACHE_DIR or .logo_cache) and is keyed by
+    the logo file's sha256 plus the thresholds, so editing the logo invalidates it. Only
+    the alpha channel is stored since the colour channels are always black.
+    """
+    logo_path = Path(logo_path)
+    logo_bytes = logo_path.read_bytes()
+
+    hasher = hashlib.sha256(logo_bytes)
+    hasher.update(f"|v{CONVERSION_VERSION}|{white_threshold}|{black_threshold}|{white_is_content}".encode('utf-8'))
+    cache_path = Path(cache_dir or os.getenv('LOGO_CACHE_DIR', '.logo_cache')) / f"{hasher.hexdigest()}.png"
+
+    if cache_path.exists():
+        try:
+            with Image.open(cache_path) as cached_alpha:
+                transparent_logo = Image.new('RGBA', cached_alpha.size, (0, 0, 0, 0))
+                transparent_logo.putalpha(cached_alpha)
+            logger.info(f"Logo loaded from cache: {logo_path.name}")
+            return transparent_logo
+        except OSError:
+            logger.warning(f"Ignoring unreadable logo cache entry {cache_path}")
+
+    with Image.open(logo_path) as logo:
+        transparent_logo = convert_logo_to_transparent(logo, white_threshold, black_threshold, white_is_content)
+
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f'.{os.getpid()}.tmp')
+        transparent_logo.getchannel('A').save(tmp_path, 'PNG', compress_level=1)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not cache processed logo: {e}")
+
+    return transparent_logo
+
+
+class OverlayCache:
+    """Ready-to-paste RGBA overlays memoized by (logo id, target size, layout profile).
+
+    Catalog images come in only a few sizes, so each overlay is resampled (or, for
+    multi-logo layouts, composited) once per size instead of once per image.
+    """
+
+    def __init__(self):
+        self._overlays: Dict[Tuple[Hashable, Hashable, Hashable], Image.Image] = {}
+
+    def get(self, logo_id: Hashable, size: Hashable, layout: Hashable,
+            build: Callable[[], Image.Image]) -> Image.Image:
+        """Return the cached overlay for this key, calling build() on first use."""
+        key = (logo_id, size, layout)
+        overlay = self._overlays.get(key)
+        if overlay is None:
+            overlay = build()
+            self._overlays[key] = overlay
+        return overlay
+
+    def resized(self, logo_id: Hashable, logo: Image.Image, size: Tuple[int, int],
+                layout: Hashable = 'single') -> Image.Image:
+        """Return logo LANCZOS-resized to size, resampling only on first use."""
+        return self.get(logo_id, tuple(size), layout, lambda: logo.resize(size, Image.Resampling.LANCZOS))
+
+
+# Adder instance owned by each pool worker, built once by the pool initializer
+_worker_adder = None
+
+
+def _init_stamping_worker(adder_factory) -> None:
+    global _worker_adder
+    _worker_adder = adder_factory()
+
+
+def _stamp_in_worker(method_name: str, image_path: Path):
+    return image_path, getattr(_worker_adder, method_name)(image_path)
+
+
+def stamp_images(adder, image_paths: List[Path], workers: int = 1,
+                 method_name: str = 'process_single_image',
+                 factory: Optional[Callable[[], object]] = None) -> Iterator[Tuple[Path, object]]:
+    """Run adder.<method_name>(image_path) over the images, yielding (image_path, result) in order.
+
+    With workers > 1 the images are spread over a process pool. Each worker constructs
+    its own adder with factory() (default type(adder)(), loading the cached logo once)
+    and the parent only sends paths and receives results.
+    """
+    if workers <= 1:
+        for image_path in image_paths:
+            yield image_path, getattr(adder, method_name)(image_path)
+        return
+
+    logger.info(f"Stamping {len(image_paths)} images with {workers} worker processes")
+    chunksize = max(1, min(16, len(image_paths) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_stamping_worker,
+                             initargs=(factory or type(adder),)) as executor:
+        yield from executor.map(partial(_stamp_in_worker, method_name), image_paths, chunksize=chunksize)
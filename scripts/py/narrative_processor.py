@@ -8,13 +8,18 @@ Tests if natural narrative style works better for Gemini 2.5 image generation.
 import os
 import sys
 import shutil
+import argparse
 from pathlib import Path
 from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
+from structured_output import VERIFICATION_MODEL, NO_VERDICT_RESULT, StructuredOutputError, verify_candidate
+from image_precheck import ImagePrecheck
+from response_cache import get_response_cache
+from job_ledger import JobLedger, GracefulInterrupt
 import base64
 from io import BytesIO
-import time
 import logging
 
 # Configure logging
@@ -43,6 +48,13 @@ class NarrativeProcessor:
 
         # Single model for generation
         self.generation_model = genai.GenerativeModel('models/gemini-2.5-flash-image-preview')
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-flash-image-preview')
+        # Verdicts come back as schema-constrained JSON from a text model
+        self.verification_model = genai.GenerativeModel(VERIFICATION_MODEL)
+        self.verification_rate_limiter = get_rate_limiter(VERIFICATION_MODEL)
+        self.response_cache = get_response_cache()
+        # Legacy SDK output has no fixed aspect ratio, so only size/colour checks apply
+        self.precheck = ImagePrecheck(expected_aspect_ratio=0)
 
         logger.info("Narrative processor configuration complete:")
         logger.info("  - Generation model: gemini-2.5-flash-image-preview")
@@ -53,6 +65,9 @@ class NarrativeProcessor:
         self.processed_dir = self.base_dir / 'processed'
         self.failed_dir = self.base_dir / 'failed'
 
+        # Per-image batch state, so interrupted runs resume where they stopped
+        self.ledger = JobLedger(self.base_dir / 'job_ledger.sqlite')
+
         # Create directories
         for dir_path in [self.original_dir, self.processed_dir, self.failed_dir]:
             dir_path.mkdir(exist_ok=True)
@@ -104,9 +119,9 @@ Check if the generated outfit shows:
 - Natural fit on mannequin
 - Clean white background
 
-Respond with:
-PASS: [if everything matches perfectly]
-FAIL: [specific issues that need fixing]"""
+Respond with JSON:
+- verdict: "PASS" (if everything matches perfectly) or "FAIL"
+- issues: [specific issues that need fixing] - empty when PASS"""
 
         logger.info("NarrativeProcessor initialized successfully")
 
@@ -135,6 +150,11 @@ FAIL: [specific issues that need fixing]"""
 
     def verify_generated_image(self, image_data, original_image_data=None):
         """Verify if generated image meets all requirements."""
+        # Cheap local checks first - plainly wrong candidates skip the remote round trip
+        precheck_passed, precheck_result = self.precheck.check(image_data)
+        if not precheck_passed:
+            return False, precheck_result
+
         try:
             # Prepare verification inputs - include original image if available
             verification_inputs = [self.verification_prompt]
@@ -149,36 +169,20 @@ FAIL: [specific issues that need fixing]"""
             # Add reference mannequin for verification
             verification_inputs.append({"mime_type": "image/jpeg", "data": self.reference_mannequin_data})
 
-            # Send to generation model for verification
-            response = self.generation_model.generate_content(verification_inputs)
-
-            # Process response properly - handle both text and inline_data
-            verification_result = ""
-            if response and response.candidates and response.candidates[0].content.parts:
-                for part in response.candidates[0].content.parts:
-                    if hasattr(part, 'text') and part.text:
-                        verification_result = part.text.strip()
-                        break
-
-            if verification_result:
-                logger.info(f"Verification result: {verification_result}")
-
-                # Simple pass/fail detection
-                if verification_result.startswith("PASS:"):
-                    return True, "Verification passed"
-                elif verification_result.startswith("FAIL:"):
-                    return False, verification_result
-                else:
-                    # Fallback detection for natural language
-                    if "pass" in verification_result.lower() or "good" in verification_result.lower() or "correct" in verification_result.lower():
-                        return True, "Verification passed (inferred)"
-                    elif "fail" in verification_result.lower() or "wrong" in verification_result.lower() or "fix" in verification_result.lower():
-                        return False, verification_result
-                    else:
-                        # Default to pass if unclear
-                        return True, "Verification passed (assumed)"
-
-            return False, "No verification response"
+            # Unparseable replies are re-asked and the candidate re-verified before it counts
+            verification = verify_candidate(
+                self.verification_model.model_name, verification_inputs,
+                lambda config: self.verification_rate_limiter.call(
+                    self.verification_model.generate_content, verification_inputs, generation_config=config
+                ),
+                response_cache=self.response_cache
+            )
+            logger.info(f"Verification result: {verification.result_text}")
+            return verification.passed, verification.result_text
+
+        except StructuredOutputError as e:
+            logger.error(f"Verification gave no verdict: {e}")
+            return False, NO_VERDICT_RESULT
 
         except Exception as e:
             error_msg = str(e)
@@ -200,6 +204,7 @@ FAIL: [specific issues that need fixing]"""
         while attempt < max_attempts:
             attempt += 1
             logger.info(f"Processing {image_path.name} - Attempt {attempt}")
+            self.ledger.start_attempt(image_path.name, attempt)
 
             try:
                 # Use narrative processing prompt
@@ -218,11 +223,17 @@ FAIL: [specific issues that need fixing]"""
                     img_byte_arr = img_byte_arr.getvalue()
 
                 # Send to generation model with reference mannequin and original image
-                response = self.generation_model.generate_content([
+                generation_inputs = [
                     base_prompt,
                     {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},  # Reference mannequin
                     {"mime_type": "image/jpeg", "data": img_byte_arr}  # Original product image
-                ])
+                ]
+                # Keyed by attempt (and ledger retry count) so a re-run replays each attempt instead of repeating the first
+                response = self.response_cache.generate_content(
+                    self.generation_model.model_name, generation_inputs,
+                    lambda: self.rate_limiter.call(self.generation_model.generate_content, generation_inputs),
+                    variant=self.ledger.cache_variant(image_path.name, attempt)
+                )
 
                 # Process response
                 if response and response.candidates and response.candidates[0].content.parts:
@@ -237,6 +248,7 @@ FAIL: [specific issues that need fixing]"""
                             logger.info(f"Verifying generated image for {image_path.name}")
                             verification_passed, verification_result = self.verify_generated_image(generated_image_data, img_byte_arr)
                             last_verification_result = verification_result
+                            self.ledger.record_verification(image_path.name, verification_result)
 
                             if verification_passed:
                                 # Save verified image
@@ -272,8 +284,13 @@ FAIL: [specific issues that need fixing]"""
 
         return False, "Max processing attempts reached"
 
-    def batch_process_images(self, max_images=None, sample_mode=False):
-        """Process all images in the original directory."""
+    def batch_process_images(self, max_images=None, sample_mode=False, retry_failed=False):
+        """Process all images in the original directory.
+
+        Images already finished in the job ledger are skipped (failed ones too unless
+        retry_failed), so an interrupted run resumes where it stopped. Ctrl-C stops
+        picking up new images; a second Ctrl-C aborts.
+        """
         logger.info("Starting narrative batch processing...")
 
         # Get list of images to process
@@ -288,27 +305,31 @@ FAIL: [specific issues that need fixing]"""
             images_to_process = images_to_process[:max_images]
             logger.info(f"Sample mode: processing {len(images_to_process)} images")
 
+        images_to_process = self.ledger.filter_unfinished(images_to_process, retry_failed)
+
         success_count = 0
         failure_count = 0
 
-        for i, image_path in enumerate(images_to_process, 1):
-            logger.info(f"Processing image {i}/{len(images_to_process)}: {image_path.name}")
-
-            success, result = self.process_single_image(image_path)
+        with GracefulInterrupt() as interrupt:
+            for i, image_path in enumerate(images_to_process, 1):
+                if interrupt.requested:
+                    logger.warning(f"Batch interrupted - rerun to resume, ledger: {self.ledger.summary()}")
+                    break
+                logger.info(f"Processing image {i}/{len(images_to_process)}: {image_path.name}")
 
-            if success:
-                success_count += 1
-            else:
-                failure_count += 1
-                # Move failed images to failed directory
-                failed_path = self.failed_dir / image_path.name
-                shutil.copy2(str(image_path), str(failed_path))
-                logger.warning(f"Failed to process {image_path.name}: {result}")
+                success, result = self.process_single_image(image_path)
+                self.ledger.mark_finished(image_path.name, success, result)
 
-            # Rate limiting
-            if i < len(images_to_process):
-                time.sleep(1)
+                if success:
+                    success_count += 1
+                else:
+                    failure_count += 1
+                    # Move failed images to failed directory
+                    failed_path = self.failed_dir / image_path.name
+                    shutil.copy2(str(image_path), str(failed_path))
+                    logger.warning(f"Failed to process {image_path.name}: {result}")
 
+        self.response_cache.log_stats()
         logger.info(f"Narrative batch processing complete: {success_count} successful, {failure_count} failed")
         return success_count, failure_count
 
@@ -330,6 +351,13 @@ FAIL: [specific issues that need fixing]"""
 
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description='Narrative-process product images onto the reference mannequin')
+    parser.add_argument('--retry-failed',
+                       action='store_true',
+                       help='Reprocess images the job ledger records as failed (finished images are skipped by default)')
+
+    args = parser.parse_args()
+
     try:
         # Initialize narrative processor
         processor = NarrativeProcessor()
@@ -339,7 +367,7 @@ def main():
 
         # Process images with narrative approach
         logger.info("Starting narrative batch processing...")
-        success, failure = processor.batch_process_images()
+        success, failure = processor.batch_process_images(retry_failed=args.retry_failed)
 
         if success > 0:
             logger.info(f"Narrative processing completed: {success} images processed successfully.")
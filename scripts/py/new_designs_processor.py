@@ -12,10 +12,15 @@ from pathlib import Path
 from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
+from structured_output import VERIFICATION_MODEL, NO_VERDICT_RESULT, StructuredOutputError, verify_candidate
+from image_precheck import ImagePrecheck
+from generate_verify_pipeline import GenerateVerifyPipeline, generate_first_passing
+from job_ledger import JobLedger, GracefulInterrupt
 import base64
 from io import BytesIO
-import time
 import logging
+import argparse
 
 # Configure logging
 logging.basicConfig(
@@ -43,6 +48,12 @@ class NewDesignsProcessor:
 
         # Single model for generation
         self.generation_model = genai.GenerativeModel('models/gemini-2.5-flash-image-preview')
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-flash-image-preview')
+        # Verdicts come back as schema-constrained JSON from a text model
+        self.verification_model = genai.GenerativeModel(VERIFICATION_MODEL)
+        self.verification_rate_limiter = get_rate_limiter(VERIFICATION_MODEL)
+        # Legacy SDK output has no fixed aspect ratio, so only size/colour checks apply
+        self.precheck = ImagePrecheck(expected_aspect_ratio=0)
 
         logger.info("Single model configuration complete:")
         logger.info("  - Generation model: gemini-2.5-flash-image-preview")
@@ -53,6 +64,15 @@ class NewDesignsProcessor:
         self.processed_dir = self.base_dir / 'processed'
         self.failed_dir = self.base_dir / 'failed'
 
+        # Per-image batch state, so interrupted runs resume where they stopped
+        self.ledger = JobLedger(self.base_dir / 'job_ledger.sqlite')
+
+        # Optimized limit based on log analysis - most successes occur within 7 attempts
+        self.max_attempts = 7
+
+        # Candidates generated in parallel on the first attempt (1 = no speculation)
+        self.speculative_candidates = 1
+
         # Load reference mannequin
         self.reference_mannequin_path = Path('ideal.jpg')
         if not self.reference_mannequin_path.exists():
@@ -194,9 +214,9 @@ COMPARISON FAILURE RESPONSES:
 - If collar modified: "FAIL: Collar modified - must maintain original collar exactly"
 - If design changed: "FAIL: Design elements modified from original"
 
-Respond with:
-PASS: Generated image matches original exactly and meets all requirements
-FAIL: [specific differences or missing requirements]"""
+Respond with JSON:
+- verdict: "PASS" (Generated image matches original exactly and meets all requirements) or "FAIL"
+- issues: [specific differences or missing requirements] - empty when PASS"""
 
         logger.info("NewDesignsProcessor initialized successfully")
 
@@ -252,6 +272,11 @@ FAIL: [specific differences or missing requirements]"""
 
     def verify_generated_image(self, image_data, original_image_data=None):
         """Verify if generated image meets all requirements."""
+        # Cheap local checks first - plainly wrong candidates skip the remote round trip
+        precheck_passed, precheck_result = self.precheck.check(image_data)
+        if not precheck_passed:
+            return False, precheck_result
+
         try:
             # Prepare verification inputs - include original image if available
             verification_inputs = [self.verification_prompt]
@@ -266,25 +291,20 @@ FAIL: [specific differences or missing requirements]"""
             # Add reference mannequin for verification
             verification_inputs.append({"mime_type": "image/jpeg", "data": self.reference_mannequin_data})
 
-            # Send to generation model for verification
-            response = self.generation_model.generate_content(verification_inputs)
-
-            if response and response.text:
-                verification_result = response.text.strip().upper()
-                logger.info(f"Verification result: {verification_result}")
-
-                if verification_result.startswith("PASS:"):
-                    return True, "Verification passed"
-                elif verification_result.startswith("FAIL:"):
-                    return False, verification_result
-                else:
-                    # If unclear response, check for key indicators
-                    if "pass" in response.text.lower():
-                        return True, "Verification passed (inferred)"
-                    else:
-                        return False, f"Unclear verification: {response.text}"
-
-            return False, "No verification response"
+            # Unparseable replies are re-asked and the candidate re-verified before it counts
+            verification = verify_candidate(
+                self.verification_model.model_name, verification_inputs,
+                lambda config: self.verification_rate_limiter.call(
+                    self.verification_model.generate_content, verification_inputs, generation_config=config
+                ),
+                
+            )
+            logger.info(f"Verification result: {verification.result_text}")
+            return verification.passed, verification.result_text
+
+        except StructuredOutputError as e:
+            logger.error(f"Verification gave no verdict: {e}")
+            return False, NO_VERDICT_RESULT
 
         except Exception as e:
             error_msg = str(e)
@@ -297,9 +317,150 @@ FAIL: [specific differences or missing requirements]"""
 
             return False, f"Verification error: {error_msg}"
 
+    def build_prompt(self, attempt, last_verification_result, collar_feedback):
+        """Build the generation prompt, adding retry and collar feedback after the first attempt."""
+        # Use comprehensive processing prompt
+        base_prompt = self.processing_prompt
+
+        # Build enhanced prompt with feedback
+        if attempt == 1:
+            prompt = base_prompt
+        else:
+            prompt = base_prompt + f"\n\nPREVIOUS ATTEMPT FAILED because: {last_verification_result}\n\nPLEASE FIX THESE SPECIFIC ISSUES:\n"
+            if "jewelry" in last_verification_result.lower():
+                prompt += "- Remove ALL jewelry from the clothing\n"
+            if "footwear" in last_verification_result.lower():
+                prompt += "- Remove ALL footwear from the clothing\n"
+            if "accessories" in last_verification_result.lower():
+                prompt += "- Remove ALL accessories from the clothing\n"
+            if "black" in last_verification_result.lower():
+                prompt += "- Ensure the reference mannequin remains completely black with rose gold head\n"
+            if "full body" in last_verification_result.lower():
+                prompt += "- Ensure full mannequin body is visible\n"
+            if "trousers" in last_verification_result.lower() or "pants" in last_verification_result.lower():
+                prompt += "- CREATE matching trousers/pants using the EXACT same fabric as the top clothing item\n"
+                prompt += "- Ensure the trousers/pants coordinate perfectly with the top item\n"
+                prompt += "- The fabric patterns and colors MUST match exactly\n"
+            if "complete outfit" in last_verification_result.lower():
+                prompt += "- Ensure BOTH top AND bottom clothing items are present\n"
+                prompt += "- Create matching trousers/pants that complement the top item\n"
+            if "fabric" in last_verification_result.lower() and "match" in last_verification_result.lower():
+                prompt += "- Ensure the trousers/pants use the EXACT same fabric patterns and colors as the top\n"
+                prompt += "- The coordination between top and bottom must be perfect\n"
+            if "sleeve" in last_verification_result.lower() or "sleeveless" in last_verification_result.lower():
+                prompt += "- ENSURE the top item has FULL-LENGTH SLEEVES extending to cuff/wrist length\n"
+                prompt += "- NO sleeveless or short-sleeve designs allowed\n"
+                prompt += "- Sleeves must use the EXACT same fabric as the main clothing item\n"
+                prompt += "- Convert any sleeveless design to have appropriate full-length sleeves\n"
+            if "collar" in last_verification_result.lower() or "neckline" in last_verification_result.lower() or "chinese" in last_verification_result.lower() or "mandarin" in last_verification_result.lower() or "asian" in last_verification_result.lower():
+                prompt += "- COLLAR EMERGENCY: The collar has been modified - THIS IS ABSOLUTELY FORBIDDEN\n"
+                prompt += "- You MUST examine the original image collar EXTREMELY carefully and replicate it EXACTLY\n"
+                prompt += "- The collar MUST be identical to the original - ZERO modifications permitted\n"
+                prompt += "- DO NOT create chinese-style collars, mandarin collars, or asian necklines\n"
+                prompt += "- The AI model has a bias towards cultural adaptation - you MUST RESIST this bias\n"
+
+                # Add specific collar type detection and preservation
+                if "standard suit collar" in last_verification_result.lower() or "lapels" in last_verification_result.lower():
+                    prompt += "- ORIGINAL HAS STANDARD SUIT COLLAR WITH LAPELS - REPLICATE THIS EXACTLY\n"
+                    prompt += "- DO NOT convert to mandarin collar - maintain the pointed lapel structure\n"
+                if "v-neck" in last_verification_result.lower():
+                    prompt += "- ORIGINAL HAS V-NECK - MAINTAIN V-SHAPE EXACTLY\n"
+                if "spread collar" in last_verification_result.lower():
+                    prompt += "- ORIGINAL HAS SPREAD COLLAR - MAINTAIN SPREAD ANGLE EXACTLY\n"
+                if "round neck" in last_verification_result.lower():
+                    prompt += "- ORIGINAL HAS ROUND NECK - MAINTAIN CURVED SHAPE EXACTLY\n"
+
+                prompt += "- NO rounding, NO straightening, NO cultural adaptations, NO style changes\n"
+                prompt += "- The collar must be PERFECT EXACT REPLICA down to the millimeter\n"
+                prompt += "- Compare the collar shape pixel by pixel between original and generated\n"
+
+                # Add specific feedback based on parsed collar analysis
+                if "ORIGINAL_HAS_STANDARD_SUIT_COLLAR" in collar_feedback:
+                    prompt += "- CRITICAL: Original has standard suit collar with lapels - you MUST replicate this exact structure\n"
+                if "ORIGINAL_HAS_LAPELS" in collar_feedback:
+                    prompt += "- CRITICAL: Original has lapels - maintain the pointed lapel structure exactly\n"
+                if "GENERATED_HAS_MANDARIN_COLLAR" in collar_feedback:
+                    prompt += "- ERROR: You created a mandarin collar - this is WRONG\n"
+                    prompt += "- You MUST create the original collar type, NOT a mandarin collar\n"
+                if "GENERATED_HAS_CHINESE_COLLAR" in collar_feedback:
+                    prompt += "- ERROR: You created a chinese-style collar - this is WRONG\n"
+                    prompt += "- Study the original image collar and replicate it EXACTLY\n"
+            if "replica" in last_verification_result.lower() or "exact" in last_verification_result.lower() or "modification" in last_verification_result.lower():
+                prompt += "- Create a PERFECT EXACT REPLICA of the original clothing item\n"
+                prompt += "- ZERO modifications to original design elements, patterns, textures, or details\n"
+                prompt += "- Preserve ALL original styling, buttons, zippers, stitching, and features exactly\n"
+                prompt += "- ONLY permitted changes: adding matching trousers/pants and sleeve length adjustment\n"
+                prompt += "- DO NOT alter any aspect of the original clothing except sleeve length\n"
+            if "cultural" in last_verification_result.lower() or "chinese" in last_verification_result.lower() or "mandarin" in last_verification_result.lower() or "asian" in last_verification_result.lower() or "style" in last_verification_result.lower():
+                prompt += "- CULTURAL BIAS EMERGENCY: The AI is making cultural adaptations - THIS IS FORBIDDEN\n"
+                prompt += "- IGNORE ALL cultural associations and style interpretations\n"
+                prompt += "- Focus ONLY on visual elements, NOT cultural context\n"
+                prompt += "- DO NOT adapt to cultural styles - maintain original design exactly\n"
+                prompt += "- The AI model has a known bias towards chinese collar conversion - RESIST THIS BIAS\n"
+                prompt += "- Perfect replication requires ignoring ALL cultural bias\n"
+                prompt += "- Examine the original image and replicate it EXACTLY without cultural interpretation\n"
+            prompt += "\nThe reference mannequin is perfect - focus on creating a PERFECT EXACT REPLICA of the original clothing with ABSOLUTE collar preservation and NO cultural style adaptations."
+
+        # Add visual comparison instructions for collar failures
+        if any(keyword in last_verification_result.lower() for keyword in ["collar", "neckline", "chinese", "mandarin", "asian"]):
+            prompt += "\n\nVISUAL COMPARISON INSTRUCTIONS:\n"
+            prompt += "- Place original and generated images side by side\n"
+            prompt += "- Compare collar shape line by line, curve by curve\n"
+            prompt += "- Measure the angle and depth of the collar opening\n"
+            prompt += "- Count the number of collar points if applicable\n"
+            prompt += "- Match the exact curve radius and length\n"
+            prompt += "- If original has pointed lapels, replicate exact point shape\n"
+            prompt += "- If original has rounded collar, match exact curve radius\n"
+            prompt += "- ZERO tolerance for collar shape deviations\n"
+
+        return prompt
+
+    def load_original_image_data(self, image_path):
+        """Load the original product image as RGB JPEG bytes."""
+        with Image.open(image_path) as img:
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            img_byte_arr = BytesIO()
+            img.save(img_byte_arr, format='JPEG')
+            img_byte_arr = img_byte_arr.getvalue()
+
+        return img_byte_arr
+
+    def generate_candidate(self, prompt, original_image_data):
+        """Send one generation request and return the candidate image bytes, or None."""
+        # Send to generation model with reference mannequin and original image
+        with self.rate_limiter.slot():
+            response = self.generation_model.generate_content([
+                prompt,
+                {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},  # Reference mannequin
+                {"mime_type": "image/jpeg", "data": original_image_data}  # Original product image
+            ])
+
+        # Process response
+        if response and response.candidates and response.candidates[0].content.parts:
+            for part in response.candidates[0].content.parts:
+                if hasattr(part, 'inline_data') and part.inline_data.mime_type.startswith('image/'):
+                    # Get generated image data
+                    generated_image_data = part.inline_data.data
+                    if isinstance(generated_image_data, str):
+                        generated_image_data = base64.b64decode(generated_image_data)
+                    return generated_image_data
+
+        return None
+
+    def save_processed_image(self, image_path, image_data):
+        """Write a verified image to the processed directory and return its path."""
+        processed_filename = f"processed_{image_path.stem}.jpg"
+        processed_path = self.processed_dir / processed_filename
+
+        with open(processed_path, 'wb') as f:
+            f.write(image_data)
+
+        return processed_path
+
     def process_single_image(self, image_path):
         """Process a single image using reference mannequin with enhanced feedback loop."""
-        max_attempts = 7  # Optimized limit based on log analysis - most successes occur within 7 attempts
+        max_attempts = self.max_attempts
         attempt = 0
         last_verification_result = ""
         collar_feedback = []
@@ -307,167 +468,76 @@ FAIL: [specific differences or missing requirements]"""
         while attempt < max_attempts:
             attempt += 1
             logger.info(f"Processing {image_path.name} - Attempt {attempt}")
+            self.ledger.start_attempt(image_path.name, attempt)
 
             try:
-                # Use comprehensive processing prompt
-                base_prompt = self.processing_prompt
-
                 # Build enhanced prompt with feedback
-                if attempt == 1:
-                    prompt = base_prompt
-                else:
-                    prompt = base_prompt + f"\n\nPREVIOUS ATTEMPT FAILED because: {last_verification_result}\n\nPLEASE FIX THESE SPECIFIC ISSUES:\n"
-                    if "jewelry" in last_verification_result.lower():
-                        prompt += "- Remove ALL jewelry from the clothing\n"
-                    if "footwear" in last_verification_result.lower():
-                        prompt += "- Remove ALL footwear from the clothing\n"
-                    if "accessories" in last_verification_result.lower():
-                        prompt += "- Remove ALL accessories from the clothing\n"
-                    if "black" in last_verification_result.lower():
-                        prompt += "- Ensure the reference mannequin remains completely black with rose gold head\n"
-                    if "full body" in last_verification_result.lower():
-                        prompt += "- Ensure full mannequin body is visible\n"
-                    if "trousers" in last_verification_result.lower() or "pants" in last_verification_result.lower():
-                        prompt += "- CREATE matching trousers/pants using the EXACT same fabric as the top clothing item\n"
-                        prompt += "- Ensure the trousers/pants coordinate perfectly with the top item\n"
-                        prompt += "- The fabric patterns and colors MUST match exactly\n"
-                    if "complete outfit" in last_verification_result.lower():
-                        prompt += "- Ensure BOTH top AND bottom clothing items are present\n"
-                        prompt += "- Create matching trousers/pants that complement the top item\n"
-                    if "fabric" in last_verification_result.lower() and "match" in last_verification_result.lower():
-                        prompt += "- Ensure the trousers/pants use the EXACT same fabric patterns and colors as the top\n"
-                        prompt += "- The coordination between top and bottom must be perfect\n"
-                    if "sleeve" in last_verification_result.lower() or "sleeveless" in last_verification_result.lower():
-                        prompt += "- ENSURE the top item has FULL-LENGTH SLEEVES extending to cuff/wrist length\n"
-                        prompt += "- NO sleeveless or short-sleeve designs allowed\n"
-                        prompt += "- Sleeves must use the EXACT same fabric as the main clothing item\n"
-                        prompt += "- Convert any sleeveless design to have appropriate full-length sleeves\n"
-                    if "collar" in last_verification_result.lower() or "neckline" in last_verification_result.lower() or "chinese" in last_verification_result.lower() or "mandarin" in last_verification_result.lower() or "asian" in last_verification_result.lower():
-                        prompt += "- COLLAR EMERGENCY: The collar has been modified - THIS IS ABSOLUTELY FORBIDDEN\n"
-                        prompt += "- You MUST examine the original image collar EXTREMELY carefully and replicate it EXACTLY\n"
-                        prompt += "- The collar MUST be identical to the original - ZERO modifications permitted\n"
-                        prompt += "- DO NOT create chinese-style collars, mandarin collars, or asian necklines\n"
-                        prompt += "- The AI model has a bias towards cultural adaptation - you MUST RESIST this bias\n"
-
-                        # Add specific collar type detection and preservation
-                        if "standard suit collar" in last_verification_result.lower() or "lapels" in last_verification_result.lower():
-                            prompt += "- ORIGINAL HAS STANDARD SUIT COLLAR WITH LAPELS - REPLICATE THIS EXACTLY\n"
-                            prompt += "- DO NOT convert to mandarin collar - maintain the pointed lapel structure\n"
-                        if "v-neck" in last_verification_result.lower():
-                            prompt += "- ORIGINAL HAS V-NECK - MAINTAIN V-SHAPE EXACTLY\n"
-                        if "spread collar" in last_verification_result.lower():
-                            prompt += "- ORIGINAL HAS SPREAD COLLAR - MAINTAIN SPREAD ANGLE EXACTLY\n"
-                        if "round neck" in last_verification_result.lower():
-                            prompt += "- ORIGINAL HAS ROUND NECK - MAINTAIN CURVED SHAPE EXACTLY\n"
-
-                        prompt += "- NO rounding, NO straightening, NO cultural adaptations, NO style changes\n"
-                        prompt += "- The collar must be PERFECT EXACT REPLICA down to the millimeter\n"
-                        prompt += "- Compare the collar shape pixel by pixel between original and generated\n"
-
-                        # Add specific feedback based on parsed collar analysis
-                        if "ORIGINAL_HAS_STANDARD_SUIT_COLLAR" in collar_feedback:
-                            prompt += "- CRITICAL: Original has standard suit collar with lapels - you MUST replicate this exact structure\n"
-                        if "ORIGINAL_HAS_LAPELS" in collar_feedback:
-                            prompt += "- CRITICAL: Original has lapels - maintain the pointed lapel structure exactly\n"
-                        if "GENERATED_HAS_MANDARIN_COLLAR" in collar_feedback:
-                            prompt += "- ERROR: You created a mandarin collar - this is WRONG\n"
-                            prompt += "- You MUST create the original collar type, NOT a mandarin collar\n"
-                        if "GENERATED_HAS_CHINESE_COLLAR" in collar_feedback:
-                            prompt += "- ERROR: You created a chinese-style collar - this is WRONG\n"
-                            prompt += "- Study the original image collar and replicate it EXACTLY\n"
-                    if "replica" in last_verification_result.lower() or "exact" in last_verification_result.lower() or "modification" in last_verification_result.lower():
-                        prompt += "- Create a PERFECT EXACT REPLICA of the original clothing item\n"
-                        prompt += "- ZERO modifications to original design elements, patterns, textures, or details\n"
-                        prompt += "- Preserve ALL original styling, buttons, zippers, stitching, and features exactly\n"
-                        prompt += "- ONLY permitted changes: adding matching trousers/pants and sleeve length adjustment\n"
-                        prompt += "- DO NOT alter any aspect of the original clothing except sleeve length\n"
-                    if "cultural" in last_verification_result.lower() or "chinese" in last_verification_result.lower() or "mandarin" in last_verification_result.lower() or "asian" in last_verification_result.lower() or "style" in last_verification_result.lower():
-                        prompt += "- CULTURAL BIAS EMERGENCY: The AI is making cultural adaptations - THIS IS FORBIDDEN\n"
-                        prompt += "- IGNORE ALL cultural associations and style interpretations\n"
-                        prompt += "- Focus ONLY on visual elements, NOT cultural context\n"
-                        prompt += "- DO NOT adapt to cultural styles - maintain original design exactly\n"
-                        prompt += "- The AI model has a known bias towards chinese collar conversion - RESIST THIS BIAS\n"
-                        prompt += "- Perfect replication requires ignoring ALL cultural bias\n"
-                        prompt += "- Examine the original image and replicate it EXACTLY without cultural interpretation\n"
-                    prompt += "\nThe reference mannequin is perfect - focus on creating a PERFECT EXACT REPLICA of the original clothing with ABSOLUTE collar preservation and NO cultural style adaptations."
-
-                # Add visual comparison instructions for collar failures
-                if any(keyword in last_verification_result.lower() for keyword in ["collar", "neckline", "chinese", "mandarin", "asian"]):
-                    prompt += "\n\nVISUAL COMPARISON INSTRUCTIONS:\n"
-                    prompt += "- Place original and generated images side by side\n"
-                    prompt += "- Compare collar shape line by line, curve by curve\n"
-                    prompt += "- Measure the angle and depth of the collar opening\n"
-                    prompt += "- Count the number of collar points if applicable\n"
-                    prompt += "- Match the exact curve radius and length\n"
-                    prompt += "- If original has pointed lapels, replicate exact point shape\n"
-                    prompt += "- If original has rounded collar, match exact curve radius\n"
-                    prompt += "- ZERO tolerance for collar shape deviations\n"
+                prompt = self.build_prompt(attempt, last_verification_result, collar_feedback)
 
                 # Load original image
-                with Image.open(image_path) as img:
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    img_byte_arr = BytesIO()
-                    img.save(img_byte_arr, format='JPEG')
-                    img_byte_arr = img_byte_arr.getvalue()
-
-                # Send to generation model with reference mannequin and original image
-                response = self.generation_model.generate_content([
-                    prompt,
-                    {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},  # Reference mannequin
-                    {"mime_type": "image/jpeg", "data": img_byte_arr}  # Original product image
-                ])
-
-                # Process response
-                if response and response.candidates and response.candidates[0].content.parts:
-                    for part in response.candidates[0].content.parts:
-                        if hasattr(part, 'inline_data') and part.inline_data.mime_type.startswith('image/'):
-                            # Get generated image data
-                            generated_image_data = part.inline_data.data
-                            if isinstance(generated_image_data, str):
-                                generated_image_data = base64.b64decode(generated_image_data)
-
-                            # Verify the generated image with original image for comparison
-                            logger.info(f"Verifying generated image for {image_path.name}")
-                            verification_passed, verification_result = self.verify_generated_image(generated_image_data, img_byte_arr)
-                            last_verification_result = verification_result
-
-                            # Parse specific collar feedback for better retry instructions
-                            collar_feedback = self.parse_collar_feedback(verification_result)
-                            if collar_feedback:
-                                logger.info(f"Collar feedback detected: {collar_feedback}")
-
-                            if verification_passed:
-                                # Save verified image
-                                processed_filename = f"processed_{image_path.stem}.jpg"
-                                processed_path = self.processed_dir / processed_filename
-
-                                with open(processed_path, 'wb') as f:
-                                    f.write(generated_image_data)
-
-                                logger.info(f"Successfully processed and verified {image_path.name}")
-                                return True, processed_path
+                img_byte_arr = self.load_original_image_data(image_path)
+
+                if attempt == 1 and self.speculative_candidates > 1:
+                    # Race several candidates; the retry-with-feedback loop only starts if all fail
+                    logger.info(f"Speculative mode: generating {self.speculative_candidates} candidates for {image_path.name}")
+                    generated_image_data, verification_result = generate_first_passing(
+                        lambda index: self.generate_candidate(prompt, img_byte_arr),
+                        lambda candidate: self.verify_generated_image(candidate, img_byte_arr),
+                        self.speculative_candidates
+                    )
+                    last_verification_result = verification_result
+                    self.ledger.record_verification(image_path.name, verification_result)
+
+                    if generated_image_data is not None:
+                        processed_path = self.save_processed_image(image_path, generated_image_data)
+                        logger.info(f"Successfully processed and verified {image_path.name}")
+                        return True, processed_path
+
+                    collar_feedback = self.parse_collar_feedback(verification_result)
+                    logger.warning(f"All {self.speculative_candidates} candidates failed for {image_path.name}: {verification_result}")
+                    continue
+
+                generated_image_data = self.generate_candidate(prompt, img_byte_arr)
+
+                if generated_image_data is not None:
+                    # Verify the generated image with original image for comparison
+                    logger.info(f"Verifying generated image for {image_path.name}")
+                    verification_passed, verification_result = self.verify_generated_image(generated_image_data, img_byte_arr)
+                    last_verification_result = verification_result
+                    self.ledger.record_verification(image_path.name, verification_result)
+
+                    # Parse specific collar feedback for better retry instructions
+                    collar_feedback = self.parse_collar_feedback(verification_result)
+                    if collar_feedback:
+                        logger.info(f"Collar feedback detected: {collar_feedback}")
+
+                    if verification_passed:
+                        # Save verified image
+                        processed_path = self.save_processed_image(image_path, generated_image_data)
+
+                        logger.info(f"Successfully processed and verified {image_path.name}")
+                        return True, processed_path
+                    else:
+                        logger.warning(f"Verification failed for {image_path.name}: {verification_result}")
+
+                        # Special handling for collar failures - these are critical
+                        if any(keyword in verification_result.lower() for keyword in ["collar", "neckline", "chinese", "mandarin", "asian", "cultural"]):
+                            logger.error(f"COLLAR FAILURE DETECTED for {image_path.name}: {verification_result}")
+                            logger.error("This indicates AI model bias - retrying with emergency collar instructions")
+                            if attempt < max_attempts:
+                                logger.info(f"Emergency collar retry - attempt {attempt + 1}")
+                                # Force immediate retry with enhanced collar focus
+                                continue
                             else:
-                                logger.warning(f"Verification failed for {image_path.name}: {verification_result}")
-
-                                # Special handling for collar failures - these are critical
-                                if any(keyword in verification_result.lower() for keyword in ["collar", "neckline", "chinese", "mandarin", "asian", "cultural"]):
-                                    logger.error(f"COLLAR FAILURE DETECTED for {image_path.name}: {verification_result}")
-                                    logger.error("This indicates AI model bias - retrying with emergency collar instructions")
-                                    if attempt < max_attempts:
-                                        logger.info(f"Emergency collar retry - attempt {attempt + 1}")
-                                        # Force immediate retry with enhanced collar focus
-                                        continue
-                                    else:
-                                        logger.error(f"Max attempts reached for {image_path.name} - collar preservation failed")
-                                        return False, f"COLLAR FAILURE after {max_attempts} attempts: {verification_result}"
-                                else:
-                                    if attempt < max_attempts:
-                                        logger.info(f"Will retry with specific feedback...")
-                                        continue
-                                    else:
-                                        logger.error(f"Max attempts reached for {image_path.name}")
-                                        return False, f"Failed verification after {max_attempts} attempts: {verification_result}"
+                                logger.error(f"Max attempts reached for {image_path.name} - collar preservation failed")
+                                return False, f"COLLAR FAILURE after {max_attempts} attempts: {verification_result}"
+                        else:
+                            if attempt < max_attempts:
+                                logger.info(f"Will retry with specific feedback...")
+                                continue
+                            else:
+                                logger.error(f"Max attempts reached for {image_path.name}")
+                                return False, f"Failed verification after {max_attempts} attempts: {verification_result}"
 
                 logger.warning(f"No image generated for {image_path.name} - attempt {attempt}")
                 if attempt < max_attempts:
@@ -484,8 +554,75 @@ FAIL: [specific differences or missing requirements]"""
 
         return False, "Max processing attempts reached"
 
-    def batch_process_images(self, max_images=None, sample_mode=False):
-        """Process all images in the original directory."""
+    def _pipeline_generate(self, job):
+        """Generation stage: build the prompt from the job's feedback and generate a candidate."""
+        if 'original_image_data' not in job.state:
+            job.state['original_image_data'] = self.load_original_image_data(job.image_path)
+        self.ledger.start_attempt(job.image_path.name, job.attempt)
+        prompt = self.build_prompt(job.attempt, job.last_result, job.state.get('collar_feedback', []))
+        return self.generate_candidate(prompt, job.state['original_image_data'])
+
+    def _pipeline_verify(self, job, candidate):
+        """Verification stage: verify against the original and record collar feedback for the retry."""
+        verification_passed, verification_result = self.verify_generated_image(candidate, job.state['original_image_data'])
+        self.ledger.record_verification(job.image_path.name, verification_result)
+        job.state['collar_feedback'] = self.parse_collar_feedback(verification_result)
+        if job.state['collar_feedback']:
+            logger.info(f"Collar feedback detected: {job.state['collar_feedback']}")
+        return verification_passed, verification_result
+
+    def _record_result(self, image_path, success, result):
+        """Record the outcome in the job ledger, copy failed images to the failed directory and log it."""
+        self.ledger.mark_finished(image_path.name, success, result)
+        if not success:
+            # Move failed images to failed directory
+            failed_path = self.failed_dir / image_path.name
+            shutil.copy2(str(image_path), str(failed_path))
+            logger.warning(f"Failed to process {image_path.name}: {result}")
+
+    def _process_images_pipelined(self, images_to_process, max_workers, verify_workers, interrupt):
+        """Run generation and verification as separate worker pools.
+
+        Verification of one image overlaps with generation of the next; failed
+        candidates go back to the generators with their verification and collar feedback.
+        """
+        counts = {'success': 0, 'failure': 0}
+
+        def on_result(image_path, success, result):
+            if success is None:
+                return
+            counts['success' if success else 'failure'] += 1
+            self._record_result(image_path, success, result)
+            logger.info(f"Completed image {counts['success'] + counts['failure']}/{len(images_to_process)}: {image_path.name} ({'success' if success else 'failed'})")
+
+        pipeline = GenerateVerifyPipeline(
+            generate_fn=self._pipeline_generate,
+            verify_fn=self._pipeline_verify,
+            save_fn=lambda job, candidate: self.save_processed_image(job.image_path, candidate),
+            max_attempts=self.max_attempts,
+            generate_workers=max_workers,
+            verify_workers=verify_workers,
+            should_stop=lambda: interrupt.requested
+        )
+        pipeline.run(images_to_process, on_result=on_result)
+
+        return counts['success'], counts['failure']
+
+    def batch_process_images(self, max_images=None, sample_mode=False, max_workers=1, verify_workers=0,
+                             retry_failed=False):
+        """Process all images in the original directory.
+
+        Images already finished in the job ledger are skipped, so an interrupted run
+        resumes where it stopped. Ctrl-C stops picking up new images; a second Ctrl-C aborts.
+
+        Args:
+            max_images: Number of images to process in sample mode
+            sample_mode: Only process the first max_images images
+            max_workers: Number of generation workers in pipelined mode
+            verify_workers: Size of a separate verification pool; when set, generation
+                and verification run as a pipeline instead of one image at a time
+            retry_failed: Also reprocess images the ledger records as failed
+        """
         logger.info("Starting batch processing...")
 
         # Get list of images to process
@@ -500,27 +637,34 @@ FAIL: [specific differences or missing requirements]"""
             images_to_process = images_to_process[:max_images]
             logger.info(f"Sample mode: processing {len(images_to_process)} images")
 
-        success_count = 0
-        failure_count = 0
-
-        for i, image_path in enumerate(images_to_process, 1):
-            logger.info(f"Processing image {i}/{len(images_to_process)}: {image_path.name}")
+        images_to_process = self.ledger.filter_unfinished(images_to_process, retry_failed)
 
-            success, result = self.process_single_image(image_path)
+        if verify_workers > 0 and self.speculative_candidates > 1:
+            logger.warning(f"Speculative candidates ({self.speculative_candidates}) are not used by the "
+                           f"pipelined mode - generating one candidate per attempt")
 
-            if success:
-                success_count += 1
+        with GracefulInterrupt() as interrupt:
+            if verify_workers > 0:
+                success_count, failure_count = self._process_images_pipelined(images_to_process, max_workers, verify_workers, interrupt)
             else:
-                failure_count += 1
-                # Move failed images to failed directory
-                failed_path = self.failed_dir / image_path.name
-                shutil.copy2(str(image_path), str(failed_path))
-                logger.warning(f"Failed to process {image_path.name}: {result}")
+                success_count = 0
+                failure_count = 0
+
+                for i, image_path in enumerate(images_to_process, 1):
+                    if interrupt.requested:
+                        break
+                    logger.info(f"Processing image {i}/{len(images_to_process)}: {image_path.name}")
 
-            # Rate limiting - avoid API quota issues
-            if i < len(images_to_process):
-                time.sleep(1)
+                    success, result = self.process_single_image(image_path)
 
+                    if success:
+                        success_count += 1
+                    else:
+                        failure_count += 1
+                    self._record_result(image_path, success, result)
+
+        if interrupt.requested:
+            logger.warning(f"Batch interrupted - rerun to resume, ledger: {self.ledger.summary()}")
         logger.info(f"Batch processing complete: {success_count} successful, {failure_count} failed")
         return success_count, failure_count
 
@@ -542,16 +686,42 @@ FAIL: [specific differences or missing requirements]"""
 
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description='Standardize new designs onto the reference mannequin')
+    parser.add_argument('--workers', '-w',
+                       type=int,
+                       default=1,
+                       help='Number of generation workers in pipelined mode; requires --verify-workers (default: 1)')
+    parser.add_argument('--verify-workers', '-v',
+                       type=int,
+                       default=0,
+                       help='Run verification in a separate pool of this size, pipelined with generation (default: off)')
+    parser.add_argument('--speculative', '-k',
+                       type=int,
+                       default=1,
+                       help='Generate K first-attempt candidates in parallel and keep the first that passes (default: 1)')
+    parser.add_argument('--retry-failed',
+                       action='store_true',
+                       help='Reprocess images the job ledger records as failed (finished images are skipped by default)')
+
+    args = parser.parse_args()
+    if args.speculative > 1 and args.verify_workers > 0:
+        parser.error('--speculative cannot be combined with --verify-workers (the pipeline generates one candidate per attempt)')
+    if args.workers > 1 and args.verify_workers == 0:
+        parser.error('--workers only applies with --verify-workers (sequential mode has a single generation worker)')
+
     try:
         # Initialize processor
         processor = NewDesignsProcessor()
+        processor.speculative_candidates = args.speculative
 
         # Organize source images
         processor.organize_source_images()
 
         # Process all images
         logger.info("Starting full batch processing of new designs...")
-        success, failure = processor.batch_process_images()
+        success, failure = processor.batch_process_images(
+            max_workers=args.workers, verify_workers=args.verify_workers, retry_failed=args.retry_failed
+        )
 
         if success > 0:
             logger.info(f"Full batch processing completed: {success} images processed successfully.")
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Pin Image Fetcher
+Downloads Pinterest pin images for the prompt engineering notebook through one pooled
+async HTTP client with a bounded number of requests in flight. Bytes are kept in a
+local cache addressed by the sha256 of the URL, so re-running the notebook reads from
+disk instead of the network. Images are decoded and downscaled one at a time as the
+caller consumes them, so only the image being analysed is held in memory.
+"""
+
+import os
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+import httpx
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(os.getenv('PIN_IMAGE_CACHE_DIR', Path.home() / '.cache' / 'pin_images'))
+MAX_CONCURRENT_DOWNLOADS = 16
+MAX_IMAGE_SIDE = 1024
+DOWNLOAD_TIMEOUT = 30.0
+
+# Downloaded paths waiting to be decoded; bounds how far downloads run ahead of the consumer
+_READY_QUEUE_SIZE = 64
+_DONE = object()
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def load_downscaled(path, max_side: int = MAX_IMAGE_SIDE) -> Image.Image:
+    """Decode an image file as RGB with its longest side at most max_side."""
+    with Image.open(path) as img:
+        # Lets JPEG decode straight to a reduced size instead of full resolution
+        img.draft('RGB', (max_side, max_side))
+        img = img.convert('RGB')
+    img.thumbnail((max_side, max_side))
+    return img
+
+
+class PinImageFetcher:
+    """Pooled, cached, bounded-concurrency image downloads yielding downscaled PIL images."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_concurrent: int = MAX_CONCURRENT_DOWNLOADS,
+                 max_side: int = MAX_IMAGE_SIDE, timeout: float = DOWNLOAD_TIMEOUT):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_side = max_side
+        self.timeout = timeout
+
+        self.hits = 0
+        self.downloads = 0
+        self.failures = 0
+
+    def cache_path(self, url: str) -> Path:
+        key = url_key(url)
+        return self.cache_dir / key[:2] / key
+
+    async def _fetch(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str) -> Path:
+        """Cached file for url, downloading it first if needed."""
+        path = self.cache_path(url)
+        if path.exists():
+            self.hits += 1
+            return path
+
+        async with semaphore:
+            response = await client.get(url)
+            response.raise_for_status()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = path.with_name(f"{path.name}.{os.getpid()}.part")
+        partial_path.write_bytes(response.content)
+        os.replace(partial_path, path)
+        self.downloads += 1
+        return path
+
+    async def _fetch_all(self, items, ready: queue.Queue, stop: threading.Event) -> None:
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        limits = httpx.Limits(max_connections=self.max_concurrent, max_keepalive_connections=self.max_concurrent)
+
+        async with httpx.AsyncClient(limits=limits, timeout=self.timeout, follow_redirects=True) as client:
+            async def fetch_one(index, url):
+                try:
+                    result = await self._fetch(client, semaphore, url)
+                except (httpx.HTTPError, OSError) as e:
+                    self.failures += 1
+                    logger.warning(f"Error fetching image {index + 1} from {url}: {e}")
+                    return
+                # Blocking put would stall the event loop, so wait in a worker thread
+                await asyncio.to_thread(ready.put, (index, url, result))
+
+            pending = set()
+            for index, url in items:
+                if stop.is_set():
+                    break
+                pending.add(asyncio.ensure_future(fetch_one(index, url)))
+                # Keep the task set bounded so thousands of URLs do not all start at once
+                if len(pending) >= self.max_concurrent * 2:
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if pending:
+                await asyncio.wait(pending)
+
+    def iter_paths(self, items: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str, Path]]:
+        """Yield (index, url, cached path) for each (index, url) as its download finishes.
+
+        The event loop runs in a background thread, so this works inside notebooks that
+        already have a running loop. Failed downloads are logged and skipped.
+        """
+        ready: queue.Queue = queue.Queue(maxsize=_READY_QUEUE_SIZE)
+        stop = threading.Event()
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self._fetch_all(items, ready, stop))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                ready.put(_DONE)
+
+        thread = threading.Thread(target=run, name='pin-image-fetcher', daemon=True)
+        thread.start()
+        try:
+            while True:
+                entry = ready.get()
+                if entry is _DONE:
+                    break
+                yield entry
+        finally:
+            stop.set()
+            # Unblock the producer if the consumer stopped early
+            while thread.is_alive():
+                try:
+                    ready.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def iter_images(self, items: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, str, Image.Image]]:
+        """Yield (index, url, downscaled RGB image) for each (index, url), decoding lazily."""
+        for index, url, path in self.iter_paths(items):
+            try:
+                img = load_downscaled(path, self.max_side)
+            except (OSError, Image.DecompressionBombError) as e:
+                self.failures += 1
+                logger.warning(f"Error decoding image {index + 1} from {url}: {e}")
+                continue
+            yield index, url, img
+
+    def stats(self) -> dict:
+        return {'cache_hits': self.hits, 'downloads': self.downloads, 'failures': self.failures}
+
+
+def pin_image_urls(items, limit: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """(dataset index, original image URL) for the Apify pin records that have one."""
+    for index, item in enumerate(items):
+        if limit is not None and index >= limit:
+            break
+        url = item.get('images', {}).get('orig', {}).get('url')
+        if url:
+            yield index, url
@@ -13,10 +13,17 @@ from PIL import Image
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
+from structured_output import VERIFICATION_MODEL, NO_VERDICT_RESULT, StructuredOutputError, verify_candidate
+from image_precheck import ImagePrecheck
+from response_cache import get_response_cache, CLIENT_SDK
+from generate_verify_pipeline import GenerateVerifyPipeline, generate_first_passing, INTERRUPTED_RESULT
+from job_ledger import JobLedger, GracefulInterrupt
 import base64
 from io import BytesIO
-import time
 import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configure logging
 logging.basicConfig(
@@ -42,10 +49,15 @@ class ProductImageProcessor:
         # Create new SDK client
         self.client = genai.Client(api_key=self.api_key)
         self.model_id = "gemini-2.5-flash-image"
+        self.rate_limiter = get_rate_limiter(self.model_id)
+        # Verdicts come back as schema-constrained JSON from a text model
+        self.verification_rate_limiter = get_rate_limiter(VERIFICATION_MODEL)
+        self.response_cache = get_response_cache()
+        self.precheck = ImagePrecheck()
         
         logger.info("New SDK configuration complete:")
         logger.info(f"  - Model: {self.model_id}")
-        logger.info("  - Aspect ratio: 2:3 (832x1248 -> upscaled to 1664x2496)")
+        logger.info("  - Aspect ratio: 2:3 (832x1248, verified then upscaled to 1664x2496)")
         
         # Directory paths
         self.base_dir = Path('whatsapp-from-edward')
@@ -53,6 +65,15 @@ class ProductImageProcessor:
         self.processed_dir = self.base_dir / 'processed'
         self.failed_dir = self.base_dir / 'failed'
         
+        # Per-image batch state, so interrupted runs resume where they stopped
+        self.ledger = JobLedger(self.base_dir / 'job_ledger.sqlite')
+        
+        # Optimized limit based on log analysis - most successes occur within 7 attempts
+        self.max_attempts = 7
+        
+        # Candidates generated in parallel on the first attempt (1 = no speculation)
+        self.speculative_candidates = 1
+        
         # Load reference mannequin
         self.reference_mannequin_path = Path('ideal.jpg')
         if not self.reference_mannequin_path.exists():
@@ -275,9 +296,9 @@ CHECK IN THIS ORDER:
 - If the outfit is a top only, are matching bottoms present? (FAIL if missing bottoms)
 - Do design details look accurate? Check sleeve length, patterns, embroidery (FAIL if altered)
 
-Respond with:
-PASS: All requirements met
-FAIL: [specific missing requirements or issues found]"""
+Respond with JSON:
+- verdict: "PASS" (All requirements met) or "FAIL"
+- issues: [specific missing requirements or issues found] - empty when PASS"""
         
         logger.info("ProductImageProcessor initialized successfully")
 
@@ -344,32 +365,34 @@ FAIL: [specific missing requirements or issues found]"""
     
     def verify_generated_image(self, image_data):
         """Verify if generated image meets all requirements."""
+        # Cheap local checks first - plainly wrong candidates skip the remote round trip
+        precheck_passed, precheck_result = self.precheck.check(image_data)
+        if not precheck_passed:
+            return False, precheck_result
+        
         try:
             # Create PIL image for verification
             image = Image.open(BytesIO(image_data))
             
-            # Send to model for verification using new SDK
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=[self.verification_prompt, image]
+            # Unparseable replies are re-asked and the candidate re-verified before it counts
+            # (cache keyed on the encoded candidate bytes)
+            verification = verify_candidate(
+                VERIFICATION_MODEL,
+                [self.verification_prompt, {"mime_type": "image/jpeg", "data": image_data}],
+                lambda config: self.verification_rate_limiter.call(
+                    self.client.models.generate_content,
+                    model=VERIFICATION_MODEL,
+                    contents=[self.verification_prompt, image],
+                    config=config
+                ),
+                response_cache=self.response_cache, flavor=CLIENT_SDK
             )
+            logger.info(f"Verification result: {verification.result_text}")
+            return verification.passed, verification.result_text
             
-            if response and response.text:
-                verification_result = response.text.strip().upper()
-                logger.info(f"Verification result: {verification_result}")
-                
-                if verification_result.startswith("PASS:"):
-                    return True, "Verification passed"
-                elif verification_result.startswith("FAIL:"):
-                    return False, verification_result
-                else:
-                    # If unclear response, check for key indicators
-                    if "pass" in response.text.lower():
-                        return True, "Verification passed (inferred)"
-                    else:
-                        return False, f"Unclear verification: {response.text}"
-            
-            return False, "No verification response"
+        except StructuredOutputError as e:
+            logger.error(f"Verification gave no verdict: {e}")
+            return False, NO_VERDICT_RESULT
             
         except Exception as e:
             error_msg = str(e)
@@ -382,95 +405,156 @@ FAIL: [specific missing requirements or issues found]"""
             
             return False, f"Verification error: {error_msg}"
 
+    def build_prompt(self, attempt, last_verification_result):
+        """Build the generation prompt, adding retry feedback after the first attempt."""
+        # Use comprehensive processing prompt
+        base_prompt = self.processing_prompt
+        
+        if attempt == 1:
+            return base_prompt
+        
+        prompt = base_prompt + f"\n\nPREVIOUS ATTEMPT FAILED because: {last_verification_result}\n\nPLEASE FIX THESE SPECIFIC ISSUES:\n"
+        if "jewelry" in last_verification_result.lower():
+            prompt += "- Remove ALL jewelry from the clothing\n"
+        if "footwear" in last_verification_result.lower():
+            prompt += "- Remove ALL footwear from the clothing\n"
+        if "accessories" in last_verification_result.lower():
+            prompt += "- Remove ALL accessories from the clothing\n"
+        if "black" in last_verification_result.lower():
+            prompt += "- Ensure the reference mannequin remains completely black with rose gold head\n"
+        if "full body" in last_verification_result.lower():
+            prompt += "- Ensure full mannequin body is visible\n"
+        prompt += "\nThe reference mannequin is perfect - focus on the specific requirements for this processing type."
+        return prompt
+
+    def generate_candidate(self, image_path, prompt, variant=None):
+        """Send one generation request and return the native-resolution candidate bytes, or None.
+
+        Candidates are verified at the model's native 832x1248; only the accepted one is
+        upscaled, in save_processed_image.
+
+        variant distinguishes otherwise identical requests (attempt number, speculative
+        candidate, retry count from the ledger) in the response cache so re-runs replay
+        each one and --retry-failed makes new calls.
+        """
+        # Load original image as PIL Image
+        original_img = Image.open(image_path)
+        if original_img.mode != 'RGB':
+            original_img = original_img.convert('RGB')
+        
+        # Load reference mannequin as PIL Image
+        ref_mannequin_img = Image.open(BytesIO(self.reference_mannequin_data))
+        
+        # Configure 2:3 aspect ratio (832x1248 output from Gemini)
+        config = types.GenerateContentConfig(
+            image_config=types.ImageConfig(
+                aspect_ratio="2:3",
+            )
+        )
+        
+        # Send to model with new SDK
+        response = self.response_cache.generate_content(
+            self.model_id,
+            [prompt, self.reference_mannequin_data, image_path.read_bytes()],
+            lambda: self.rate_limiter.call(
+                self.client.models.generate_content,
+                model=self.model_id,
+                contents=[prompt, ref_mannequin_img, original_img],
+                config=config
+            ),
+            config=config,
+            variant=variant,
+            flavor=CLIENT_SDK
+        )
+        
+        # Process response
+        if response and response.parts:
+            for part in response.parts:
+                if part.inline_data is not None:
+                    # Get generated image data
+                    generated_image_data = part.inline_data.data
+                    if isinstance(generated_image_data, str):
+                        generated_image_data = base64.b64decode(generated_image_data)
+                    
+                    return generated_image_data
+        
+        return None
+
+    def save_processed_image(self, image_path, image_data):
+        """Upscale a verified candidate, write it to the processed directory and return its path."""
+        processed_filename = f"processed_{image_path.stem}.jpg"
+        processed_path = self.processed_dir / processed_filename
+        
+        # Upscale image to target dimensions (1664x2496)
+        logger.info(f"Upscaling verified image for {image_path.name}")
+        upscaled_image_data = self.upscale_image(image_data)
+        
+        with open(processed_path, 'wb') as f:
+            f.write(upscaled_image_data)
+        
+        return processed_path
+
     def process_single_image(self, image_path):
         """Process a single image using reference mannequin with enhanced feedback loop."""
-        max_attempts = 7  # Optimized limit based on log analysis - most successes occur within 7 attempts
+        max_attempts = self.max_attempts
         attempt = 0
         last_verification_result = ""
         
         while attempt < max_attempts:
             attempt += 1
             logger.info(f"Processing {image_path.name} - Attempt {attempt}")
+            self.ledger.start_attempt(image_path.name, attempt)
             
             try:
-                # Use comprehensive processing prompt
-                base_prompt = self.processing_prompt
-                
                 # Build enhanced prompt with feedback
-                if attempt == 1:
-                    prompt = base_prompt
-                else:
-                    prompt = base_prompt + f"\n\nPREVIOUS ATTEMPT FAILED because: {last_verification_result}\n\nPLEASE FIX THESE SPECIFIC ISSUES:\n"
-                    if "jewelry" in last_verification_result.lower():
-                        prompt += "- Remove ALL jewelry from the clothing\n"
-                    if "footwear" in last_verification_result.lower():
-                        prompt += "- Remove ALL footwear from the clothing\n"
-                    if "accessories" in last_verification_result.lower():
-                        prompt += "- Remove ALL accessories from the clothing\n"
-                    if "black" in last_verification_result.lower():
-                        prompt += "- Ensure the reference mannequin remains completely black with rose gold head\n"
-                    if "full body" in last_verification_result.lower():
-                        prompt += "- Ensure full mannequin body is visible\n"
-                    prompt += "\nThe reference mannequin is perfect - focus on the specific requirements for this processing type."
-                
-                # Load original image as PIL Image
-                original_img = Image.open(image_path)
-                if original_img.mode != 'RGB':
-                    original_img = original_img.convert('RGB')
+                prompt = self.build_prompt(attempt, last_verification_result)
                 
-                # Load reference mannequin as PIL Image
-                ref_mannequin_img = Image.open(BytesIO(self.reference_mannequin_data))
-                
-                # Configure 2:3 aspect ratio (832x1248 output from Gemini)
-                config = types.GenerateContentConfig(
-                    image_config=types.ImageConfig(
-                        aspect_ratio="2:3",
+                if attempt == 1 and self.speculative_candidates > 1:
+                    # Race several candidates; the retry-with-feedback loop only starts if all fail
+                    logger.info(f"Speculative mode: generating {self.speculative_candidates} candidates for {image_path.name}")
+                    generated_image_data, verification_result = generate_first_passing(
+                        lambda index: self.generate_candidate(
+                            image_path, prompt, variant=self.ledger.cache_variant(image_path.name, f"1.{index}")
+                        ),
+                        self.verify_generated_image,
+                        self.speculative_candidates
                     )
-                )
+                    last_verification_result = verification_result
+                    self.ledger.record_verification(image_path.name, verification_result)
+                    
+                    if generated_image_data is not None:
+                        processed_path = self.save_processed_image(image_path, generated_image_data)
+                        logger.info(f"Successfully processed and verified {image_path.name}")
+                        return True, processed_path
+                    
+                    logger.warning(f"All {self.speculative_candidates} candidates failed for {image_path.name}: {verification_result}")
+                    continue
                 
-                # Send to model with new SDK
-                response = self.client.models.generate_content(
-                    model=self.model_id,
-                    contents=[prompt, ref_mannequin_img, original_img],
-                    config=config
+                generated_image_data = self.generate_candidate(
+                    image_path, prompt, variant=self.ledger.cache_variant(image_path.name, attempt)
                 )
                 
-                # Process response
-                if response and response.parts:
-                    for part in response.parts:
-                        if part.inline_data is not None:
-                            # Get generated image data
-                            generated_image_data = part.inline_data.data
-                            if isinstance(generated_image_data, str):
-                                generated_image_data = base64.b64decode(generated_image_data)
-                            
-                            # Upscale image to target dimensions (1664x2496)
-                            logger.info(f"Upscaling generated image for {image_path.name}")
-                            generated_image_data = self.upscale_image(generated_image_data)
-                            
-                            # Verify the generated image
-                            logger.info(f"Verifying generated image for {image_path.name}")
-                            verification_passed, verification_result = self.verify_generated_image(generated_image_data)
-                            last_verification_result = verification_result
-                            
-                            if verification_passed:
-                                # Save verified image
-                                processed_filename = f"processed_{image_path.stem}.jpg"
-                                processed_path = self.processed_dir / processed_filename
-                                
-                                with open(processed_path, 'wb') as f:
-                                    f.write(generated_image_data)
-                                
-                                logger.info(f"Successfully processed and verified {image_path.name}")
-                                return True, processed_path
-                            else:
-                                logger.warning(f"Verification failed for {image_path.name}: {verification_result}")
-                                if attempt < max_attempts:
-                                    logger.info(f"Will retry with specific feedback...")
-                                    continue
-                                else:
-                                    logger.error(f"Max attempts reached for {image_path.name}")
-                                    return False, f"Failed verification after {max_attempts} attempts: {verification_result}"
+                if generated_image_data is not None:
+                    # Verify the generated image
+                    logger.info(f"Verifying generated image for {image_path.name}")
+                    verification_passed, verification_result = self.verify_generated_image(generated_image_data)
+                    last_verification_result = verification_result
+                    self.ledger.record_verification(image_path.name, verification_result)
+                    
+                    if verification_passed:
+                        # Save verified image
+                        processed_path = self.save_processed_image(image_path, generated_image_data)
+                        
+                        logger.info(f"Successfully processed and verified {image_path.name}")
+                        return True, processed_path
+                    else:
+                        logger.warning(f"Verification failed for {image_path.name}: {verification_result}")
+                        if attempt < max_attempts:
+                            logger.info(f"Will retry with specific feedback...")
+                            continue
+                        else:
+                            logger.error(f"Max attempts reached for {image_path.name}")
+                            return False, f"Failed verification after {max_attempts} attempts: {verification_result}"
                 
                 logger.warning(f"No image generated for {image_path.name} - attempt {attempt}")
                 if attempt < max_attempts:
@@ -487,8 +571,114 @@ FAIL: [specific missing requirements or issues found]"""
         
         return False, "Max processing attempts reached"
 
-    def batch_process_images(self, max_images=None, sample_mode=False):
-        """Process all images in the original directory."""
+    def _record_result(self, image_path, success, result):
+        """Record the outcome in the job ledger, copy failed images to the failed directory and log it."""
+        self.ledger.mark_finished(image_path.name, success, result)
+        if not success:
+            # Move failed images to failed directory
+            failed_path = self.failed_dir / image_path.name
+            shutil.copy2(str(image_path), str(failed_path))
+            logger.warning(f"Failed to process {image_path.name}: {result}")
+
+    def _process_images_concurrently(self, images_to_process, max_workers, interrupt):
+        """Run process_single_image over the images with up to max_workers in flight.
+
+        Each worker owns one image for its whole generate/verify retry loop, so
+        per-image results and the failed/ copy are identical to the serial path.
+        Once an interrupt is requested, images that have not started are skipped.
+        """
+        success_count = 0
+        failure_count = 0
+        total = len(images_to_process)
+
+        logger.info(f"Concurrent mode: {max_workers} images in flight")
+
+        def process_unless_interrupted(image_path):
+            if interrupt.requested:
+                return None, INTERRUPTED_RESULT
+            return self.process_single_image(image_path)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(process_unless_interrupted, image_path): image_path
+                for image_path in images_to_process
+            }
+
+            for i, future in enumerate(as_completed(futures), 1):
+                image_path = futures[future]
+                try:
+                    success, result = future.result()
+                except Exception as e:
+                    success, result = False, f"Unhandled worker error: {e}"
+
+                if success is None:
+                    continue
+
+                if success:
+                    success_count += 1
+                else:
+                    failure_count += 1
+                self._record_result(image_path, success, result)
+
+                logger.info(f"Completed image {i}/{total}: {image_path.name} ({'success' if success else 'failed'})")
+
+        return success_count, failure_count
+
+    def _pipeline_generate(self, job):
+        self.ledger.start_attempt(job.image_path.name, job.attempt)
+        prompt = self.build_prompt(job.attempt, job.last_result)
+        return self.generate_candidate(
+            job.image_path, prompt, variant=self.ledger.cache_variant(job.image_path.name, job.attempt)
+        )
+
+    def _pipeline_verify(self, job, candidate):
+        verification_passed, verification_result = self.verify_generated_image(candidate)
+        self.ledger.record_verification(job.image_path.name, verification_result)
+        return verification_passed, verification_result
+
+    def _process_images_pipelined(self, images_to_process, max_workers, verify_workers, interrupt):
+        """Run generation and verification as separate worker pools.
+
+        Verification of one image overlaps with generation of the next; failed
+        candidates go back to the generators with their verification feedback.
+        """
+        counts = {'success': 0, 'failure': 0}
+        
+        def on_result(image_path, success, result):
+            if success is None:
+                return
+            counts['success' if success else 'failure'] += 1
+            self._record_result(image_path, success, result)
+            logger.info(f"Completed image {counts['success'] + counts['failure']}/{len(images_to_process)}: {image_path.name} ({'success' if success else 'failed'})")
+        
+        pipeline = GenerateVerifyPipeline(
+            generate_fn=self._pipeline_generate,
+            verify_fn=self._pipeline_verify,
+            save_fn=lambda job, candidate: self.save_processed_image(job.image_path, candidate),
+            max_attempts=self.max_attempts,
+            generate_workers=max_workers,
+            verify_workers=verify_workers,
+            should_stop=lambda: interrupt.requested
+        )
+        pipeline.run(images_to_process, on_result=on_result)
+        
+        return counts['success'], counts['failure']
+
+    def batch_process_images(self, max_images=None, sample_mode=False, max_workers=1, verify_workers=0,
+                             retry_failed=False):
+        """Process all images in the original directory.
+
+        Images already finished in the job ledger are skipped, so an interrupted run
+        resumes where it stopped. Ctrl-C stops picking up new images; a second Ctrl-C aborts.
+
+        Args:
+            max_images: Number of images to process in sample mode
+            sample_mode: Only process the first max_images images
+            max_workers: Number of images processed concurrently (1 = serial)
+            verify_workers: Size of a separate verification pool; when set, generation
+                and verification run as a pipeline with max_workers generators
+            retry_failed: Also reprocess images the ledger records as failed
+        """
         logger.info("Starting batch processing...")
         
         # Get list of images to process
@@ -503,27 +693,36 @@ FAIL: [specific missing requirements or issues found]"""
             images_to_process = images_to_process[:max_images]
             logger.info(f"Sample mode: processing {len(images_to_process)} images")
         
-        success_count = 0
-        failure_count = 0
+        images_to_process = self.ledger.filter_unfinished(images_to_process, retry_failed)
         
-        for i, image_path in enumerate(images_to_process, 1):
-            logger.info(f"Processing image {i}/{len(images_to_process)}: {image_path.name}")
-            
-            success, result = self.process_single_image(image_path)
-            
-            if success:
-                success_count += 1
+        if verify_workers > 0 and self.speculative_candidates > 1:
+            logger.warning(f"Speculative candidates ({self.speculative_candidates}) are not used by the "
+                           f"pipelined mode - generating one candidate per attempt")
+        
+        with GracefulInterrupt() as interrupt:
+            if verify_workers > 0:
+                success_count, failure_count = self._process_images_pipelined(images_to_process, max_workers, verify_workers, interrupt)
+            elif max_workers > 1:
+                success_count, failure_count = self._process_images_concurrently(images_to_process, max_workers, interrupt)
             else:
-                failure_count += 1
-                # Move failed images to failed directory
-                failed_path = self.failed_dir / image_path.name
-                shutil.copy2(str(image_path), str(failed_path))
-                logger.warning(f"Failed to process {image_path.name}: {result}")
-            
-            # Rate limiting - avoid API quota issues
-            if i < len(images_to_process):
-                time.sleep(1)
+                success_count = 0
+                failure_count = 0
+                
+                for i, image_path in enumerate(images_to_process, 1):
+                    if interrupt.requested:
+                        break
+                    logger.info(f"Processing image {i}/{len(images_to_process)}: {image_path.name}")
+                    
+                    success, result = self.process_single_image(image_path)
+                    
+                    if success:
+                        success_count += 1
+                    else:
+                        failure_count += 1
+                    self._record_result(image_path, success, result)
         
+        if interrupt.requested:
+            logger.warning(f"Batch interrupted - rerun to resume, ledger: {self.ledger.summary()}")
         logger.info(f"Batch processing complete: {success_count} successful, {failure_count} failed")
         return success_count, failure_count
 
@@ -540,21 +739,46 @@ FAIL: [specific missing requirements or issues found]"""
         logger.info(f"Original images: {report['original_images']}")
         logger.info(f"Processed images: {report['processed_images']}")
         logger.info(f"Failed images: {report['failed_images']}")
+        self.response_cache.log_stats()
         
         return report
 
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description='Standardize product images onto the reference mannequin')
+    parser.add_argument('--workers', '-w',
+                       type=int,
+                       default=1,
+                       help='Number of images processed concurrently (default: 1)')
+    parser.add_argument('--verify-workers', '-v',
+                       type=int,
+                       default=0,
+                       help='Run verification in a separate pool of this size, pipelined with generation (default: off)')
+    parser.add_argument('--speculative', '-k',
+                       type=int,
+                       default=1,
+                       help='Generate K first-attempt candidates in parallel and keep the first that passes (default: 1)')
+    parser.add_argument('--retry-failed',
+                       action='store_true',
+                       help='Reprocess images the job ledger records as failed (finished images are skipped by default)')
+    
+    args = parser.parse_args()
+    if args.speculative > 1 and args.verify_workers > 0:
+        parser.error('--speculative cannot be combined with --verify-workers (the pipeline generates one candidate per attempt)')
+    
     try:
         # Initialize processor
         processor = ProductImageProcessor()
+        processor.speculative_candidates = args.speculative
         
         # Organize source images
         processor.organize_source_images()
         
         # Process all remaining images (excluding the 5 already processed)
         logger.info("Starting full batch processing of remaining images...")
-        success, failure = processor.batch_process_images()
+        success, failure = processor.batch_process_images(
+            max_workers=args.workers, verify_workers=args.verify_workers, retry_failed=args.retry_failed
+        )
         
         if success > 0:
             logger.info(f"Full batch processing completed: {success} images processed successfully.")
@@ -233,34 +233,21 @@ except Exception as e:
 Load the images from the URLs in the dataset (limited to a manageable number for evaluation).
 
 **Reasoning**:
-Iterate through the first 50 items in the data list, fetch each image using its URL, and store the loaded images in a list.
+Download the images of the first `MAX_PINS` items concurrently through `PinImageFetcher`, which keeps a disk cache keyed by URL (re-runs read from disk) and yields downscaled images lazily, so only the image being analysed is held in memory.
 """
 
-from PIL import Image
-import requests
-from io import BytesIO
+from pin_image_fetcher import PinImageFetcher, pin_image_urls
 
-# List to store the loaded images
-images = []
+# Number of pins to analyse; images are streamed, so this can go into the thousands
+MAX_PINS = 50
 
-# Iterate through the dataset items and limit to the first 50
-for i, item in enumerate(data[:50]):
-    # Check if the item has image information and a URL
-    if 'images' in item and 'orig' in item['images'] and 'url' in item['images']['orig']:
-        image_url = item['images']['orig']['url']
-        try:
-            # Fetch the image from the URL
-            response = requests.get(image_url)
-            response.raise_for_status() # Raise an exception for bad status codes
-            img = Image.open(BytesIO(response.content))
-            images.append(img)
-            print(f"Successfully loaded image {i+1}/50 from {image_url}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching image {i+1}/50 from {image_url}: {e}")
-        except Exception as e:
-            print(f"Error processing image {i+1}/50 from {image_url}: {e}")
+pin_fetcher = PinImageFetcher(max_concurrent=16, max_side=1024)
+pin_urls = list(pin_image_urls(data, limit=MAX_PINS))
 
-print(f"\nLoaded {len(images)} images.")
+# Generator of (dataset index, image URL, PIL image); downloads run ahead while images are analysed
+images = pin_fetcher.iter_images(pin_urls)
+
+print(f"Streaming {len(pin_urls)} images (cache: {pin_fetcher.cache_dir}).")
 
 """## Perform Initial Image Analysis
 
@@ -268,23 +255,71 @@ print(f"\nLoaded {len(images)} images.")
 Run the Gemini model with the refined prompt on the loaded images to get detailed analysis for all fields, including `tags`, but *excluding* `prompt_suggestion` in this initial step.
 
 **Reasoning**:
-Initialize an empty list to store the analysis results, iterate through the loaded images (up to 50), call the Gemini model with the refined prompt and the image, store the results in a dictionary, append to the list, print the URL and analysis, and include error handling.
+Initialize an empty list to store the analysis results, iterate through the streamed images, call the Gemini model with the refined prompt and the image, store the results in a dictionary, append to the list, print the URL and analysis, and include error handling.
+
+With `SINGLE_PASS` enabled, one call per image returns the structured analysis (all sections plus `tags`) together with the `prompt_suggestion` as schema-constrained JSON. Each result is appended to `ANALYSIS_JSONL` instead of being printed, pins already in that file are not analysed again, and the prompt suggestion step below reuses the stored suggestions instead of making a second call.
+"""
+
+import json
+from structured_output import PIN_ANALYSIS_SCHEMA, PinAnalysis, request_structured
+
+SINGLE_PASS = True
+ANALYSIS_JSONL = 'pin_analysis.jsonl'
+
+single_pass_prompt = refined_prompt.split("Please provide the output")[0] + """
+Also write prompt_suggestion: a single, high-quality, ready-to-use text prompt for a generative image model that captures the essence of your analysis (specific visual details, model poses, expression, camera, mood, unique styling elements, composition, lighting and overall aesthetic), descriptive enough to recreate an image visually similar in style and content. Give only the prompt text, with no introductory or concluding phrases.
+
+Respond with JSON matching the schema: one object per section with the fields above (snake_case names, 'fabric/material' as fabric_material), plus top-level tags and prompt_suggestion.
 """
 
+# Results from earlier runs, keyed by image URL
+stored_analyses = {}
+if SINGLE_PASS and os.path.exists(ANALYSIS_JSONL):
+    with open(ANALYSIS_JSONL) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partial line from an interrupted run
+            stored_analyses[record['image_url']] = record
+    print(f"Loaded {len(stored_analyses)} stored analyses from {ANALYSIS_JSONL}")
+
 # List to store the extracted information for each image
 extracted_info_list = []
+analysis_file = open(ANALYSIS_JSONL, 'a') if SINGLE_PASS else None
 
-# Iterate through the loaded images (up to 50) and send them to Gemini for analysis
-for i, img in enumerate(images): # images list is already limited to 50
-    print(f"Analyzing image {i+1}/{len(images)}...")
+# Iterate through the streamed images and send them to Gemini for analysis
+for i, image_url, img in images:
+    print(f"Analyzing image {i+1}/{len(pin_urls)}...")
     try:
+        if SINGLE_PASS:
+            record = stored_analyses.get(image_url)
+            if record is None:
+                analysis = request_structured(
+                    'gemini-2.5-flash', [single_pass_prompt, img],
+                    lambda config: gemini_model.generate_content([single_pass_prompt, img], generation_config=config),
+                    PinAnalysis.from_json, PIN_ANALYSIS_SCHEMA
+                )
+                record = dict(image_index=i, image_url=image_url, **analysis.to_json())
+                analysis_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                analysis_file.flush()
+
+            extracted_info_list.append({
+                "image_index": i,
+                "image_url": image_url,
+                "analysis": record,
+                "prompt_suggestion": record['prompt_suggestion']
+            })
+            print(f"Image {i+1}: {', '.join(record['tags'][:8])}")
+            continue
+
         # Send the image and refined prompt to the Gemini model
         response = gemini_model.generate_content([refined_prompt, img])
 
         # Store the extracted information
         extracted_info = {
             "image_index": i,
-            "image_url": data[i]['images']['orig']['url'] if i < len(data) and 'images' in data[i] and 'orig' in data[i]['images'] and 'url' in data[i]['images']['orig'] else "N/A",
+            "image_url": image_url,
             "analysis": response.text
         }
         extracted_info_list.append(extracted_info)
@@ -302,7 +337,7 @@ for i, img in enumerate(images): # images list is already limited to 50
         # Store an error message if analysis fails
         extracted_info = {
             "image_index": i,
-             "image_url": data[i]['images']['orig']['url'] if i < len(data) and 'images' in data[i] and 'orig' in data[i]['images'] and 'url' in data[i]['images']['orig'] else "N/A",
+            "image_url": image_url,
             "analysis": f"Error analyzing image: {e}"
         }
         extracted_info_list.append(extracted_info)
@@ -311,7 +346,11 @@ for i, img in enumerate(images): # images list is already limited to 50
         print(f"Error: {e}")
         print("-" * 30)
 
-print("\nImage analysis complete.")
+if analysis_file:
+    analysis_file.close()
+    print(f"Analyses saved to {ANALYSIS_JSONL}")
+
+print(f"\nImage analysis complete. Fetch stats: {pin_fetcher.stats()}")
 
 """## Generate Prompt Suggestions
 
@@ -319,7 +358,7 @@ print("\nImage analysis complete.")
 Take the detailed analysis text generated in the initial analysis step and use Gemini with a *new* prompt to synthesize a high-quality, ready-to-use generative `prompt_suggestion` and `tags` based on the full analysis.
 
 **Reasoning**:
-Iterate through the detailed analysis results and use the Gemini model with a new prompt to generate the `prompt_suggestion` for each analysis.
+Iterate through the detailed analysis results and use the Gemini model with a new prompt to generate the `prompt_suggestion` for each analysis. Analyses from the single-pass mode already carry their `prompt_suggestion` and are not sent again.
 """
 
 # Define the prompt for generating prompt suggestions from analysis text
@@ -343,7 +382,14 @@ for i, analysis_item in enumerate(extracted_info_list):
     analysis_text = analysis_item.get('analysis', '')
     image_index = analysis_item.get('image_index', -1)
 
-    if analysis_text and analysis_text != f"Error analyzing image: {analysis_item.get('error', 'Unknown error')}": # Only process if analysis was successful
+    if analysis_item.get('prompt_suggestion'):
+        # Single-pass analysis already produced it
+        generated_prompt_suggestions.append({
+            "image_index": image_index,
+            "original_image_url": analysis_item.get('image_url', 'N/A'),
+            "generated_prompt_suggestion": analysis_item['prompt_suggestion']
+        })
+    elif analysis_text and not analysis_text.startswith("Error analyzing image"): # Only process if analysis was successful
         print(f"Generating prompt suggestion for Image {image_index + 1}...")
         try:
             # Format the prompt with the analysis text
@@ -488,6 +534,7 @@ Iterate through the list of generated images, display each image, and print the
 
 from IPython.display import display, HTML
 from PIL import Image
+from io import BytesIO
 
 print(f"Displaying {len(generated_images)} generated images:")
 
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Shared Gemini Rate Limiter
+Token-bucket requests-per-minute budget plus a concurrent-request budget per model,
+shared between every script and process on this machine through a locked state file.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows - fall back to in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Default budgets per model: (requests per minute, max concurrent requests)
+DEFAULT_LIMITS = {
+    'gemini-2.5-flash-image': (60, 8),
+    'gemini-2.5-flash-image-preview': (60, 8),
+    'gemini-2.5-pro': (30, 4),
+    'veo-3.0-generate-001': (10, 2),
+}
+FALLBACK_LIMITS = (30, 4)
+
+# In-flight slots older than this are assumed to belong to a crashed process
+LEASE_TIMEOUT_SECONDS = 600
+
+
+def _normalize_model_name(model: str) -> str:
+    """Strip the 'models/' prefix so both SDK styles share one budget."""
+    return model.split('/', 1)[1] if model.startswith('models/') else model
+
+
+def _env_key(model: str) -> str:
+    return ''.join(c if c.isalnum() else '_' for c in model).upper()
+
+
+class GeminiRateLimiter:
+    """Cross-process token bucket and concurrency limiter for one model."""
+
+    def __init__(self, model: str, requests_per_minute: Optional[int] = None,
+                 max_concurrent: Optional[int] = None, state_dir: Optional[str] = None):
+        self.model = _normalize_model_name(model)
+
+        default_rpm, default_concurrent = DEFAULT_LIMITS.get(self.model, FALLBACK_LIMITS)
+        key = _env_key(self.model)
+        self.requests_per_minute = requests_per_minute or int(os.getenv(f'GEMINI_RPM_{key}', default_rpm))
+        self.max_concurrent = max_concurrent or int(os.getenv(f'GEMINI_MAX_CONCURRENT_{key}', default_concurrent))
+
+        # Bucket holds at most one concurrency window worth of tokens to avoid bursts
+        self.capacity = max(1, min(self.requests_per_minute, self.max_concurrent))
+        self.refill_per_second = self.requests_per_minute / 60.0
+
+        self.state_dir = Path(state_dir or os.getenv('GEMINI_RATE_LIMIT_DIR', Path.home() / '.gemini_rate_limits'))
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.state_file = self.state_dir / f"{key.lower()}.json"
+        self.lock_file = self.state_dir / f"{key.lower()}.lock"
+
+        self._thread_lock = threading.Lock()
+
+        if fcntl is None:
+            logger.warning("fcntl unavailable - rate limits are only shared within this process")
+
+    @contextmanager
+    def _locked_state(self):
+        """Yield the shared state dict while holding the cross-process lock."""
+        with self._thread_lock:
+            with open(self.lock_file, 'a') as lock_handle:
+                if fcntl is not None:
+                    fcntl.flock(lock_handle, fcntl.LOCK_EX)
+                try:
+                    state = self._read_state()
+                    yield state
+                    self._write_state(state)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_handle, fcntl.LOCK_UN)
+
+    def _read_state(self) -> Dict:
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+
+        state.setdefault('tokens', float(self.capacity))
+        state.setdefault('updated_at', time.time())
+        state.setdefault('in_flight', {})
+        return state
+
+    def _write_state(self, state: Dict) -> None:
+        tmp_file = self.state_file.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_file)
+
+    def _try_acquire(self, lease_id: str) -> float:
+        """Attempt to take a token and a slot; return 0 on success or seconds to wait."""
+        with self._locked_state() as state:
+            now = time.time()
+
+            # Refill the bucket
+            elapsed = max(0.0, now - state['updated_at'])
+            state['tokens'] = min(float(self.capacity), state['tokens'] + elapsed * self.refill_per_second)
+            state['updated_at'] = now
+
+            # Drop slots leaked by crashed processes
+            state['in_flight'] = {
+                lid: started for lid, started in state['in_flight'].items()
+                if now - started < LEASE_TIMEOUT_SECONDS
+            }
+
+            if len(state['in_flight']) >= self.max_concurrent:
+                return 0.25
+
+            if state['tokens'] < 1.0:
+                return (1.0 - state['tokens']) / self.refill_per_second
+
+            state['tokens'] -= 1.0
+            state['in_flight'][lease_id] = now
+            return 0.0
+
+    def acquire(self) -> str:
+        """Block until a request may be sent; return the lease id to release."""
+        lease_id = f"{os.getpid()}-{uuid.uuid4().hex}"
+        waited = 0.0
+
+        while True:
+            wait_seconds = self._try_acquire(lease_id)
+            if wait_seconds <= 0:
+                if waited >= 1.0:
+                    logger.debug(f"Rate limiter waited {waited:.1f}s for {self.model}")
+                return lease_id
+
+            wait_seconds = min(wait_seconds, 5.0)
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+    def release(self, lease_id: str) -> None:
+        """Return a concurrency slot taken by acquire()."""
+        with self._locked_state() as state:
+            state['in_flight'].pop(lease_id, None)
+
+    @contextmanager
+    def slot(self):
+        """Context manager wrapping a single API request."""
+        lease_id = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(lease_id)
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) inside a rate-limited slot."""
+        with self.slot():
+            return fn(*args, **kwargs)
+
+
+_limiters: Dict[str, GeminiRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str) -> GeminiRateLimiter:
+    """Get the process-wide limiter for a model, creating it on first use."""
+    model = _normalize_model_name(model)
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = GeminiRateLimiter(model)
+        return _limiters[model]
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Gemini Response Cache
+Content-addressed on-disk cache for generate_content calls. Entries are keyed by a hash
+of the model id, prompt text, input image bytes and generation config, store the
+response parts (text and image bytes), and are evicted least-recently-used once the
+cache grows past its size budget. Works with both google.genai.Client and
+google.generativeai.GenerativeModel responses.
+"""
+
+import os
+import json
+import shutil
+import base64
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SDK flavours a cached response is rebuilt for
+LEGACY_SDK = 'google.generativeai'
+CLIENT_SDK = 'google.genai'
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+
+# Eviction trims the cache to this fraction of max_bytes, so a full cache is not rescanned on every put
+EVICT_TARGET_RATIO = 0.9
+# The size estimate is refreshed from disk this often, to account for entries written by other processes
+RESCAN_EVERY_PUTS = 256
+
+
+class _CachedBlob:
+    """Stand-in for inline_data on a cached part."""
+
+    def __init__(self, mime_type: str, data: bytes):
+        self.mime_type = mime_type
+        self.data = data
+
+
+class _CachedPart:
+    """Stand-in for a response part rebuilt from the cache."""
+
+    def __init__(self, text: Optional[str] = None, inline_data: Optional[_CachedBlob] = None):
+        self.text = text
+        self.inline_data = inline_data
+
+
+class _CachedContent:
+    def __init__(self, parts: List[_CachedPart]):
+        self.parts = parts
+
+
+class _CachedCandidate:
+    def __init__(self, parts: List[_CachedPart]):
+        self.content = _CachedContent(parts)
+
+
+class CachedResponse:
+    """Response rebuilt from the cache, exposing the attributes the scripts read.
+
+    Both response.parts and response.candidates[0].content.parts are available.
+    For the legacy SDK, text parts carry an empty inline_data blob (matching the
+    proto behaviour callers rely on); for the client SDK they carry None.
+    """
+
+    def __init__(self, parts: List[Dict[str, Any]], flavor: str):
+        self.parts = []
+        for part in parts:
+            if part['type'] == 'inline_data':
+                self.parts.append(_CachedPart(inline_data=_CachedBlob(part['mime_type'], part['data'])))
+            else:
+                empty_blob = _CachedBlob('', b'') if flavor == LEGACY_SDK else None
+                self.parts.append(_CachedPart(text=part['text'], inline_data=empty_blob))
+        self.candidates = [_CachedCandidate(self.parts)]
+        self.from_cache = True
+
+    @property
+    def text(self) -> str:
+        return ''.join(part.text for part in self.parts if part.text)
+
+
+def _extract_parts(response) -> List[Dict[str, Any]]:
+    """Pull text and inline image parts out of a live SDK response."""
+    parts = None
+    try:
+        if response.candidates and response.candidates[0].content.parts:
+            parts = response.candidates[0].content.parts
+    except (AttributeError, IndexError, TypeError):
+        parts = getattr(response, 'parts', None)
+
+    extracted = []
+    for part in parts or []:
+        inline_data = getattr(part, 'inline_data', None)
+        data = getattr(inline_data, 'data', None) if inline_data is not None else None
+        if data:
+            if isinstance(data, str):
+                data = base64.b64decode(data)
+            extracted.append({'type': 'inline_data', 'mime_type': inline_data.mime_type, 'data': data})
+            continue
+
+        text = getattr(part, 'text', None)
+        if text:
+            extracted.append({'type': 'text', 'text': text})
+    return extracted
+
+
+def _hash_content(hasher, item) -> None:
+    """Feed one generate_content input into the hasher."""
+    if isinstance(item, str):
+        hasher.update(b'str:' + item.encode('utf-8'))
+    elif isinstance(item, (bytes, bytearray)):
+        hasher.update(b'bytes:' + bytes(item))
+    elif isinstance(item, dict):
+        data = item.get('data')
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        hasher.update(f"blob:{item.get('mime_type', '')}:".encode('utf-8'))
+        hasher.update(data or b'')
+    elif isinstance(item, (list, tuple)):
+        for sub_item in item:
+            _hash_content(hasher, sub_item)
+    elif hasattr(item, 'tobytes') and hasattr(item, 'size') and hasattr(item, 'mode'):
+        # PIL image
+        hasher.update(f"image:{item.mode}:{item.size}:".encode('utf-8'))
+        hasher.update(item.tobytes())
+    else:
+        hasher.update(b'repr:' + repr(item).encode('utf-8'))
+
+
+def _serialize_config(config) -> str:
+    if config is None:
+        return ''
+    if hasattr(config, 'model_dump_json'):
+        return config.model_dump_json(exclude_none=True)
+    if isinstance(config, dict):
+        return json.dumps(config, sort_keys=True, default=str)
+    return repr(config)
+
+
+class ResponseCache:
+    """On-disk LRU cache of generate_content responses."""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None,
+                 enabled: Optional[bool] = None):
+        self.cache_dir = Path(cache_dir or os.getenv('GEMINI_RESPONSE_CACHE_DIR', '.gemini_response_cache'))
+        self.max_bytes = max_bytes or int(os.getenv('GEMINI_RESPONSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        if enabled is None:
+            enabled = os.getenv('GEMINI_RESPONSE_CACHE', 'on').lower() not in ('0', 'off', 'false', 'no')
+        self.enabled = enabled
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # Running estimate of the cache size; None until the first put scans the directory
+        self._total_bytes: Optional[int] = None
+        self._puts_since_scan = 0
+        self._evict_lock = threading.Lock()
+
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def make_key(self, model: str, contents, config=None, variant=None) -> str:
+        """Hash (model id, prompt text, input image bytes, generation config, variant)."""
+        hasher = hashlib.sha256()
+        model = model.split('/', 1)[1] if model.startswith('models/') else model
+        hasher.update(f"model:{model}\n".encode('utf-8'))
+        _hash_content(hasher, contents)
+        hasher.update(f"\nconfig:{_serialize_config(config)}".encode('utf-8'))
+        if variant is not None:
+            hasher.update(f"\nvariant:{variant}".encode('utf-8'))
+        return hasher.hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def get(self, key: str, flavor: str = LEGACY_SDK) -> Optional[CachedResponse]:
+        entry_dir = self._entry_dir(key)
+        meta_file = entry_dir / 'meta.json'
+        try:
+            with open(meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            parts = []
+            for part in meta['parts']:
+                if part['type'] == 'inline_data':
+                    with open(entry_dir / part['file'], 'rb') as f:
+                        part = dict(part, data=f.read())
+                parts.append(part)
+
+            # Touch for LRU ordering
+            os.utime(meta_file, None)
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+        return CachedResponse(parts, flavor)
+
+    def put(self, key: str, response) -> None:
+        parts = _extract_parts(response)
+        if not parts:
+            return
+
+        entry_dir = self._entry_dir(key)
+        tmp_dir = entry_dir.with_name(f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        meta_parts = []
+        for index, part in enumerate(parts):
+            if part['type'] == 'inline_data':
+                file_name = f"part_{index}.bin"
+                with open(tmp_dir / file_name, 'wb') as f:
+                    f.write(part['data'])
+                meta_parts.append({'type': 'inline_data', 'mime_type': part['mime_type'], 'file': file_name})
+            else:
+                meta_parts.append(part)
+
+        with open(tmp_dir / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump({'parts': meta_parts}, f)
+        entry_bytes = sum(file_entry.stat().st_size for file_entry in os.scandir(tmp_dir))
+
+        try:
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Another worker stored the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            entry_bytes = 0
+
+        self._account(entry_bytes)
+
+    def _account(self, entry_bytes: int) -> None:
+        """Add a stored entry to the size estimate; scan and evict only when it is over budget."""
+        with self._lock:
+            self._puts_since_scan += 1
+            if self._total_bytes is not None and self._puts_since_scan < RESCAN_EVERY_PUTS:
+                self._total_bytes += entry_bytes
+                if self._total_bytes <= self.max_bytes:
+                    return
+
+        # One thread scans at a time; the others keep going on the estimate
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            total_bytes = self._evict_if_needed()
+            with self._lock:
+                self._total_bytes = total_bytes
+                self._puts_since_scan = 0
+        finally:
+            self._evict_lock.release()
+
+    def _evict_if_needed(self) -> int:
+        """Scan the cache and delete least-recently-used entries if it exceeds max_bytes.
+
+        Trims to EVICT_TARGET_RATIO of max_bytes and returns the resulting size.
+        """
+        entries = []
+        total_bytes = 0
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_dir() or entry.name.endswith('.tmp'):
+                    continue
+                size = 0
+                last_used = 0.0
+                for file_entry in os.scandir(entry.path):
+                    stat = file_entry.stat()
+                    size += stat.st_size
+                    if file_entry.name == 'meta.json':
+                        last_used = stat.st_mtime
+                entries.append((last_used, size, entry.path))
+                total_bytes += size
+
+        if total_bytes <= self.max_bytes:
+            return total_bytes
+
+        target_bytes = int(self.max_bytes * EVICT_TARGET_RATIO)
+        entries.sort()
+        for _, size, path in entries:
+            shutil.rmtree(path, ignore_errors=True)
+            total_bytes -= size
+            if total_bytes <= target_bytes:
+                break
+        return total_bytes
+
+    def generate_content(self, model: str, contents, generate: Callable[[], Any],
+                         config=None, variant=None, flavor: str = LEGACY_SDK):
+        """Return a cached response for these inputs, or call generate() and cache its result.
+
+        Args:
+            model: Model id the request is sent to
+            contents: The generate_content inputs (prompt text, images, blobs)
+            generate: Zero-argument callable performing the real API request
+            config: Generation config, part of the cache key
+            variant: Extra key component, e.g. the attempt number of a retry loop
+            flavor: LEGACY_SDK or CLIENT_SDK - shape of the rebuilt response
+        """
+        if not self.enabled:
+            return generate()
+
+        key = self.make_key(model, contents, config, variant)
+        cached = self.get(key, flavor)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return cached
+
+        with self._lock:
+            self.misses += 1
+        response = generate()
+        try:
+            self.put(key, response)
+        except Exception as e:
+            logger.warning(f"Could not cache response: {e}")
+        return response
+
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def log_stats(self) -> None:
+        if self.enabled:
+            logger.info(f"Response cache: {self.hits} hits, {self.misses} misses")
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the process-wide response cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Structured Output
+Response schemas and typed results for the Gemini answers that code acts on
+(generated-image verification, accessory detection and pin analysis). Requests
+ask for application/json constrained to a schema, and each reply is validated
+once into a typed result. A reply that does not validate is requested again
+rather than read as a verdict. For verification, a candidate whose replies keep
+failing to validate is re-verified (VERIFY_ROUNDS batches of MAX_PARSE_ATTEMPTS
+requests); only if none yields a verdict does the candidate count as a failed
+attempt, with the neutral NO_VERDICT_RESULT rather than the parse error as
+feedback.
+
+The image-generation models do not support JSON mode, so verification runs on
+a text model (GEMINI_VERIFICATION_MODEL, default gemini-2.5-flash).
+"""
+
+import os
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+VERIFICATION_MODEL = os.getenv('GEMINI_VERIFICATION_MODEL', 'gemini-2.5-flash')
+MAX_PARSE_ATTEMPTS = int(os.getenv('STRUCTURED_OUTPUT_PARSE_ATTEMPTS', '3'))
+VERIFY_ROUNDS = int(os.getenv('STRUCTURED_OUTPUT_VERIFY_ROUNDS', '3'))
+
+# Verification result for a candidate the verifier never gave a verdict on
+NO_VERDICT_RESULT = "FAIL: verifier returned no valid verdict"
+
+PRIORITIES = ('high', 'medium', 'low')
+
+
+class StructuredOutputError(ValueError):
+    """The model's reply did not match the requested schema."""
+
+
+# Schemas use the upper-case type names accepted by both google.generativeai and google.genai
+VERIFICATION_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'verdict': {'type': 'STRING', 'enum': ['PASS', 'FAIL']},
+        'issues': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+    },
+    'required': ['verdict', 'issues'],
+}
+
+_COORDINATES_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {name: {'type': 'INTEGER'} for name in ('x', 'y', 'width', 'height')},
+    'required': ['x', 'y', 'width', 'height'],
+}
+
+_DETECTED_ITEM_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'item_type': {'type': 'STRING'},
+        'description': {'type': 'STRING'},
+        'location': {'type': 'STRING'},
+        'coordinates': _COORDINATES_SCHEMA,
+        'confidence': {'type': 'NUMBER'},
+        'removal_priority': {'type': 'STRING', 'enum': list(PRIORITIES)},
+    },
+    'required': ['item_type', 'description', 'location', 'coordinates', 'confidence', 'removal_priority'],
+}
+
+_INTEGRITY_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'missing_sleeves': {'type': 'BOOLEAN'},
+        'missing_trousers': {'type': 'BOOLEAN'},
+        'garment_complete': {'type': 'BOOLEAN'},
+        'issues_found': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+    },
+    'required': ['missing_sleeves', 'missing_trousers', 'garment_complete', 'issues_found'],
+}
+
+_DETECTION_PROPERTIES = {
+    'detected_items': {'type': 'ARRAY', 'items': _DETECTED_ITEM_SCHEMA},
+    'clothing_integrity': _INTEGRITY_SCHEMA,
+    'clean_areas': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+}
+
+DETECTION_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': _DETECTION_PROPERTIES,
+    'required': ['detected_items', 'clothing_integrity'],
+}
+
+PACKED_DETECTION_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': dict(_DETECTION_PROPERTIES, image_index={'type': 'INTEGER'}),
+        'required': ['image_index', 'detected_items', 'clothing_integrity'],
+    },
+}
+
+# Pin analysis fields per section, as listed in prompt_engineering.refined_prompt
+PIN_ANALYSIS_SECTIONS = {
+    'overall_mood_story': ('emotional_tone', 'narrative_theme', 'aesthetic_keywords'),
+    'scene_setting': ('location_type', 'backdrop_description', 'props', 'environment_mood'),
+    'lighting_color': ('light_quality', 'light_source_direction', 'light_temperature', 'contrast_style',
+                       'color_palette_hex', 'color_theory_relation', 'highlight_shadows_balance'),
+    'camera_composition': ('camera_angle', 'camera_type_model', 'focal_length_guess', 'aperture_guess',
+                           'framing', 'composition_rules', 'cropping_style', 'movement_capture'),
+    'model_pose_expression': ('body_pose', 'head_pose', 'facial_expression', 'gesture', 'gaze_direction',
+                              'pose_energy'),
+    'garments_fashion_details': ('garment_type', 'fit_style', 'length', 'silhouette', 'fabric_material',
+                                 'pattern', 'color_hex', 'details', 'layering_style'),
+    'styling_elements': ('accessories', 'footwear', 'hair_style', 'makeup_style', 'nail_style', 'special_effects'),
+    'editorial_brand_cues': ('publication_vibe', 'brand_vibe_keywords', 'target_audience_signal'),
+    'technical_aesthetic_scores': ('aesthetic_score', 'uniqueness_score'),
+}
+_PIN_ANALYSIS_TYPES = {
+    'color_palette_hex': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+    'color_hex': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+    'aesthetic_score': {'type': 'NUMBER'},
+    'uniqueness_score': {'type': 'NUMBER'},
+}
+
+PIN_ANALYSIS_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': dict(
+        {
+            section: {
+                'type': 'OBJECT',
+                'properties': {name: _PIN_ANALYSIS_TYPES.get(name, {'type': 'STRING'}) for name in fields},
+                'required': list(fields),
+            }
+            for section, fields in PIN_ANALYSIS_SECTIONS.items()
+        },
+        tags={'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        prompt_suggestion={'type': 'STRING'},
+    ),
+    'required': list(PIN_ANALYSIS_SECTIONS) + ['tags', 'prompt_suggestion'],
+}
+
+
+def _as_tuple(types):
+    return types if isinstance(types, tuple) else (types,)
+
+
+def _require(data: Dict[str, Any], key: str, types, default=None):
+    """data[key] (or default) if it has one of the given types; bools only count where bool is listed."""
+    value = data.get(key, default)
+    if not isinstance(value, types) or (isinstance(value, bool) and bool not in _as_tuple(types)):
+        raise StructuredOutputError(f"'{key}' should be {types}, got {value!r}")
+    return value
+
+
+def _object(data) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        raise StructuredOutputError(f"expected an object, got {type(data).__name__}")
+    return data
+
+
+@dataclass
+class Verification:
+    """Verdict on a generated image."""
+    passed: bool
+    issues: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, data) -> 'Verification':
+        data = _object(data)
+        verdict = _require(data, 'verdict', str)
+        if verdict not in ('PASS', 'FAIL'):
+            raise StructuredOutputError(f"unknown verdict {verdict!r}")
+        issues = [str(issue) for issue in _require(data, 'issues', list, [])]
+        return cls(passed=verdict == 'PASS', issues=issues)
+
+    @property
+    def result_text(self) -> str:
+        """Result string used by the retry loops (fed back into the next prompt on failure)."""
+        if self.passed:
+            return "Verification passed"
+        return "FAIL: " + ("; ".join(self.issues) or "requirements not met")
+
+
+@dataclass
+class DetectedItem:
+    item_type: str
+    description: str
+    location: str
+    coordinates: Dict[str, int]
+    confidence: float
+    removal_priority: str
+
+    @classmethod
+    def from_json(cls, data) -> 'DetectedItem':
+        data = _object(data)
+        coordinates = _object(data.get('coordinates', {}))
+        priority = _require(data, 'removal_priority', str, 'medium')
+        if priority not in PRIORITIES:
+            raise StructuredOutputError(f"unknown removal_priority {priority!r}")
+        return cls(
+            item_type=_require(data, 'item_type', str, 'unknown'),
+            description=_require(data, 'description', str, ''),
+            location=_require(data, 'location', str, 'unknown'),
+            coordinates={key: int(_require(coordinates, key, (int, float))) for key in coordinates},
+            confidence=float(_require(data, 'confidence', (int, float), 0.5)),
+            removal_priority=priority,
+        )
+
+
+@dataclass
+class ClothingIntegrity:
+    missing_sleeves: bool = False
+    missing_trousers: bool = False
+    garment_complete: bool = True
+    issues_found: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, data) -> 'ClothingIntegrity':
+        data = _object(data)
+        return cls(
+            missing_sleeves=_require(data, 'missing_sleeves', bool, False),
+            missing_trousers=_require(data, 'missing_trousers', bool, False),
+            garment_complete=_require(data, 'garment_complete', bool, True),
+            issues_found=[str(issue) for issue in _require(data, 'issues_found', list, [])],
+        )
+
+
+@dataclass
+class DetectionResult:
+    """Unwanted elements and clothing integrity for one image."""
+    detected_items: List[DetectedItem]
+    clothing_integrity: ClothingIntegrity
+    clean_areas: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_json(cls, data) -> 'DetectionResult':
+        data = _object(data)
+        return cls(
+            detected_items=[DetectedItem.from_json(item) for item in _require(data, 'detected_items', list)],
+            clothing_integrity=ClothingIntegrity.from_json(data.get('clothing_integrity', {})),
+            clean_areas=[str(area) for area in _require(data, 'clean_areas', list, [])],
+        )
+
+
+@dataclass
+class PinAnalysis:
+    """Sectioned fashion analysis of a pin image plus a generative prompt derived from it."""
+    sections: Dict[str, Dict[str, Any]]
+    tags: List[str]
+    prompt_suggestion: str
+
+    @classmethod
+    def from_json(cls, data) -> 'PinAnalysis':
+        data = _object(data)
+        sections = {}
+        for section, fields in PIN_ANALYSIS_SECTIONS.items():
+            values = _object(data.get(section))
+            missing = [name for name in fields if name not in values]
+            if missing:
+                raise StructuredOutputError(f"'{section}' is missing {missing}")
+            sections[section] = {name: values[name] for name in fields}
+
+        prompt_suggestion = _require(data, 'prompt_suggestion', str).strip()
+        if not prompt_suggestion:
+            raise StructuredOutputError("empty prompt_suggestion")
+        return cls(
+            sections=sections,
+            tags=[str(tag) for tag in _require(data, 'tags', list, [])],
+            prompt_suggestion=prompt_suggestion,
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        return dict(self.sections, tags=self.tags, prompt_suggestion=self.prompt_suggestion)
+
+
+def json_config(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Generation config asking for JSON matching schema (works as generation_config and as config)."""
+    return {'response_mime_type': 'application/json', 'response_schema': schema}
+
+
+def request_structured(model: str, contents, call: Callable[[Dict[str, Any]], Any],
+                       parse: Callable[[Any], Any], schema: Dict[str, Any],
+                       response_cache=None, flavor: Optional[str] = None,
+                       max_attempts: int = MAX_PARSE_ATTEMPTS, first_attempt: int = 0):
+    """Request JSON matching schema and return parse(decoded JSON).
+
+    Args:
+        model: Model id the request is sent to (cache key)
+        contents: The generate_content inputs (cache key)
+        call: Performs the real request given the generation config
+        parse: Validates the decoded JSON into a typed result, raising ValueError if it does not fit
+        schema: Response schema
+        response_cache: Optional ResponseCache; re-asks use a fresh cache variant
+        flavor: Response cache flavour (LEGACY_SDK or CLIENT_SDK)
+        max_attempts: Requests made before giving up on an unparseable reply
+        first_attempt: Offset of the re-ask cache variants, so a later call on the same
+            inputs makes fresh requests instead of replaying earlier unparseable replies
+
+    Raises:
+        StructuredOutputError: no reply validated within max_attempts
+    """
+    config = json_config(schema)
+    last_error = None
+
+    for parse_attempt in range(first_attempt, first_attempt + max_attempts):
+        if response_cache is not None:
+            cache_kwargs = {'flavor': flavor} if flavor else {}
+            response = response_cache.generate_content(
+                model, contents, lambda: call(config), config=config,
+                variant=f"reask-{parse_attempt}" if parse_attempt else None, **cache_kwargs
+            )
+        else:
+            response = call(config)
+
+        try:
+            return parse(json.loads(response.text))
+        except (ValueError, TypeError, AttributeError) as e:
+            last_error = e
+            logger.warning(f"Reply did not match the schema ({parse_attempt - first_attempt + 1}/{max_attempts}): {e}")
+
+    raise StructuredOutputError(f"No valid reply after {max_attempts} requests: {last_error}")
+
+
+def verify_candidate(model: str, contents, call: Callable[[Dict[str, Any]], Any],
+                     response_cache=None, flavor: Optional[str] = None,
+                     rounds: int = VERIFY_ROUNDS) -> Verification:
+    """Verdict on one candidate image (see request_structured for the arguments).
+
+    When a whole batch of replies fails to validate, the same candidate is verified
+    again with fresh requests, up to rounds batches, so a verifier hiccup does not
+    cost a generation attempt.
+
+    Raises:
+        StructuredOutputError: no verdict after all rounds; callers record the
+            candidate as failed with NO_VERDICT_RESULT
+    """
+    last_error = None
+    for verify_round in range(rounds):
+        try:
+            return request_structured(
+                model, contents, call, Verification.from_json, VERIFICATION_SCHEMA,
+                response_cache=response_cache, flavor=flavor, first_attempt=verify_round * MAX_PARSE_ATTEMPTS
+            )
+        except StructuredOutputError as e:
+            last_error = e
+            if verify_round + 1 < rounds:
+                logger.warning(f"No verdict ({verify_round + 1}/{rounds}) - re-verifying the same candidate")
+
+    raise StructuredOutputError(f"No verdict after {rounds} verification rounds: {last_error}")
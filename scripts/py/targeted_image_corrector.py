@@ -6,11 +6,11 @@ Corrects specific issues in processed images based on detection data.
 
 import os
 import sys
-import time
 from pathlib import Path
 from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
 import base64
 from io import BytesIO
 import logging
@@ -44,6 +44,7 @@ class TargetedImageCorrector:
         # Configure Gemini API
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel('models/gemini-2.5-flash-image-preview')
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-flash-image-preview')
         
         # Directory paths
         self.processed_dir = Path('product-assets/processed')
@@ -141,11 +142,12 @@ class TargetedImageCorrector:
             try:
                 logger.info(f"Attempt {attempt + 1}/{max_retries} for {image_filename}")
                 
-                response = self.model.generate_content([
-                    prompt,
-                    {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},
-                    {"mime_type": "image/jpeg", "data": img_data}
-                ])
+                with self.rate_limiter.slot():
+                    response = self.model.generate_content([
+                        prompt,
+                        {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},
+                        {"mime_type": "image/jpeg", "data": img_data}
+                    ])
                 
                 if response and response.candidates and response.candidates[0].content.parts:
                     for part in response.candidates[0].content.parts:
@@ -174,11 +176,12 @@ class TargetedImageCorrector:
                     logger.warning("API conversion error, trying simpler prompt...")
                     # Try with very simple prompt
                     try:
-                        simple_response = self.model.generate_content([
-                            "Clean up this clothing image and put it on a black mannequin",
-                            {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},
-                            {"mime_type": "image/jpeg", "data": img_data}
-                        ])
+                        with self.rate_limiter.slot():
+                            simple_response = self.model.generate_content([
+                                "Clean up this clothing image and put it on a black mannequin",
+                                {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},
+                                {"mime_type": "image/jpeg", "data": img_data}
+                            ])
                         
                         if simple_response and simple_response.candidates and simple_response.candidates[0].content.parts:
                             for part in simple_response.candidates[0].content.parts:
@@ -195,11 +198,6 @@ class TargetedImageCorrector:
                                     return True
                     except Exception as simple_e:
                         logger.error(f"Simple approach failed: {simple_e}")
-                
-                time.sleep(1)
-            
-            if attempt < max_retries - 1:
-                time.sleep(0.5)
         
         logger.error(f"Failed to correct {image_filename} after {max_retries} attempts")
         return False
@@ -208,11 +206,9 @@ class TargetedImageCorrector:
         """Run corrections on images that need them."""
         logger.info("Starting targeted image corrections...")
         
-        # Get images that need processing
-        images_needing_correction = self.detection_loader.get_images_needing_processing()
-        
-        if max_images:
-            images_needing_correction = images_needing_correction[:max_images]
+        # Highest-priority images first
+        priority_index = self.detection_loader.priority_index()
+        images_needing_correction = self.detection_loader.get_priority_images(max_images or len(priority_index))
         
         logger.info(f"Found {len(images_needing_correction)} images needing correction")
         
@@ -224,12 +220,9 @@ class TargetedImageCorrector:
             
             if self.correct_single_image(image_filename):
                 successful += 1
+                self.detection_loader.mark_corrected(image_filename)
             else:
                 failed += 1
-            
-            # Rate limiting
-            if i < len(images_needing_correction):
-                time.sleep(0.5)
         
         results = {
             'total_processed': len(images_needing_correction),
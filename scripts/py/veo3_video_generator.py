@@ -9,10 +9,18 @@ import os
 import sys
 import time
 import logging
+import hashlib
+import argparse
+import requests
 from pathlib import Path
+from dataclasses import dataclass
 from typing import Optional, List, Dict
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
+from job_ledger import GracefulInterrupt
+from veo_registry import VeoOperationRegistry, file_sha256, operation_key, SUBMITTED, COMPLETED
 from google import genai
+from google.genai import types
 from PIL import Image
 
 # Configure logging
@@ -29,6 +37,45 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+VEO_MODEL = "veo-3.0-generate-001"
+VIDEO_TYPES = ["360_rotations", "detail_shots", "catalog_views", "texture_focus"]
+
+# A rejected submit (e.g. quota) is retried after SUBMIT_RETRY_DELAY seconds, doubling each time
+SUBMIT_RETRY_DELAY = 30.0
+MAX_SUBMIT_ATTEMPTS = 5
+
+# Each operation is polled after POLL_INTERVAL_MIN seconds, backing off to POLL_INTERVAL_MAX
+POLL_INTERVAL_MIN = 10.0
+POLL_INTERVAL_MAX = 60.0
+POLL_BACKOFF = 1.5
+MAX_POLL_ERRORS = 5
+
+# Videos are streamed to disk in chunks of this size
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = (10, 120)
+
+
+@dataclass
+class VideoJob:
+    """One video to render; image_path is None for text-to-video."""
+    prompt: str
+    output_path: str
+    image_path: Optional[str] = None
+    video_type: Optional[str] = None
+
+
+@dataclass
+class _RunningOperation:
+    job: VideoJob
+    operation: object
+    submitted_at: float
+    next_poll_at: float
+    key: str
+    interval: float = POLL_INTERVAL_MIN
+    poll_errors: int = 0
+    reattached: bool = False
+
+
 class Veo3VideoGenerator:
     def __init__(self):
         """Initialize the Veo 3 video generator."""
@@ -38,6 +85,7 @@ class Veo3VideoGenerator:
 
         # Initialize Google GenAI client
         self.client = genai.Client(api_key=self.api_key)
+        self.rate_limiter = get_rate_limiter(VEO_MODEL)
 
         # Directory paths
         self.base_dir = Path("product-assets")
@@ -50,10 +98,20 @@ class Veo3VideoGenerator:
         self.catalog_dir = self.videos_dir / "catalog_views"
         self.texture_dir = self.videos_dir / "texture_focus"
 
+        self.video_dirs = {
+            "360_rotations": self.rotations_dir,
+            "detail_shots": self.detail_dir,
+            "catalog_views": self.catalog_dir,
+            "texture_focus": self.texture_dir,
+        }
+
         # Ensure directories exist
-        for directory in [self.rotations_dir, self.detail_dir, self.catalog_dir, self.texture_dir]:
+        for directory in self.video_dirs.values():
             directory.mkdir(parents=True, exist_ok=True)
 
+        # Every submitted operation, so a restart re-attaches instead of paying again
+        self.registry = VeoOperationRegistry(self.videos_dir / "veo_operations.sqlite")
+
         logger.info("Veo 3 Video Generator initialized:")
         logger.info(f"  - Processed images: {self.processed_dir}")
         logger.info(f"  - Video outputs: {self.videos_dir}")
@@ -83,165 +141,348 @@ class Veo3VideoGenerator:
             ]
         }
 
-    def generate_video_from_local_image(self, image_path: str, prompt: str, output_path: str) -> bool:
-        """
-        Generate a video from a local product image using Veo 3.
-
-        Args:
-            image_path: Path to the local image file
-            prompt: Video generation prompt
-            output_path: Path to save the generated video
-
-        Returns:
-            bool: True if successful, False otherwise
-        """
-        try:
-            logger.info(f"Generating video from local image: {Path(image_path).name}")
+    def output_path_for(self, image_path: str, video_type: str) -> Path:
+        """Where the video of one type for an image is saved."""
+        output_dir = self.video_dirs.get(video_type, self.catalog_dir)
+        return output_dir / f"{Path(image_path).stem}_{video_type}.mp4"
 
+    def _submit(self, job: VideoJob):
+        """Start a Veo operation for a job and return it without waiting."""
+        kwargs = {}
+        if job.image_path:
             # Load the local image file as bytes
-            with open(image_path, "rb") as f:
+            with open(job.image_path, "rb") as f:
                 image_bytes = f.read()
 
             # Determine MIME type
-            if image_path.lower().endswith('.png'):
+            if job.image_path.lower().endswith('.png'):
                 mime_type = "image/png"
             else:
                 mime_type = "image/jpeg"
 
-            logger.info("Starting video generation...")
+            kwargs['image'] = {
+                "imageBytes": image_bytes,
+                "mimeType": mime_type
+            }
 
-            # Generate video using Veo 3 with local image
-            operation = self.client.models.generate_videos(
-                model="veo-3.0-generate-001",
-                prompt=prompt,
-                image={
-                    "imageBytes": image_bytes,
-                    "mimeType": mime_type
-                }
+        with self.rate_limiter.slot():
+            return self.client.models.generate_videos(
+                model=VEO_MODEL,
+                prompt=job.prompt,
+                **kwargs
             )
 
-            # Wait for completion
-            logger.info("Waiting for video generation to complete...")
-            while not operation.done:
-                time.sleep(10)
-                operation = self.client.operations.get(operation)
+    def _job_key(self, job: VideoJob):
+        """(image hash, registry key) for a job; the hash is None for text-to-video."""
+        image_sha256 = file_sha256(job.image_path) if job.image_path else None
+        return image_sha256, operation_key(image_sha256, job.prompt, VEO_MODEL, job.video_type)
+
+    def _generated_video(self, operation):
+        """The video of a finished operation; raises if the render itself failed."""
+        error = getattr(operation, 'error', None)
+        if error:
+            raise RuntimeError(f"Operation failed: {error}")
 
-            # Download the generated video
-            generated_video = operation.response.generated_videos[0]
-            video_data = self.client.files.download(file=generated_video.video)
+        generated_videos = operation.response.generated_videos if operation.response else None
+        if not generated_videos:
+            raise RuntimeError("Operation finished without a video")
+
+        return generated_videos[0].video
+
+    def _save_video(self, video, output_path: str) -> str:
+        """
+        Stream a generated video to output_path and return its sha256.
 
-            # Save the video
-            with open(output_path, 'wb') as f:
+        Chunks go to output_path + '.part', which is renamed into place only once
+        complete, so memory use does not depend on clip length and a crash never
+        leaves a truncated MP4. A .part left by an interrupted download is resumed
+        with a Range request when the server honours it.
+        """
+        output_path = Path(output_path)
+        partial_path = output_path.with_name(output_path.name + '.part')
+        digest = hashlib.sha256()
+
+        uri = getattr(video, 'uri', None)
+        if not uri:
+            # Returned inline rather than as a file - nothing to stream
+            video_data = getattr(video, 'video_bytes', None) or self.client.files.download(file=video)
+            with open(partial_path, 'wb') as f:
                 f.write(video_data)
+            digest.update(video_data)
+            os.replace(partial_path, output_path)
+            return digest.hexdigest()
+
+        offset = partial_path.stat().st_size if partial_path.exists() else 0
+        headers = {'x-goog-api-key': self.api_key}
+        if offset:
+            headers['Range'] = f"bytes={offset}-"
+
+        with requests.get(uri, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            if offset and response.status_code == 206:
+                logger.info(f"Resuming {output_path.name} from {offset / 1024 / 1024:.1f}MB")
+                with open(partial_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                mode = 'ab'
+            elif offset and response.status_code == 416:
+                # Range not satisfiable: the stale .part is unusable, fetch the whole file again
+                partial_path.unlink()
+                return self._save_video(video, str(output_path))
+            else:
+                response.raise_for_status()
+                mode = 'wb'
 
-            logger.info(f"Video saved to {output_path}")
-            return True
+            with open(partial_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
 
-        except Exception as e:
-            logger.error(f"Error generating video for {image_path}: {str(e)}")
-            return False
+        os.replace(partial_path, output_path)
+        return digest.hexdigest()
 
-    def generate_text_to_video(self, prompt: str, output_path: str) -> bool:
+    def run_jobs(self, jobs: List[VideoJob], max_concurrent: Optional[int] = None) -> Dict[str, bool]:
         """
-        Generate a video from text prompt using Veo 3.
+        Render jobs with up to max_concurrent Veo operations in flight.
+
+        All running operations are tracked by one polling loop. Each operation is polled
+        on its own backoff schedule (short at first, then up to POLL_INTERVAL_MAX), its
+        video is downloaded as soon as it completes, and the freed slot goes straight to
+        the next queued job. With enough slots the batch takes about as long as the
+        slowest render.
+
+        A submit that is rejected (e.g. for quota) goes back on the queue and submits
+        pause with exponential backoff; a job is only given up after MAX_SUBMIT_ATTEMPTS
+        rejections.
+
+        Operations are recorded in the registry as soon as they are submitted. Jobs
+        whose render already completed are skipped, and jobs with an operation still
+        in flight (or finished but not downloaded) from an earlier run are re-attached
+        rather than submitted again.
 
         Args:
-            prompt: Text description for video generation
+            jobs: Videos to render
+            max_concurrent: Operations in flight at once (default: the Veo concurrency budget
+                of the shared rate limiter)
+
+        Returns:
+            Dict: Success per job output path
+        """
+        max_concurrent = max(1, max_concurrent or self.rate_limiter.max_concurrent)
+        queue = list(reversed(jobs))
+        running: List[_RunningOperation] = []
+        results = {job.output_path: False for job in jobs}
+        total = len(jobs)
+        finished = 0
+        submit_failures: Dict[str, int] = {}
+        submit_paused_until = 0.0
+
+        def finish(entry: _RunningOperation, success: bool):
+            nonlocal finished
+            finished += 1
+            results[entry.job.output_path] = success
+            elapsed = time.monotonic() - entry.submitted_at
+            status = 'SUCCESS' if success else 'FAILED'
+            logger.info(f"[{finished}/{total}] {Path(entry.job.output_path).name}: {status} after {elapsed:.0f}s")
+
+        with GracefulInterrupt() as interrupt:
+            while queue or running:
+                # Fill free slots
+                while (queue and len(running) < max_concurrent and not interrupt.requested
+                       and time.monotonic() >= submit_paused_until):
+                    job = queue.pop()
+                    source = Path(job.image_path).name if job.image_path else f"text: {job.prompt[:60]}"
+                    try:
+                        image_sha256, key = self._job_key(job)
+                    except OSError as e:
+                        logger.error(f"Error reading {source}: {str(e)}")
+                        finished += 1
+                        continue
+
+                    record = self.registry.get(key)
+                    if record and record['status'] == COMPLETED and Path(record['output_path']).exists():
+                        finished += 1
+                        results[job.output_path] = True
+                        logger.info(f"[{finished}/{total}] {Path(job.output_path).name}: already rendered "
+                                    f"to {record['output_path']}")
+                        continue
+
+                    now = time.monotonic()
+                    if record and record['status'] in (SUBMITTED, COMPLETED):
+                        # Rendering (or rendered but never saved) in an earlier run - poll it again
+                        operation = types.GenerateVideosOperation(name=record['operation_name'])
+                        running.append(_RunningOperation(job, operation, now, now, key, reattached=True))
+                        logger.info(f"Re-attached {Path(job.output_path).name} to {record['operation_name']}")
+                        continue
+
+                    try:
+                        operation = self._submit(job)
+                    except Exception as e:
+                        failures = submit_failures.get(job.output_path, 0) + 1
+                        submit_failures[job.output_path] = failures
+                        if failures >= MAX_SUBMIT_ATTEMPTS:
+                            logger.error(f"Error starting video for {source}, giving up: {str(e)}")
+                            finished += 1
+                            continue
+                        # Usually quota: put the job back first in line and pause all submits
+                        delay = SUBMIT_RETRY_DELAY * 2 ** (failures - 1)
+                        logger.warning(f"Error starting video for {source}: {str(e)} - "
+                                       f"retrying in {delay:.0f}s ({failures}/{MAX_SUBMIT_ATTEMPTS})")
+                        queue.append(job)
+                        submit_paused_until = time.monotonic() + delay
+                        break
+                    self.registry.record_submitted(
+                        key, image_sha256, job.prompt, VEO_MODEL, job.video_type, operation.name, job.output_path
+                    )
+                    now = time.monotonic()
+                    running.append(_RunningOperation(job, operation, now, now + POLL_INTERVAL_MIN, key))
+                    logger.info(f"Started {Path(job.output_path).name} from {source} ({len(running)} in flight)")
+
+                if interrupt.requested and queue:
+                    logger.warning(f"Interrupted - not starting {len(queue)} queued videos")
+                    finished += len(queue)
+                    queue.clear()
+
+                # Sleep until the next operation is due, or submits may resume
+                wake_times = [entry.next_poll_at for entry in running]
+                if queue and len(running) < max_concurrent:
+                    wake_times.append(submit_paused_until)
+                if not wake_times:
+                    continue
+                time.sleep(max(0.0, min(wake_times) - time.monotonic()))
+
+                now = time.monotonic()
+                for entry in [entry for entry in running if entry.next_poll_at <= now]:
+                    try:
+                        entry.operation = self.client.operations.get(entry.operation)
+                    except Exception as e:
+                        entry.poll_errors += 1
+                        if entry.poll_errors >= MAX_POLL_ERRORS:
+                            logger.error(f"Giving up polling {Path(entry.job.output_path).name}: {str(e)}")
+                            if entry.reattached:
+                                # Most likely expired server-side; let the next run submit it again
+                                self.registry.mark_failed(entry.key, f"Re-attach failed: {e}")
+                            running.remove(entry)
+                            finish(entry, False)
+                            continue
+                        logger.warning(f"Error polling {Path(entry.job.output_path).name}: {str(e)}")
+                    else:
+                        entry.poll_errors = 0
+
+                    if not entry.operation.done:
+                        entry.interval = min(entry.interval * POLL_BACKOFF, POLL_INTERVAL_MAX)
+                        entry.next_poll_at = time.monotonic() + entry.interval
+                        continue
+
+                    # Download now so the slot can be reused on the next pass
+                    running.remove(entry)
+                    try:
+                        video = self._generated_video(entry.operation)
+                    except RuntimeError as e:
+                        logger.error(f"Render of {entry.job.output_path} failed: {str(e)}")
+                        self.registry.mark_failed(entry.key, str(e))
+                        finish(entry, False)
+                        continue
+
+                    try:
+                        checksum = self._save_video(video, entry.job.output_path)
+                    except Exception as e:
+                        # Left as submitted: the next run re-attaches and retries the download
+                        logger.error(f"Error saving {entry.job.output_path}: {str(e)}")
+                        finish(entry, False)
+                        continue
+
+                    self.registry.mark_completed(entry.key, entry.job.output_path, checksum)
+                    finish(entry, True)
+
+        return results
+
+    def generate_video_from_local_image(self, image_path: str, prompt: str, output_path: str) -> bool:
+        """
+        Generate a video from a local product image using Veo 3.
+
+        Args:
+            image_path: Path to the local image file
+            prompt: Video generation prompt
             output_path: Path to save the generated video
 
         Returns:
             bool: True if successful, False otherwise
         """
-        try:
-            logger.info(f"Generating text-to-video with prompt: {prompt[:100]}...")
+        logger.info(f"Generating video from local image: {Path(image_path).name}")
+        job = VideoJob(prompt=prompt, output_path=str(output_path), image_path=str(image_path))
+        return self.run_jobs([job])[job.output_path]
 
-            # Generate video using Veo 3
-            operation = self.client.models.generate_videos(
-                model="veo-3.0-generate-001",
-                prompt=prompt,
-            )
-
-            # Wait for completion
-            logger.info("Waiting for video generation to complete...")
-            while not operation.done:
-                time.sleep(10)
-                operation = self.client.operations.get(operation)
+    def generate_text_to_video(self, prompt: str, output_path: str) -> bool:
+        """
+        Generate a video from text prompt using Veo 3.
 
-            # Download the generated video
-            generated_video = operation.response.generated_videos[0]
-            video_data = self.client.files.download(file=generated_video.video)
+        Args:
+            prompt: Text description for video generation
+            output_path: Path to save the generated video
 
-            # Save the video
-            with open(output_path, 'wb') as f:
-                f.write(video_data)
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        logger.info(f"Generating text-to-video with prompt: {prompt[:100]}...")
+        job = VideoJob(prompt=prompt, output_path=str(output_path))
+        return self.run_jobs([job])[job.output_path]
 
-            logger.info(f"Video saved to {output_path}")
-            return True
+    def build_jobs(self, image_paths: List[str], video_types: List[str] = None) -> List[VideoJob]:
+        """One job per image and video type, using the first prompt of each type."""
+        if video_types is None:
+            video_types = VIDEO_TYPES
 
-        except Exception as e:
-            logger.error(f"Error generating text-to-video: {str(e)}")
-            return False
+        prompts = self.get_fashion_prompts()
+        return [
+            VideoJob(
+                prompt=prompts[video_type][0],
+                output_path=str(self.output_path_for(image_path, video_type)),
+                image_path=str(image_path),
+                video_type=video_type
+            )
+            for image_path in image_paths
+            for video_type in video_types
+            if prompts.get(video_type)
+        ]
 
-    def process_single_image(self, image_path: str, video_types: List[str] = None) -> Dict[str, bool]:
+    def process_single_image(self, image_path: str, video_types: List[str] = None,
+                             max_concurrent: Optional[int] = None) -> Dict[str, bool]:
         """
         Process a single image to generate multiple types of videos.
 
         Args:
             image_path: Path to the input image
             video_types: List of video types to generate
+            max_concurrent: Operations in flight at once
 
         Returns:
             Dict: Results for each video type
         """
-        if video_types is None:
-            video_types = ["360_rotations", "detail_shots", "catalog_views", "texture_focus"]
+        return self.batch_process_images([image_path], video_types, max_concurrent)[image_path]
 
-        results = {}
-        image_name = Path(image_path).stem
-        prompts = self.get_fashion_prompts()
-
-        for video_type in video_types:
-            if video_type in prompts:
-                # Use the first prompt for this video type
-                prompt = prompts[video_type][0]
-
-                # Generate output path
-                output_dir = getattr(self, f"{video_type.split('_')[0]}_dir", self.catalog_dir)
-                output_path = output_dir / f"{image_name}_{video_type}.mp4"
-
-                # Generate video
-                success = self.generate_video_from_image(
-                    image_path, prompt, str(output_path), video_type
-                )
-                results[video_type] = success
-
-                # Add delay to avoid rate limiting
-                time.sleep(2)
-
-        return results
-
-    def batch_process_images(self, image_paths: List[str], video_types: List[str] = None) -> Dict[str, Dict[str, bool]]:
+    def batch_process_images(self, image_paths: List[str], video_types: List[str] = None,
+                             max_concurrent: Optional[int] = None) -> Dict[str, Dict[str, bool]]:
         """
         Process multiple images to generate videos.
 
+        Every (image, video type) job goes through one run_jobs() call, so renders for
+        different images overlap.
+
         Args:
             image_paths: List of image paths to process
             video_types: List of video types to generate
+            max_concurrent: Operations in flight at once
 
         Returns:
             Dict: Results for each image and video type
         """
-        all_results = {}
-
-        for i, image_path in enumerate(image_paths):
-            logger.info(f"Processing image {i+1}/{len(image_paths)}: {Path(image_path).name}")
+        jobs = self.build_jobs(image_paths, video_types)
+        logger.info(f"Rendering {len(jobs)} videos for {len(image_paths)} images")
+        job_results = self.run_jobs(jobs, max_concurrent)
 
-            results = self.process_single_image(image_path, video_types)
-            all_results[image_path] = results
-
-            # Add delay between images to avoid rate limiting
-            if i < len(image_paths) - 1:
-                time.sleep(5)
+        all_results = {image_path: {} for image_path in image_paths}
+        for job in jobs:
+            all_results[job.image_path][job.video_type] = job_results[job.output_path]
 
         return all_results
 
@@ -265,6 +506,14 @@ class Veo3VideoGenerator:
 
 def main():
     """Main function to test Veo 3 video generation with actual product images."""
+    parser = argparse.ArgumentParser(description='Generate product showcase videos with Veo 3')
+    parser.add_argument('--max-concurrent', '-c',
+                       type=int,
+                       default=None,
+                       help='Veo operations rendering at once (default: the Veo concurrency budget in rate_limiter.py)')
+
+    args = parser.parse_args()
+
     generator = Veo3VideoGenerator()
 
     # Select 5 representative images for testing
@@ -283,43 +532,15 @@ def main():
     total_videos = len(selected_images) * len(prompts)
     logger.info(f"Will generate {total_videos} total videos ({len(prompts)} types per image)")
 
-    results = {}
-    video_count = 0
-
-    # Process each image
-    for i, image_path in enumerate(selected_images):
-        logger.info(f"=== Processing Image {i+1}/{len(selected_images)}: {Path(image_path).name} ===")
-
-        if not os.path.exists(image_path):
+    available_images = []
+    for image_path in selected_images:
+        if os.path.exists(image_path):
+            available_images.append(image_path)
+        else:
             logger.error(f"Image not found: {image_path}")
-            continue
-
-        image_results = {}
-
-        # Generate all video types for this image
-        for video_type, prompt_list in prompts.items():
-            video_count += 1
-            logger.info(f"Generating {video_type} ({video_count}/{total_videos})")
-
-            if prompt_list:
-                prompt = prompt_list[0]  # Use first prompt for each type
-
-                # Generate output path
-                output_dir = getattr(generator, f"{video_type.split('_')[0]}_dir", generator.catalog_dir)
-                image_name = Path(image_path).stem
-                output_path = output_dir / f"{image_name}_{video_type}.mp4"
-
-                # Generate video
-                success = generator.generate_video_from_local_image(image_path, prompt, str(output_path))
-                image_results[video_type] = success
-
-                logger.info(f"  {video_type}: {'SUCCESS' if success else 'FAILED'}")
-
-                # Add delay between requests to avoid rate limiting
-                if video_count < total_videos:
-                    time.sleep(5)
 
-        results[image_path] = image_results
+    start_time = time.time()
+    results = generator.batch_process_images(available_images, list(prompts), args.max_concurrent)
 
     # Print final summary
     logger.info("=== Video Generation Summary ===")
@@ -328,6 +549,8 @@ def main():
 
     logger.info(f"Images processed: {successful_images}/{len(selected_images)}")
     logger.info(f"Total videos generated: {total_videos_generated}/{total_videos}")
+    logger.info(f"Wall clock: {time.time() - start_time:.0f}s")
+    logger.info(f"Operation registry: {generator.registry.summary()}")
     logger.info("Check the video output directories for generated files.")
 
     # Print detailed results
@@ -336,4 +559,4 @@ def main():
         logger.info(f"{Path(image_path).name}: {successful_types}/{len(prompts)} videos successful")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Veo Operation Registry
+SQLite record of every submitted Veo operation, keyed by (image hash, prompt, model,
+video type), with the operation name, status, output path and video checksum. A
+restarted batch re-attaches to operations that were still rendering and skips clips
+that already finished, so the same render is never paid for twice.
+"""
+
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SUBMITTED = 'submitted'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def operation_key(image_sha256: Optional[str], prompt: str, model: str, video_type: Optional[str]) -> str:
+    """Stable id of one render request; image_sha256 is None for text-to-video."""
+    parts = [image_sha256 or '', prompt, model, video_type or '']
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+class VeoOperationRegistry:
+    """Submitted Veo operations and their outcome, stored in SQLite."""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS operations (
+                key TEXT PRIMARY KEY,
+                image_sha256 TEXT,
+                prompt TEXT NOT NULL,
+                model TEXT NOT NULL,
+                video_type TEXT,
+                operation_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                output_path TEXT,
+                video_sha256 TEXT,
+                last_error TEXT,
+                submitted_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(operations)')}
+        if 'video_sha256' not in columns:
+            self._conn.execute('ALTER TABLE operations ADD COLUMN video_sha256 TEXT')
+        self._conn.commit()
+
+    def _execute(self, sql: str, params=()) -> None:
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT operation_name, status, output_path, video_sha256, last_error FROM operations WHERE key = ?',
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'operation_name': row[0],
+            'status': row[1],
+            'output_path': row[2],
+            'video_sha256': row[3],
+            'last_error': row[4],
+        }
+
+    def record_submitted(self, key: str, image_sha256: Optional[str], prompt: str, model: str,
+                         video_type: Optional[str], operation_name: str, output_path: str) -> None:
+        """Record a new operation; replaces a failed attempt with the same key."""
+        now = datetime.now().isoformat()
+        self._execute(
+            """INSERT OR REPLACE INTO operations
+               (key, image_sha256, prompt, model, video_type, operation_name, status, output_path,
+                video_sha256, last_error, submitted_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, NULL, ?, ?)""",
+            (key, image_sha256, prompt, model, video_type, operation_name, SUBMITTED, str(output_path), now, now)
+        )
+
+    def mark_completed(self, key: str, output_path: str, video_sha256: Optional[str] = None) -> None:
+        self._execute(
+            """UPDATE operations SET status = ?, output_path = ?, video_sha256 = ?, last_error = NULL, updated_at = ?
+               WHERE key = ?""",
+            (COMPLETED, str(output_path), video_sha256, datetime.now().isoformat(), key)
+        )
+
+    def mark_failed(self, key: str, error: str) -> None:
+        """The operation itself failed; the next run may submit it again."""
+        self._execute(
+            'UPDATE operations SET status = ?, last_error = ?, updated_at = ? WHERE key = ?',
+            (FAILED, str(error), datetime.now().isoformat(), key)
+        )
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM operations GROUP BY status').fetchall()
+        return dict(rows)
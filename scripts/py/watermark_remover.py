@@ -7,11 +7,12 @@ from the bottom right corner of generated product images.
 
 import os
 import sys
-import time
 from pathlib import Path
 from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
+from structured_output import VERIFICATION_MODEL, NO_VERDICT_RESULT, StructuredOutputError, verify_candidate
 import base64
 from io import BytesIO
 import logging
@@ -40,6 +41,10 @@ class WatermarkRemover:
         # Configure Gemini API
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel('models/gemini-2.5-flash-image-preview')
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-flash-image-preview')
+        # Verdicts come back as schema-constrained JSON from a text model
+        self.verification_model = genai.GenerativeModel(VERIFICATION_MODEL)
+        self.verification_rate_limiter = get_rate_limiter(VERIFICATION_MODEL)
         
         # Directory paths
         self.processed_dir = Path('product-assets/processed')
@@ -77,9 +82,9 @@ CHECK IN THIS ORDER:
 - Does the background look natural without artifacts?
 - Is the overall image quality maintained?
 
-Respond with:
-PASS: All requirements met - watermark removed
-FAIL: [specific issues found]"""
+Respond with JSON:
+- verdict: "PASS" (All requirements met - watermark removed) or "FAIL"
+- issues: [specific issues found] - empty when PASS"""
         
         logger.info("WatermarkRemover initialized successfully")
 
@@ -116,26 +121,24 @@ FAIL: [specific issues found]"""
     def verify_cleaned_image(self, image_data):
         """Verify if watermark has been properly removed."""
         try:
-            response = self.model.generate_content([
+            verification_inputs = [
                 self.verification_prompt,
                 {"mime_type": "image/jpeg", "data": image_data}
-            ])
+            ]
             
-            if response and response.text:
-                verification_result = response.text.strip().upper()
-                logger.info(f"Verification result: {verification_result}")
-                
-                if verification_result.startswith("PASS:"):
-                    return True, "Verification passed"
-                elif verification_result.startswith("FAIL:"):
-                    return False, verification_result
-                else:
-                    if "pass" in response.text.lower():
-                        return True, "Verification passed (inferred)"
-                    else:
-                        return False, f"Unclear verification: {response.text}"
+            # Unparseable replies are re-asked and the candidate re-verified before it counts
+            verification = verify_candidate(
+                self.verification_model.model_name, verification_inputs,
+                lambda config: self.verification_rate_limiter.call(
+                    self.verification_model.generate_content, verification_inputs, generation_config=config
+                )
+            )
+            logger.info(f"Verification result: {verification.result_text}")
+            return verification.passed, verification.result_text
             
-            return False, "No verification response"
+        except StructuredOutputError as e:
+            logger.error(f"Verification gave no verdict: {e}")
+            return False, NO_VERDICT_RESULT
             
         except Exception as e:
             logger.error(f"Error during verification: {e}")
@@ -171,10 +174,11 @@ ADDITIONAL INSTRUCTIONS FOR STUBBORN WATERMARKS:
                 else:
                     current_prompt = self.watermark_prompt
                 
-                response = self.model.generate_content([
-                    current_prompt,
-                    {"mime_type": "image/jpeg", "data": img_data}
-                ])
+                with self.rate_limiter.slot():
+                    response = self.model.generate_content([
+                        current_prompt,
+                        {"mime_type": "image/jpeg", "data": img_data}
+                    ])
                 
                 if response and response.candidates and response.candidates[0].content.parts:
                     for part in response.candidates[0].content.parts:
@@ -213,9 +217,6 @@ ADDITIONAL INSTRUCTIONS FOR STUBBORN WATERMARKS:
                     continue
                 else:
                     return False, f"Error after {max_retries} attempts: {e}"
-            
-            if attempt < max_retries - 1:
-                time.sleep(0.5)
         
         return False, f"Failed to clean {image_path.name} after {max_retries} attempts"
 
@@ -248,10 +249,6 @@ ADDITIONAL INSTRUCTIONS FOR STUBBORN WATERMARKS:
             else:
                 failed += 1
                 logger.warning(f"Failed to clean {image_path.name}: {result}")
-            
-            # Rate limiting
-            if i < len(watermarked_images):
-                time.sleep(0.5)
         
         logger.info(f"Batch watermark removal complete: {successful}/{len(watermarked_images)} successful")
         return successful, failed
@@ -12,6 +12,9 @@ from pathlib import Path
 from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
+from rate_limiter import get_rate_limiter
+from structured_output import VERIFICATION_MODEL, NO_VERDICT_RESULT, StructuredOutputError, verify_candidate
+from image_precheck import ImagePrecheck
 import base64
 from io import BytesIO
 import time
@@ -43,6 +46,12 @@ class WhatsAppEdwardProcessor:
         
         # Single model for generation
         self.generation_model = genai.GenerativeModel('models/gemini-2.5-flash-image-preview')
+        self.rate_limiter = get_rate_limiter('models/gemini-2.5-flash-image-preview')
+        # Verdicts come back as schema-constrained JSON from a text model
+        self.verification_model = genai.GenerativeModel(VERIFICATION_MODEL)
+        self.verification_rate_limiter = get_rate_limiter(VERIFICATION_MODEL)
+        # Legacy SDK output has no fixed aspect ratio, so only size/colour checks apply
+        self.precheck = ImagePrecheck(expected_aspect_ratio=0)
         
         logger.info("Model configuration complete: gemini-2.5-flash-image-preview")
         
@@ -112,9 +121,9 @@ CHECK IN THIS ORDER:
 - Is the background clean and white?
 - Are there any jewelry, accessories, or footwear?
 
-Respond with:
-PASS: All core requirements met
-FAIL: [specific missing requirements, starting with clothing presence]"""
+Respond with JSON:
+- verdict: "PASS" (All core requirements met) or "FAIL"
+- issues: [specific missing requirements, starting with clothing presence] - empty when PASS"""
         
         logger.info("WhatsAppEdwardProcessor initialized successfully")
 
@@ -143,27 +152,31 @@ FAIL: [specific missing requirements, starting with clothing presence]"""
 
     def verify_generated_image(self, image_data):
         """Verify if generated image meets all requirements."""
+        # Cheap local checks first - plainly wrong candidates skip the remote round trip
+        precheck_passed, precheck_result = self.precheck.check(image_data)
+        if not precheck_passed:
+            return False, precheck_result
+
         try:
-            response = self.generation_model.generate_content([
+            verification_inputs = [
                 self.verification_prompt,
                 {"mime_type": "image/jpeg", "data": image_data}
-            ])
+            ]
             
-            if response and response.text:
-                verification_result = response.text.strip().upper()
-                logger.info(f"Verification result: {verification_result}")
+            # Unparseable replies are re-asked and the candidate re-verified before it counts
+            verification = verify_candidate(
+                self.verification_model.model_name, verification_inputs,
+                lambda config: self.verification_rate_limiter.call(
+                    self.verification_model.generate_content, verification_inputs, generation_config=config
+                ),
                 
-                if verification_result.startswith("PASS:"):
-                    return True, "Verification passed"
-                elif verification_result.startswith("FAIL:"):
-                    return False, verification_result
-                else:
-                    if "pass" in response.text.lower():
-                        return True, "Verification passed (inferred)"
-                    else:
-                        return False, f"Unclear verification: {response.text}"
+            )
+            logger.info(f"Verification result: {verification.result_text}")
+            return verification.passed, verification.result_text
             
-            return False, "No verification response"
+        except StructuredOutputError as e:
+            logger.error(f"Verification gave no verdict: {e}")
+            return False, NO_VERDICT_RESULT
             
         except Exception as e:
             error_msg = str(e)
@@ -212,11 +225,12 @@ FAIL: [specific missing requirements, starting with clothing presence]"""
                     img_byte_arr = img_byte_arr.getvalue()
                 
                 # Send to generation model
-                response = self.generation_model.generate_content([
-                    prompt,
-                    {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},
-                    {"mime_type": "image/jpeg", "data": img_byte_arr}
-                ])
+                with self.rate_limiter.slot():
+                    response = self.generation_model.generate_content([
+                        prompt,
+                        {"mime_type": "image/jpeg", "data": self.reference_mannequin_data},
+                        {"mime_type": "image/jpeg", "data": img_byte_arr}
+                    ])
                 
                 if response and response.candidates and response.candidates[0].content.parts:
                     for part in response.candidates[0].content.parts:
@@ -291,9 +305,6 @@ FAIL: [specific missing requirements, starting with clothing presence]"""
                 failed_path = self.failed_dir / image_path.name
                 shutil.copy2(str(image_path), str(failed_path))
                 logger.warning(f"Failed to process {image_path.name}: {result}")
-            
-            if i < len(images_to_process):
-                time.sleep(1)
         
         logger.info(f"Batch processing complete: {success_count} successful, {failure_count} failed")
         return success_count, failure_count